@@ -0,0 +1,93 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+from data.modules.batch import batch_metrics, run_batch, save_batch_report
+from data.modules.corpus_store import convert_json_dir
+from data.modules.instrumentation import LOG_FORMAT, profiled
+from data.modules.inverted_index import build_index_from_json_dir
+from data.modules.progress import ProgressReporter, format_progress
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Пакетная декомпозиция всех книг СКИОВО")
+    parser.add_argument("--base-dir", default="data/Base_Books", help="каталог с PDF: <бассейн>/Книга N/*.pdf")
+    parser.add_argument("--json-dir", default="data/JSON", help="куда писать <бассейн>/Исходные/<книга>.json")
+    parser.add_argument("--output-dir", default="outputs", help="каталог для PDF разделов")
+    parser.add_argument("--no-pdf", action="store_true", help="не сохранять PDF разделов, только JSON")
+    parser.add_argument("--leaf-only", action="store_true",
+                        help="PDF только для конечных разделов, для родительских - index.json с диапазонами страниц")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="дополнительно писать <книга>.jsonl: одна строка на конечный раздел")
+    parser.add_argument("--layout", action="store_true",
+                        help="сохранять у конечных разделов разметку: блоки текста, таблицы построчно, число изображений")
+    parser.add_argument("--streaming", action="store_true",
+                        help="потоковый режим для очень больших книг: каждый раздел сразу пишется на диск, "
+                             "память не растёт с размером книги (несовместим с --layout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="число рабочих процессов")
+    parser.add_argument("--page-workers", type=int,
+                        help="процессов извлечения текста страниц внутри книги "
+                             "(для разовой пересборки одной книги - вместе с --workers 1)")
+    parser.add_argument("--report", help="JSON-отчёт по каждой книге")
+    parser.add_argument("--metrics", help="метрики этапов по книгам: время, страницы, записанные байты (.json или .csv)")
+    parser.add_argument("--profile", help="файл профиля cProfile (подробный профиль этапов - вместе с --workers 1)")
+    parser.add_argument("--corpus-store", help="после обработки собрать из JSON колоночное хранилище корпуса в этот каталог")
+    parser.add_argument("--inverted-index", help="полнотекстовый индекс (BM25) в этот каталог: индекс книги строится "
+                                                 "при её декомпозиции, после обработки индексы книг сливаются")
+    parser.add_argument("--manifest", help="манифест для инкрементальной пересборки "
+                                           "(по умолчанию <json-dir>/build_manifest.json)")
+    parser.add_argument("--full", action="store_true", help="пересобрать всё без манифеста")
+    args = parser.parse_args()
+    if args.streaming and args.layout:
+        parser.error("--streaming несовместим с --layout")
+    return args
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    output_dir = None if args.no_pdf else args.output_dir
+
+    started = time.perf_counter()
+    manifest_path = None
+    if not args.full:
+        manifest_path = args.manifest or os.path.join(args.json_dir, "build_manifest.json")
+
+    progress = ProgressReporter()
+    with profiled(args.profile):
+        results = run_batch(args.base_dir, args.json_dir, output_dir, workers=args.workers,
+                            manifest_path=manifest_path, leaf_only=args.leaf_only, jsonl=args.jsonl,
+                            layout=args.layout, streaming=args.streaming, progress=progress,
+                            page_workers=args.page_workers, inverted_index=bool(args.inverted_index))
+    elapsed = time.perf_counter() - started
+    print(format_progress(progress.snapshot()))
+
+    failed = [result for result in results if result['status'] != "ok"]
+    skipped = [result for result in results if result.get('skipped')]
+    serial_time = sum(result['seconds'] for result in results)
+    print(f"Книг: {len(results)}, без изменений: {len(skipped)}, ошибок: {len(failed)}, время: {elapsed:.1f} с "
+          f"(сумма по книгам {serial_time:.1f} с, процессов: {args.workers})")
+    for result in failed:
+        print(f"  {result['pdf_path']}: {result['error']}")
+
+    if args.report:
+        save_batch_report(results, args.report)
+    if args.metrics:
+        batch_metrics(results).save(args.metrics)
+
+    if args.corpus_store:
+        meta = convert_json_dir(args.json_dir, args.corpus_store)
+        print(f"Хранилище корпуса: {args.corpus_store}, разделов: {meta['count']}")
+
+    if args.inverted_index:
+        index = build_index_from_json_dir(args.json_dir)
+        index.save(args.inverted_index)
+        print(f"Полнотекстовый индекс: {args.inverted_index}, разделов: {len(index)}, термов: {len(index.terms)}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
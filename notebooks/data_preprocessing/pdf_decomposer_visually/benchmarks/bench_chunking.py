@@ -0,0 +1,77 @@
+# Время токенизации при разбиении конечных разделов на фрагменты:
+# прежний порядок из look_at_json.ipynb (подсчёт токенов, split_text_with_overlap
+# с decode, токенизация при векторизации) против chunk_sections с одной токенизацией.
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_chunking
+#     python -m benchmarks.bench_chunking --basin Дон
+import argparse
+import time
+from pathlib import Path
+
+from data.modules.chunking import chunk_sections, DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP
+from data.modules.corpus_store import iter_corpus_json
+from data.modules.json_stream import iter_leaf_sections_from_file
+
+
+DATA_DIR = Path(__file__).resolve().parents[4] / "data"
+
+
+def split_text_with_overlap(tokenizer, text, max_tokens, overlap):
+    tokens = tokenizer(text, add_special_tokens=False)["input_ids"]
+    if len(tokens) <= max_tokens:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + max_tokens, len(tokens))
+        chunks.append(tokenizer.decode(tokens[start:end], skip_special_tokens=True))
+        start += max_tokens - overlap
+    return chunks
+
+
+def run_notebook(sections, tokenizer, max_tokens, overlap):
+    count = 0
+    for section in sections:
+        # get_max_token_document
+        tokenizer(section['text'], add_special_tokens=False)
+        for chunk in split_text_with_overlap(tokenizer, section['text'], max_tokens, overlap):
+            # токенизация внутри model.encode
+            tokenizer(chunk)
+            count += 1
+    return count
+
+
+def run_chunker(sections, tokenizer, max_tokens, overlap):
+    return sum(1 for _ in chunk_sections(sections, tokenizer, max_tokens, overlap))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк токенизации при разбиении на фрагменты")
+    parser.add_argument("--json-dir", default=str(DATA_DIR / "JSON"))
+    parser.add_argument("--basin", help="Только один бассейн")
+    parser.add_argument("--model", default="deepvk/USER-bge-m3")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP)
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model, use_fast=True)
+    sections = [
+        section
+        for basin, _, json_path in iter_corpus_json(args.json_dir)
+        if args.basin is None or basin == args.basin
+        for section in iter_leaf_sections_from_file(json_path)
+        if section.get('text')
+    ]
+    print(f"Конечных разделов: {len(sections)}")
+
+    for name, runner in (("ноутбук", run_notebook), ("chunk_sections", run_chunker)):
+        started = time.perf_counter()
+        count = runner(sections, tokenizer, args.max_tokens, args.overlap)
+        print(f"{name:>15}: {time.perf_counter() - started:.1f} с, фрагментов: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Сравнение конвейера из отдельных функций (как в прежнем core.py) и BookDecomposer:
+# число открытий PDF на книгу и время выполнения.
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_decomposer
+#     python -m benchmarks.bench_decomposer --pdf "путь/к/Книга_1.pdf"
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import fitz
+
+from data.modules.text_by_toc import (
+    extract_toc_from_pdf,
+    split_pdf_by_toc,
+    build_hierarchy,
+    update_all_end_pages,
+    extract_text_from_hierarchy,
+    attach_text_to_deepest_sections
+)
+from data.modules.pdf_to_folders import (
+    create_directory_structure,
+    save_hierarchy_to_json
+)
+from data.modules.decomposer import BookDecomposer
+from benchmarks.synthetic import generate_book_from_json
+
+
+DATA_DIR = Path(__file__).resolve().parents[4] / "data"
+DEFAULT_JSON = DATA_DIR / "JSON" / "Дон" / "Исходные" / "Книга_1.json"
+
+
+# Подсчёт открытий файлов через fitz.open (новые пустые документы не считаются)
+@contextlib.contextmanager
+def count_opens():
+    counter = {"opens": 0}
+    original_open = fitz.open
+
+    def counting_open(*args, **kwargs):
+        if args or kwargs.get('filename'):
+            counter["opens"] += 1
+        return original_open(*args, **kwargs)
+
+    fitz.open = counting_open
+    try:
+        yield counter
+    finally:
+        fitz.open = original_open
+
+
+def run_functions(pdf_path, out_dir):
+    doc = fitz.open(pdf_path)
+    extract_toc_from_pdf(pdf_path)
+    sections = split_pdf_by_toc(pdf_path)
+    hierarchy = build_hierarchy(sections)
+    update_all_end_pages(hierarchy)
+    extract_text_from_hierarchy(doc, hierarchy)
+    for section in hierarchy:
+        attach_text_to_deepest_sections(section, doc)
+    create_directory_structure(hierarchy, out_dir, pdf_path)
+    save_hierarchy_to_json(hierarchy, os.path.join(out_dir, "book.json"))
+
+
+def run_decomposer(pdf_path, out_dir):
+    with BookDecomposer(pdf_path) as decomposer:
+        decomposer.build_hierarchy()
+        decomposer.leaf_texts()
+        decomposer.run(out_dir, os.path.join(out_dir, "book.json"))
+        return decomposer.page_cache.stats()
+
+
+def measure(runner, pdf_path):
+    with tempfile.TemporaryDirectory() as out_dir:
+        with count_opens() as counter, contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            cache_stats = runner(pdf_path, out_dir)
+            elapsed = time.perf_counter() - started
+    return counter["opens"], elapsed, cache_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк декомпозиции одной книги")
+    parser.add_argument("--pdf", help="PDF книги; по умолчанию синтетическая книга по Дон/Книга_1.json")
+    parser.add_argument("--json", default=str(DEFAULT_JSON), help="JSON книги для синтетического PDF")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = args.pdf
+        if pdf_path is None:
+            pdf_path = generate_book_from_json(args.json, os.path.join(tmp_dir, "book.pdf"))
+
+        with fitz.open(pdf_path) as doc:
+            print(f"Книга: {pdf_path}, страниц: {doc.page_count}, записей оглавления: {len(doc.get_toc())}")
+
+        for name, runner in (("functions", run_functions), ("BookDecomposer", run_decomposer)):
+            opens, elapsed, cache_stats = measure(runner, pdf_path)
+            print(f"{name:>15}: открытий PDF = {opens:4d}, время = {elapsed:.2f} с")
+            if cache_stats:
+                print(f"{'':>15}  кэш страниц: попаданий = {cache_stats['hits']}, промахов = {cache_stats['misses']}")
+
+
+if __name__ == "__main__":
+    main()
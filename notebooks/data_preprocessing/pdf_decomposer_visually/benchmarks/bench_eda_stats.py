@@ -0,0 +1,66 @@
+# Статистика текста для EDA: обработка как в eda.ipynb (текст книги одной строкой,
+# preprocess_text со стоп-словами в списке, Counter по книге; текст берётся из JSON,
+# а не извлекается из PDF, как в ноутбуке) против eda_stats -
+# первое построение, повторная загрузка из кэша и агрегаты по бассейнам, книгам и разделам.
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_eda_stats
+#     python -m benchmarks.bench_eda_stats --json-dir ../../../data/JSON
+import argparse
+import re
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from data.modules.corpus_store import iter_corpus_json
+from data.modules.eda_stats import load_corpus_stats
+from data.modules.inverted_index import russian_stop_words
+from data.modules.json_stream import iter_leaf_sections_from_file
+
+
+DATA_DIR = Path(__file__).resolve().parents[4] / "data"
+
+
+def notebook_counts(json_dir):
+    stop_words = list(russian_stop_words())
+    counts = {}
+    for basin, file_name, json_path in iter_corpus_json(json_dir):
+        text = ""
+        for section in iter_leaf_sections_from_file(json_path):
+            text += section.get('text', "")
+        tokens = re.findall(r'\b[^\d\W]{3,}\b', text, re.UNICODE)
+        tokens = [token for token in tokens if token.lower() not in stop_words]
+        counts[(basin, file_name)] = Counter(token.lower() for token in tokens)
+    return counts
+
+
+def timed(label, function):
+    started = time.perf_counter()
+    result = function()
+    print(f"{label:>28}: {(time.perf_counter() - started) * 1000:.0f} мс")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк статистики EDA")
+    parser.add_argument("--json-dir", default=str(DATA_DIR / "JSON"))
+    args = parser.parse_args()
+
+    timed("как в eda.ipynb", lambda: notebook_counts(args.json_dir))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        stats = timed("eda_stats, без кэша", lambda: load_corpus_stats(args.json_dir, cache_dir))
+        stats = timed("eda_stats, из кэша", lambda: load_corpus_stats(args.json_dir, cache_dir))
+    print(f"{'':>30}разделов: {len(stats)}, слов в словаре: {len(stats.vocabulary)}, "
+          f"ненулевых элементов: {stats.matrix.indptr[-1]}")
+
+    for by in ("basin", "file", "section"):
+        timed(f"summary + TF-IDF ({by})", lambda: (stats.summary(by), stats.top_terms(by, 20, "tfidf")))
+    timed("word_frequencies (бассейн)", lambda: stats.word_frequencies(basin=stats.basins[0], limit=500))
+    timed("word_frequencies (книга)", lambda: stats.word_frequencies(book=stats.books[-1], limit=500))
+    for term, weight in stats.top_tfidf_terms("file", k=10):
+        print(f"{'':>30}{weight:6.3f}  {term}")
+
+
+if __name__ == "__main__":
+    main()
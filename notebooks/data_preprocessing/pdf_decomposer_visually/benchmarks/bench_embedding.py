@@ -0,0 +1,71 @@
+# Пропускная способность векторизации на CPU (документов в секунду):
+# цикл model.encode по одному документу (как в vectorization_all.ipynb)
+# против embed_documents с батчами, отсортированными по длине.
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_embedding
+#     python -m benchmarks.bench_embedding --documents "путь/к/all_documents.json" --limit 500
+import argparse
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+
+from data.modules.embedding import embed_documents, document_text
+from data.modules.json_stream import iter_documents, iter_leaf_sections_from_file
+
+
+DATA_DIR = Path(__file__).resolve().parents[4] / "data"
+DEFAULT_JSON = DATA_DIR / "JSON" / "Дон" / "Исходные" / "Книга_1.json"
+
+
+# Документы из all_documents.json или конечные разделы JSON книги
+def load_documents(documents_path, json_path, limit):
+    if documents_path:
+        return list(islice(iter_documents(documents_path), limit))
+    return [
+        {"metadata": {"title": section['title']}, "page_content": section.get('text', "")}
+        for section in islice(iter_leaf_sections_from_file(json_path), limit)
+    ]
+
+
+def run_per_document(documents, model):
+    for document in documents:
+        model.encode(document_text(document))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк векторизации документов")
+    parser.add_argument("--documents", help="all_documents.json; по умолчанию конечные разделы Дон/Книга_1.json")
+    parser.add_argument("--json", default=str(DEFAULT_JSON), help="JSON книги, если --documents не указан")
+    parser.add_argument("--model", default="deepvk/USER-bge-m3")
+    parser.add_argument("--limit", type=int, default=200, help="Число документов")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(args.model, device="cpu")
+    documents = load_documents(args.documents, args.json, args.limit)
+    print(f"Документов: {len(documents)}, модель: {args.model}, batch_size = {args.batch_size}")
+
+    started = time.perf_counter()
+    run_per_document(documents, model)
+    per_document = time.perf_counter() - started
+    print(f"{'по одному':>16}: {per_document:.1f} с, {len(documents) / per_document:.1f} док/с")
+
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        started = time.perf_counter()
+        embed_documents(documents, model, batch_size=args.batch_size, checkpoint_dir=checkpoint_dir, model_name=args.model)
+        batched = time.perf_counter() - started
+        print(f"{'батчами':>16}: {batched:.1f} с, {len(documents) / batched:.1f} док/с "
+              f"(ускорение x{per_document / batched:.1f})")
+
+        # Повторный запуск с той же контрольной точкой только читает готовые батчи
+        started = time.perf_counter()
+        embed_documents(documents, model, batch_size=args.batch_size, checkpoint_dir=checkpoint_dir, model_name=args.model)
+        print(f"{'продолжение':>16}: {time.perf_counter() - started:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Поиск разделов по терму: просмотр всех JSON корпуса (как grep по data/JSON)
+# против InvertedIndex - построение, размер, точный поиск, ссылки на таблицы и BM25.
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_inverted_index
+#     python -m benchmarks.bench_inverted_index --term "нефтепродукты" --table 5.63
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from data.modules.corpus_store import iter_corpus_json
+from data.modules.inverted_index import InvertedIndex, build_index_from_json_dir
+from data.modules.json_stream import iter_leaf_sections_from_file
+
+
+DATA_DIR = Path(__file__).resolve().parents[4] / "data"
+
+
+def scan_json(json_dir, needle):
+    found = []
+    needle = needle.lower()
+    for basin, file_name, json_path in iter_corpus_json(json_dir):
+        for section in iter_leaf_sections_from_file(json_path):
+            if needle in section.get('text', "").lower():
+                found.append((basin, file_name, section['title']))
+    return found
+
+
+def timed(function, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк полнотекстового индекса")
+    parser.add_argument("--json-dir", default=str(DATA_DIR / "JSON"))
+    parser.add_argument("--term", default="водохранилище")
+    parser.add_argument("--table", default="5.63", help="номер таблицы для поиска ссылок")
+    parser.add_argument("--query", default="загрязнение нефтепродуктами подземных вод")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    scanned = scan_json(args.json_dir, args.term)
+    print(f"{'просмотр JSON':>22}: {(time.perf_counter() - started) * 1000:.0f} мс, разделов: {len(scanned)}")
+
+    started = time.perf_counter()
+    index = build_index_from_json_dir(args.json_dir)
+    print(f"{'построение индекса':>22}: {time.perf_counter() - started:.1f} с, "
+          f"разделов: {len(index)}, термов: {len(index.terms)}")
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        index.save(index_dir)
+        size = sum(os.path.getsize(os.path.join(index_dir, name)) for name in os.listdir(index_dir))
+        started = time.perf_counter()
+        index = InvertedIndex.load(index_dir)
+        print(f"{'загрузка':>22}: {(time.perf_counter() - started) * 1000:.0f} мс, на диске: {size / 2 ** 20:.1f} МБ")
+
+        found, elapsed = timed(lambda: index.lookup(args.term))
+        print(f"{'lookup':>22}: {elapsed * 1000:.2f} мс, разделов: {len(found)}")
+
+        found, elapsed = timed(lambda: index.lookup_reference(args.table))
+        print(f"{'lookup_reference':>22}: {elapsed * 1000:.2f} мс, "
+              f"таблица {args.table}: {[(item['file'], item['title'], item['pages']) for item in found]}")
+
+        found, elapsed = timed(lambda: index.search(args.query, k=5))
+        print(f"{'search (BM25)':>22}: {elapsed * 1000:.2f} мс")
+        for item in found:
+            print(f"{'':>24}{item['score']:6.2f}  {item['basin']} / {item['file']} / {item['title']}, стр. {item['pages']}")
+
+
+if __name__ == "__main__":
+    main()
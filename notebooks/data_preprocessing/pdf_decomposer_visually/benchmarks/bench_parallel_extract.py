@@ -0,0 +1,48 @@
+# Извлечение текста всех конечных разделов одной книги:
+# последовательно и в пуле процессов с разным числом рабочих процессов.
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_parallel_extract --pdf "путь/к/Книга_1.pdf"
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from data.modules.decomposer import BookDecomposer, iter_leaf_sections
+from benchmarks.bench_decomposer import DEFAULT_JSON
+from benchmarks.synthetic import generate_book_from_json
+
+
+def leaf_texts(pdf_path, workers):
+    with contextlib.redirect_stdout(io.StringIO()), BookDecomposer(pdf_path, workers=workers) as decomposer:
+        decomposer.build_hierarchy()
+        started = time.perf_counter()
+        decomposer.attach_texts()
+        elapsed = time.perf_counter() - started
+        return [section['text'] for section in iter_leaf_sections(decomposer.hierarchy)], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк параллельного извлечения текста страниц")
+    parser.add_argument("--pdf", help="PDF книги; по умолчанию синтетическая книга по Дон/Книга_1.json")
+    parser.add_argument("--json", default=str(DEFAULT_JSON), help="JSON книги для синтетического PDF")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = args.pdf or generate_book_from_json(args.json, os.path.join(tmp_dir, "book.pdf"))
+
+        serial, serial_time = leaf_texts(pdf_path, None)
+        print(f"{'последовательно':>16}: {serial_time:.2f} с")
+        workers = 2
+        while workers <= max(args.max_workers, 2):
+            texts, elapsed = leaf_texts(pdf_path, workers)
+            print(f"{f'процессов: {workers}':>16}: {elapsed:.2f} с (x{serial_time / elapsed:.1f}), "
+                  f"совпадает: {texts == serial}")
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
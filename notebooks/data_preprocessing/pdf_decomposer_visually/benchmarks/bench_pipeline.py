@@ -0,0 +1,233 @@
+# Воспроизводимый бенчмарк публичных функций text_by_toc.py и pdf_to_folders.py
+# на синтетической книге: время каждой функции и пиковая память Python (tracemalloc).
+# Результат сохраняется как базовый и сравнивается с ним при следующих запусках;
+# замедление или рост памяти больше порога отмечается как регрессия (код выхода 1).
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_pipeline --save-baseline benchmarks/baseline.json
+#     python -m benchmarks.bench_pipeline --compare benchmarks/baseline.json
+#     python -m benchmarks.bench_pipeline --pages 600 --depth 4 --fanout 3 --no-anchor
+import argparse
+import copy
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fitz
+
+from data.modules.text_by_toc import (
+    extract_toc_from_pdf,
+    split_pdf_by_toc,
+    sections_from_toc,
+    build_hierarchy,
+    update_all_end_pages,
+    extract_text_from_hierarchy,
+    attach_text_to_deepest_sections
+)
+from data.modules.pdf_to_folders import (
+    create_directory_structure,
+    save_hierarchy_to_json
+)
+from data.modules.section_tree import SectionTree
+from benchmarks.synthetic import generate_book
+
+
+DEFAULT_THRESHOLD = 0.2
+# Изменения меньше этих величин не считаются регрессией: время
+# функций по доле миллисекунды определяется шумом, а не кодом
+MIN_DELTA = {"seconds": 0.002, "peak_bytes": 64 * 1024}
+
+
+# Для каждой функции setup() готовит свежие входные данные (функции меняют иерархию,
+# а у документа есть кэш страниц) и возвращает (вызов, очистка); время setup не учитывается
+def pipeline_cases(pdf_path, work_dir):
+    with fitz.open(pdf_path) as doc:
+        toc = extract_toc_from_pdf(pdf_path, doc=doc)
+        page_count = doc.page_count
+        sections = sections_from_toc(toc, page_count)
+        hierarchy = build_hierarchy(copy.deepcopy(sections))
+        update_all_end_pages(hierarchy)
+        text_hierarchy = copy.deepcopy(hierarchy)
+        for section in text_hierarchy:
+            attach_text_to_deepest_sections(section, doc)
+
+    def with_doc(run):
+        def setup():
+            doc = fitz.open(pdf_path)
+            return (lambda: run(doc)), doc.close
+        return setup
+
+    def fresh(data, run):
+        def setup():
+            copied = copy.deepcopy(data)
+            return (lambda: run(copied)), None
+        return setup
+
+    def in_new_dir(run):
+        def setup():
+            out_dir = tempfile.mkdtemp(dir=work_dir)
+            return (lambda: run(out_dir)), (lambda: shutil.rmtree(out_dir))
+        return setup
+
+    def plain(run):
+        return lambda: (run, None)
+
+    return [
+        ("extract_toc_from_pdf", plain(lambda: extract_toc_from_pdf(pdf_path))),
+        ("split_pdf_by_toc", plain(lambda: split_pdf_by_toc(pdf_path))),
+        ("build_hierarchy", fresh(sections, build_hierarchy)),
+        ("update_all_end_pages", fresh(hierarchy, update_all_end_pages)),
+        # Иерархия с исправленными end_page за один проход (BookDecomposer)
+        ("SectionTree.from_toc", plain(lambda: SectionTree.from_toc(toc, page_count).to_hierarchy())),
+        ("extract_text_from_hierarchy", with_doc(lambda doc: extract_text_from_hierarchy(doc, hierarchy))),
+        ("create_directory_structure", in_new_dir(lambda out_dir: create_directory_structure(hierarchy, out_dir, pdf_path))),
+        ("save_hierarchy_to_json", in_new_dir(lambda out_dir: save_hierarchy_to_json(text_hierarchy, os.path.join(out_dir, "book.json"))))
+    ]
+
+
+def _call(setup, traced=False):
+    run, cleanup = setup()
+    try:
+        if traced:
+            tracemalloc.start()
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return peak
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+
+# Лучшее и медианное время по repeat запускам; память - отдельным запуском,
+# так как tracemalloc замедляет выполнение. Учитывается только память Python:
+# буферы MuPDF выделяются в C и в peak_bytes не входят.
+def measure(setup, repeat):
+    times = [_call(setup) for _ in range(repeat)]
+    return {
+        "seconds": min(times),
+        "median_seconds": statistics.median(times),
+        "peak_bytes": _call(setup, traced=True)
+    }
+
+
+def run_suite(pdf_path, repeat):
+    with tempfile.TemporaryDirectory() as work_dir:
+        return {name: measure(setup, repeat) for name, setup in pipeline_cases(pdf_path, work_dir)}
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+# Регрессия - рост лучшего времени или пиковой памяти больше чем на threshold (доля)
+# и больше MIN_DELTA в абсолютных величинах
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if current[metric] - previous[metric] <= MIN_DELTA[metric]:
+                continue
+            if current[metric] > previous[metric] * (1 + threshold):
+                regressions.append({
+                    "function": name,
+                    "metric": metric,
+                    "baseline": previous[metric],
+                    "current": current[metric],
+                    "ratio": current[metric] / previous[metric]
+                })
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print(f"{'функция':<30}{'время, мс':>12}{'медиана, мс':>14}{'память, КБ':>12}{'к базовому':>12}")
+    for name, result in results.items():
+        line = (f"{name:<30}{result['seconds'] * 1000:>12.2f}{result['median_seconds'] * 1000:>14.2f}"
+                f"{result['peak_bytes'] / 1024:>12.1f}")
+        previous = baseline['results'].get(name) if baseline else None
+        if previous and previous['seconds'] > 0:
+            line += f"{result['seconds'] / previous['seconds']:>11.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк функций декомпозиции на синтетической книге")
+    parser.add_argument("--pdf", help="готовый PDF вместо синтетической книги")
+    parser.add_argument("--pages", type=int, default=300, help="страниц в синтетической книге")
+    parser.add_argument("--depth", type=int, default=3, help="глубина оглавления после ВВЕДЕНИЯ")
+    parser.add_argument("--fanout", type=int, default=4, help="подразделов у каждого раздела")
+    parser.add_argument("--no-anchor", action="store_true", help="без записи 'ВВЕДЕНИЕ' в оглавлении")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="запусков каждой функции")
+    parser.add_argument("--save-baseline", help="сохранить результат как базовый в этот JSON")
+    parser.add_argument("--compare", help="JSON базового результата для сравнения")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="допустимый рост времени и памяти относительно базового (доля)")
+    args = parser.parse_args()
+
+    config = {
+        "pdf": args.pdf,
+        "pages": args.pages,
+        "depth": args.depth,
+        "fanout": args.fanout,
+        "anchor": not args.no_anchor,
+        "seed": args.seed,
+        "repeat": args.repeat
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = args.pdf
+        if pdf_path is None:
+            pdf_path = generate_book(
+                os.path.join(tmp_dir, "book.pdf"), pages=args.pages, depth=args.depth,
+                fanout=args.fanout, anchor=not args.no_anchor, seed=args.seed
+            )
+        with fitz.open(pdf_path) as doc:
+            print(f"Книга: {args.pdf or 'синтетическая'}, страниц: {doc.page_count}, записей оглавления: {len(doc.get_toc())}")
+        results = run_suite(pdf_path, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['config'] != config:
+            print(f"Внимание: параметры базового запуска отличаются: {baseline['config']}")
+
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump({"config": config, "environment": environment(), "results": results},
+                      baseline_file, ensure_ascii=False, indent=4)
+        print(f"Базовый результат сохранён: {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ {regression['function']}: {regression['metric']} "
+                  f"{regression['baseline']:.4g} -> {regression['current']:.4g} ({regression['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        print(f"Регрессий нет (порог {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
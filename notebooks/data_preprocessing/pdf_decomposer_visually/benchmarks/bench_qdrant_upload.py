@@ -0,0 +1,78 @@
+# Загрузка точек в Qdrant: последовательный цикл по 100 точек (как в vectorization_all.ipynb)
+# против upload_points с пачками и потоками. По умолчанию - локальный режим qdrant-client
+# в памяти процесса, без сервера; --url для замера на настоящем сервере.
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_qdrant_upload
+#     python -m benchmarks.bench_qdrant_upload --points 50000 --batch-size 512 --workers 8
+#     python -m benchmarks.bench_qdrant_upload --url http://localhost:6333
+import argparse
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+
+from data.modules.qdrant_upload import ensure_collection, upload_points
+
+
+def make_client(url):
+    return QdrantClient(url=url) if url else QdrantClient(location=":memory:")
+
+
+def sequential_upload(client, collection_name, ids, vectors, payloads, batch_size=100):
+    for start in range(0, len(ids), batch_size):
+        points = [
+            PointStruct(id=ids[index], vector=vectors[index].tolist(), payload=payloads[index])
+            for index in range(start, min(start + batch_size, len(ids)))
+        ]
+        client.upsert(collection_name=collection_name, points=points)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк загрузки точек в Qdrant")
+    parser.add_argument("--url", help="адрес сервера Qdrant; по умолчанию локальный режим в памяти")
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1024, help="1024 - размерность USER-bge-m3")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--content-chars", type=int, default=2000, help="длина текста в payload")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.points, args.dim), dtype=np.float32)
+    ids = list(range(args.points))
+    basins = ["Дон", "Кубань", "Сура", "Печора"]
+    metadata = [
+        {"basin": basins[i % len(basins)], "file": f"Книга_{i % 7}.json", "level": 1 + i % 3, "title": f"Раздел {i}"}
+        for i in range(args.points)
+    ]
+    content = "с" * args.content_chars
+    print(f"Точек: {args.points}, размерность: {args.dim}, сервер: {args.url or 'локальный (в памяти)'}")
+
+    runs = (
+        ("цикл по 100", True, lambda client, name, payloads: sequential_upload(client, name, ids, vectors, payloads)),
+        ("upload_points", True, lambda client, name, payloads: upload_points(
+            client, name, ids, vectors, payloads, batch_size=args.batch_size, workers=args.workers)),
+        ("без content", False, lambda client, name, payloads: upload_points(
+            client, name, ids, vectors, payloads, batch_size=args.batch_size, workers=args.workers)),
+    )
+    for index, (label, include_content, run) in enumerate(runs):
+        client = make_client(args.url)
+        collection_name = f"bench_upload_{index}"
+        if args.url:
+            client.delete_collection(collection_name)
+        ensure_collection(client, collection_name, args.dim)
+        payloads = [dict(item, content=content) if include_content else item for item in metadata]
+
+        started = time.perf_counter()
+        run(client, collection_name, payloads)
+        elapsed = time.perf_counter() - started
+        count = client.count(collection_name).count
+        print(f"{label:>15}: {elapsed:.2f} с, {args.points / elapsed:.0f} точек/с, в коллекции: {count}")
+        if args.url:
+            client.delete_collection(collection_name)
+
+
+if __name__ == "__main__":
+    main()
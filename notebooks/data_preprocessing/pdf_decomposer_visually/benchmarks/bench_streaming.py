@@ -0,0 +1,86 @@
+# Пиковая память декомпозиции: BookDecomposer.run (все тексты книги в памяти)
+# против потокового режима (run(streaming=True)) на синтетических книгах растущего размера.
+# Каждый запуск - в отдельном свежем процессе, пик RSS берётся из getrusage;
+# JSON обоих режимов сравнивается побайтно.
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_streaming
+#     python -m benchmarks.bench_streaming --pages 500 2000 8000 --no-pdf
+import argparse
+import filecmp
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from data.modules.decomposer import BookDecomposer
+from benchmarks.synthetic import generate_book
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux - в килобайтах, macOS - в байтах
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _decompose(pdf_path, work_dir, streaming, export_pdf, queue):
+    before = _peak_rss_mb()
+    started = time.perf_counter()
+    try:
+        with BookDecomposer(pdf_path) as decomposer:
+            decomposer.run(
+                os.path.join(work_dir, "sections") if export_pdf else None,
+                os.path.join(work_dir, "book.json"),
+                streaming=streaming
+            )
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+        raise
+    queue.put({"seconds": time.perf_counter() - started, "before_mb": before, "peak_mb": _peak_rss_mb()})
+
+
+def measure(pdf_path, work_dir, streaming, export_pdf):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_decompose, args=(pdf_path, work_dir, streaming, export_pdf, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк памяти потоковой декомпозиции")
+    parser.add_argument("--pages", type=int, nargs="+", default=[250, 1000, 2000])
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--no-pdf", action="store_true", help="только JSON, без PDF разделов")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_streaming_")
+    try:
+        print(f"{'страниц':>8} {'режим':>10} {'время, с':>9} {'RSS до, МБ':>11} {'пик RSS, МБ':>12} {'прирост, МБ':>12}")
+        for pages in args.pages:
+            pdf_path = os.path.join(work_dir, f"book_{pages}.pdf")
+            generate_book(pdf_path, pages=pages, depth=args.depth, fanout=args.fanout)
+            outputs = {}
+            for label, streaming in (("обычный", False), ("потоковый", True)):
+                run_dir = os.path.join(work_dir, f"{pages}_{label}")
+                os.makedirs(run_dir)
+                result = measure(pdf_path, run_dir, streaming, not args.no_pdf)
+                outputs[label] = os.path.join(run_dir, "book.json")
+                print(f"{pages:>8} {label:>10} {result['seconds']:>9.2f} {result['before_mb']:>11.1f} "
+                      f"{result['peak_mb']:>12.1f} {result['peak_mb'] - result['before_mb']:>12.1f}")
+            same = filecmp.cmp(outputs["обычный"], outputs["потоковый"], shallow=False)
+            print(f"{'':>8} JSON совпадает: {'да' if same else 'НЕТ'}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Поиск топ-5 по косинусной близости: цикл по документам с сортировкой
+# всего списка (как find_top_results в metrics_model_emb.ipynb) против VectorIndex.
+#
+# Запуск из каталога pdf_decomposer_visually:
+#     python -m benchmarks.bench_vector_search
+#     python -m benchmarks.bench_vector_search --docs 50000 --queries 100
+import argparse
+import time
+
+import numpy as np
+
+from data.modules.vector_search import VectorIndex
+
+
+# Прежний способ: сходство с каждым документом отдельно, затем полная сортировка
+def loop_top_results(query_vector, doc_vectors, k=5):
+    similarities = []
+    for i, doc_vector in enumerate(doc_vectors):
+        similarity = np.dot(query_vector, doc_vector) / (np.linalg.norm(query_vector) * np.linalg.norm(doc_vector))
+        similarities.append((i, similarity))
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    return similarities[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска ближайших векторов")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1024, help="1024 - размерность USER-bge-m3")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.docs, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    basins = ["Дон", "Кубань", "Сура", "Печора"]
+    metadata = [{"basin": basins[i % len(basins)], "file": f"Книга_{i % 7}.json"} for i in range(args.docs)]
+    print(f"Документов: {args.docs}, размерность: {args.dim}, запросов: {args.queries}")
+
+    loop_queries = queries[:max(1, args.queries // 10)]
+    started = time.perf_counter()
+    expected = [loop_top_results(query, vectors, args.k) for query in loop_queries]
+    per_query_loop = (time.perf_counter() - started) / len(loop_queries)
+    print(f"{'цикл':>22}: {per_query_loop * 1000:.1f} мс/запрос")
+
+    started = time.perf_counter()
+    index = VectorIndex(vectors, metadata)
+    print(f"{'построение индекса':>22}: {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    started = time.perf_counter()
+    found = [index.search(query, args.k) for query in queries]
+    per_query = (time.perf_counter() - started) / len(queries)
+    print(f"{'VectorIndex.search':>22}: {per_query * 1000:.2f} мс/запрос (x{per_query_loop / per_query:.0f})")
+
+    started = time.perf_counter()
+    index.search_batch(queries, args.k)
+    per_query = (time.perf_counter() - started) / len(queries)
+    print(f"{'search_batch':>22}: {per_query * 1000:.2f} мс/запрос (x{per_query_loop / per_query:.0f})")
+
+    started = time.perf_counter()
+    index.search_batch(queries, args.k, basin="Дон")
+    per_query = (time.perf_counter() - started) / len(queries)
+    print(f"{'search_batch basin':>22}: {per_query * 1000:.2f} мс/запрос")
+
+    same = all([row for row, _ in hits] == [row for row, _ in loop_hits] for hits, loop_hits in zip(found, expected))
+    print(f"Результаты совпадают с циклом: {same}")
+
+
+if __name__ == "__main__":
+    main()
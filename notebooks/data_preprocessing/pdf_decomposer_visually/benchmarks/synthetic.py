@@ -0,0 +1,114 @@
+import json
+import random
+
+import fitz
+
+
+PAGE_RECT = fitz.Rect(40, 40, 555, 800)
+
+
+# Обход иерархии в порядке оглавления
+def _flatten(hierarchy):
+    stack = list(reversed(hierarchy))
+    while stack:
+        section = stack.pop()
+        yield section
+        stack.extend(reversed(section.get('subsections', [])))
+
+
+# Синтетический PDF с тем же оглавлением и объёмом, что и у книги из JSON
+def generate_book_from_json(json_path, output_path):
+    with open(json_path, 'r', encoding='utf-8') as json_file:
+        hierarchy = json.load(json_file)
+
+    sections = list(_flatten(hierarchy))
+    page_count = max(section['end_page'] for section in sections) + 2
+
+    page_texts = [""] * page_count
+    for section in sections:
+        if section.get('subsections'):
+            continue
+        pages = list(range(section['start_page'] - 1, section['end_page']))
+        if not pages:
+            continue
+        lines = section.get('text', "").splitlines()
+        per_page = max(1, len(lines) // len(pages) + 1)
+        for i, page_num in enumerate(pages):
+            page_texts[page_num] = "\n".join(lines[i * per_page:(i + 1) * per_page])
+
+    doc = fitz.open()
+    for page_num in range(page_count):
+        page = doc.new_page()
+        text = page_texts[page_num] or f"Страница {page_num + 1}"
+        page.insert_textbox(PAGE_RECT, text, fontname="china-s", fontsize=8)
+
+    toc = [[1, "СОДЕРЖАНИЕ", 2]]
+    toc.extend([section['level'], section['title'], section['start_page']] for section in sections)
+    doc.set_toc(toc)
+    doc.save(output_path, garbage=3, deflate=True)
+    doc.close()
+    return output_path
+
+
+WORDS = (
+    "бассейн", "река", "водохранилище", "водопользование", "сток", "паводок", "гидроузел",
+    "водоснабжение", "мелиорация", "орошение", "загрязнение", "очистка", "водоотведение",
+    "мониторинг", "прогноз", "охрана", "ресурсы", "качество", "объём", "расход", "м3/с", "км2"
+)
+
+
+def _page_text(rng, page_num, lines_per_page):
+    lines = [f"Страница {page_num + 1}"]
+    for _ in range(lines_per_page):
+        words = rng.choices(WORDS, k=rng.randint(6, 12))
+        lines.append(" ".join(words) + f" {rng.randint(1, 999)}.{rng.randint(0, 99):02d}")
+    return "\n".join(lines)
+
+
+# Оглавление вида СКИОВО: служебные записи до "ВВЕДЕНИЕ", затем дерево глав
+# глубины depth по fanout подразделов. Первый подраздел начинается на странице
+# родителя, поэтому end_page родителей исправляется так же, как в реальных книгах.
+def synthetic_toc(pages, depth=3, fanout=4, anchor=True, preamble=2):
+    entries = [[1, "СОДЕРЖАНИЕ", 2]]
+    entries.extend([1, f"Список сокращений {i + 1}", 3 + i] for i in range(max(preamble - 1, 0)))
+    first_page = len(entries) + 2
+    entries.append([1, "ВВЕДЕНИЕ" if anchor else "ПРЕДИСЛОВИЕ", first_page])
+
+    # Число листьев fanout**depth ограничено числом страниц
+    leaves = min(fanout ** depth, max(pages - first_page, 1))
+    leaf_pages = max((pages - first_page) // leaves, 1)
+
+    counter = {"leaf": 0}
+
+    def add(level, prefix):
+        for index in range(fanout):
+            if counter["leaf"] >= leaves:
+                return
+            number = f"{prefix}{index + 1}."
+            start = min(first_page + 1 + counter["leaf"] * leaf_pages, pages)
+            entries.append([level, f"{number} Раздел {number.rstrip('.')}", start])
+            if level < depth:
+                add(level + 1, number)
+            else:
+                counter["leaf"] += 1
+
+    add(1, "")
+    return entries
+
+
+# Синтетическая книга с заданным числом страниц и глубиной оглавления;
+# seed делает текст и структуру воспроизводимыми между запусками
+def generate_book(output_path, pages=200, depth=3, fanout=4, anchor=True, preamble=2, lines_per_page=30, seed=0):
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        # insert_textbox ничего не вставляет, если текст не помещается
+        if page.insert_textbox(PAGE_RECT, _page_text(rng, page_num, lines_per_page), fontname="china-s", fontsize=8) < 0:
+            doc.close()
+            raise ValueError(f"{lines_per_page} строк не помещаются на страницу")
+
+    doc.set_toc(synthetic_toc(pages, depth, fanout, anchor, preamble))
+    doc.save(output_path, garbage=3, deflate=True)
+    doc.close()
+    return output_path
@@ -1,54 +1,44 @@
-import fitz
-import json
+import logging
 import os
 
-from modules.text_by_toc import (
-    extract_toc_from_pdf,
-    split_pdf_by_toc,
-    build_hierarchy,
-    update_all_end_pages,
-    extract_text_from_hierarchy,
-    extract_text_from_pages
-)
-from modules.pdf_to_folders import (
-    clean_title,
-    create_directory_structure
-)
+from modules.decomposer import BookDecomposer
+from modules.instrumentation import LOG_FORMAT, PipelineMetrics
 from pprint import pprint
 
 
-def attach_text_to_deepest_sections(section, doc):
-    if not section['subsections']:
-        text = extract_text_from_pages(doc, section['start_page'], section['end_page'])
-        section['text'] = text
-    else:
-        for subsection in section['subsections']:
-            attach_text_to_deepest_sections(subsection, doc)
+pdf_path = "data/Base_Books/Дон/Книга 1/Книга_1.pdf"
+base_path = "outputs"
+json_output_path = os.path.join(base_path, 'Книга 6.json')
+metrics_path = os.path.join(base_path, 'metrics.json')
+# Процессов извлечения текста страниц; 1 - в этом процессе
+workers = os.cpu_count()
 
-def save_hierarchy_to_json(hierarchy, output_path):
-    with open(output_path, 'w', encoding='utf-8') as json_file:
-        json.dump(hierarchy, json_file, ensure_ascii=False, indent=4)
 
-pdf_path = "data/Base_Books/Дон/Книга 1/Книга_1.pdf"
-doc = fitz.open(pdf_path)
+# Код запуска - под __main__: процессы пула извлечения (spawn) заново импортируют этот модуль
+def main():
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 
-sections = split_pdf_by_toc(pdf_path)
-hierarchy = build_hierarchy(sections)
-update_all_end_pages(hierarchy)
+    # Документ открывается один раз на всю книгу
+    with BookDecomposer(pdf_path, workers=workers) as decomposer:
+        hierarchy = decomposer.build_hierarchy()
 
-leaf_texts = extract_text_from_hierarchy(doc, hierarchy)
+        leaf_texts = decomposer.leaf_texts()
+        decomposer.attach_texts()
 
-for section in hierarchy:
-    attach_text_to_deepest_sections(section, doc)
+        # pprint(leaf_texts)
 
-# pprint(leaf_texts)
+        decomposer.export_sections(base_path)
+        # print(f"Директория созадана в: {base_path}")
 
-base_path = "outputs"
+        decomposer.save_json(json_output_path)
 
-create_directory_structure(hierarchy, base_path, pdf_path)
-# print(f"Директория созадана в: {base_path}")
+    # Время, страницы и записанные байты по этапам
+    metrics = PipelineMetrics()
+    metrics.add_book(decomposer.metrics)
+    metrics.save(metrics_path)
+
+    logging.getLogger("pdf_decomposer").info("Иерархия и текст сохранены в JSON файл: %s", json_output_path)
 
-json_output_path = os.path.join(base_path, 'Книга 6.json')
-save_hierarchy_to_json(hierarchy, json_output_path)
 
-print(f"Иерархия и текст сохранены в JSON файл: {json_output_path}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,39 @@
 import tkinter as tk
+import logging
 import os
 from tkinter import filedialog, messagebox, ttk
-import fitz 
-import json
-import subprocess
+import threading
 from datetime import datetime
-from data.modules.text_by_toc import (
-    extract_toc_from_pdf,
-    split_pdf_by_toc,
-    build_hierarchy,
-    update_all_end_pages,
-    extract_text_from_hierarchy,
-    extract_text_from_pages,
-    check_and_fill_end_page
-)
-from data.modules.pdf_to_folders import create_directory_structure
+from data.modules.decomposer import BookDecomposer
+from data.modules.instrumentation import MemoryLogHandler, PipelineMetrics, get_logger
+from data.modules.progress import ExportCancelled, ProgressReporter, format_progress
+from data.modules.section_loader import SectionTextLoader
 
 current_pdf = None
 hierarchy = None
+decomposer = None
+loader = None
+export_progress = None
 root = None 
 
+# Журнал и метрики этапов копятся в памяти процесса GUI и сохраняются по кнопке
+log_handler = MemoryLogHandler()
+session_metrics = PipelineMetrics()
+
+# Раздел для каждого элемента дерева; iid элементов уникальны (заголовки могут повторяться)
+tree_sections = {}
+PLACEHOLDER_SUFFIX = "_placeholder"
+
 output_dir = None
 selected_basin = None
 
 def open_pdf():
     global current_pdf, hierarchy
 
+    if export_progress is not None:
+        messagebox.showwarning("Предупреждение", "Дождитесь окончания или отмените создание каталога.")
+        return
+
     pdf_path = filedialog.askopenfilename(
         title="Выберите PDF файл",
         filetypes=(("PDF files", "*.pdf"), ("All files", "*.*"))
@@ -35,16 +43,26 @@ def open_pdf():
         process_pdf(pdf_path)
 
 def process_pdf(pdf_path):
-    global hierarchy
+    global hierarchy, decomposer, loader
 
     try:
-        toc = extract_toc_from_pdf(pdf_path)
-        sections = split_pdf_by_toc(pdf_path)
-        hierarchy = build_hierarchy(sections)
-        update_all_end_pages(hierarchy)
+        # Документ держится открытым, пока выбран этот файл
+        if loader is not None:
+            loader.stop()
+        if decomposer is not None:
+            session_metrics.add_book(decomposer.metrics)
+            decomposer.close()
+        # Документ общий с фоновым потоком навигатора: экспорт берёт блокировку
+        # на каждую страницу и раздел, поэтому предпросмотр не ждёт конца экспорта
+        document_lock = threading.Lock()
+        # Текст страниц при экспорте извлекается параллельно во всех ядрах (пул spawn)
+        decomposer = BookDecomposer(pdf_path, workers=os.cpu_count(), lock=document_lock)
+        hierarchy = decomposer.build_hierarchy()
+        loader = SectionTextLoader(decomposer, document_lock)
         
         text_display.delete(1.0, tk.END)
         tree.delete(*tree.get_children())
+        tree_sections.clear()
         
         
         add_back_to_toc_button()
@@ -66,33 +84,50 @@ def display_structure(hierarchy, level=0):
         if section['subsections']:
             display_structure(section['subsections'], level + 1)
 
+# В дерево добавляется только один уровень; вложенные разделы
+# вставляются при раскрытии узла (on_tree_open)
 def add_to_tree(hierarchy, parent=""):
     for section in hierarchy:
-        item_id = tree.insert(parent, "end", text=section['title'], iid=section['title'])
-        tree.item(item_id, tags=(section['start_page'], section['end_page']))
+        item_id = tree.insert(parent, "end", text=section['title'], iid=f"section_{len(tree_sections)}")
+        tree_sections[item_id] = section
 
         if section['subsections']:
-            add_to_tree(section['subsections'], parent=item_id)
+            tree.insert(item_id, "end", text="...", iid=item_id + PLACEHOLDER_SUFFIX)
+
+def on_tree_open(event):
+    item_id = tree.focus()
+    placeholder = item_id + PLACEHOLDER_SUFFIX
+    if tree.exists(placeholder):
+        tree.delete(placeholder)
+        add_to_tree(tree_sections[item_id]['subsections'], parent=item_id)
 
 def on_tree_select(event):
-    selected_item = tree.selection()[0]
-    start_page = tree.item(selected_item, 'tags')[0]
-    end_page = tree.item(selected_item, 'tags')[1]
+    selection = tree.selection()
+    if not selection or selection[0] not in tree_sections:
+        return
 
-    display_text_for_section(selected_item, int(start_page), int(end_page))
+    display_text_for_section(selection[0])
 
-def display_text_for_section(section_title, start_page, end_page):
-    try:
-        doc = fitz.open(current_pdf)
-        text = ""
-        for page_num in range(start_page - 1, end_page):
-            page = doc.load_page(page_num)
-            text += page.get_text()
+# Текст извлекается в фоновом потоке; новый выбор отменяет предыдущий запрос,
+# соседние разделы читаются заранее
+def display_text_for_section(item_id):
+    section = tree_sections[item_id]
+    neighbours = [tree.next(item_id), tree.prev(item_id)]
+    prefetch = [
+        (tree_sections[neighbour]['start_page'], tree_sections[neighbour]['end_page'])
+        for neighbour in neighbours if neighbour in tree_sections
+    ]
 
-        text_display.delete(1.0, tk.END)
-        text_display.insert(tk.END, text)
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось извлечь текст: {e}")
+    text_display.delete(1.0, tk.END)
+    text_display.insert(tk.END, f"Загрузка: {section['title']}...")
+    loader.request(item_id, section['start_page'], section['end_page'], prefetch)
+
+def poll_section_text():
+    if loader is not None:
+        for item_id, text in loader.poll():
+            text_display.delete(1.0, tk.END)
+            text_display.insert(tk.END, text)
+    root.after(50, poll_section_text)
 
 
 
@@ -108,33 +143,78 @@ def select_output_directory():
         messagebox.showwarning("Предупреждение", "Директория не выбрана.")
 
 
-def attach_text_to_deepest_sections(section, doc):
-    if not section['subsections']:
-        text = extract_text_from_pages(doc, section['start_page'], section['end_page'])
-        section['text'] = text
-    else:
-        for subsection in section['subsections']:
-            attach_text_to_deepest_sections(subsection, doc)
-
-
+# Экспорт идёт в рабочем потоке, ход показывается в отдельном окне
 def create_json_and_directories():
+    global export_progress
+
     if not hierarchy or not output_dir:
         messagebox.showwarning("Предупреждение", "Необходимо выбрать PDF файл и директорию для сохранения.")
         return
+    if export_progress is not None:
+        messagebox.showwarning("Предупреждение", "Создание каталога уже выполняется.")
+        return
 
+    export_progress = ProgressReporter()
+    json_file = os.path.join(output_dir, f"{os.path.splitext(current_pdf)[0]}.json")
+    open_progress_window(export_progress)
+    threading.Thread(
+        target=run_export,
+        args=(decomposer, export_progress, output_dir, json_file),
+        daemon=True
+    ).start()
+
+def run_export(book, progress, target_dir, json_file):
+    book.progress = progress
     try:
-        doc = fitz.open(current_pdf)
-        for section in hierarchy:
-            attach_text_to_deepest_sections(section, doc)
-        create_directory_structure(hierarchy, output_dir, current_pdf)
-
-        json_file = os.path.join(output_dir, f"{os.path.splitext(current_pdf)[0]}.json")
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(hierarchy, f, ensure_ascii=False, indent=4)
-
-        messagebox.showinfo("Успех", f"Структура сохранена и директории созданы в {output_dir}")
+        book.attach_texts()
+        book.export_sections(target_dir)
+        book.save_json(json_file)
+        progress.finish("done", f"Структура сохранена и директории созданы в {target_dir}")
+    except ExportCancelled:
+        progress.finish("cancelled", "Создание каталога отменено.")
     except Exception as e:
-        messagebox.showerror("Ошибка", f"Произошла ошибка при создании JSON и директорий: {e}")
+        get_logger("gui").exception("Ошибка экспорта %s", book.pdf_path)
+        progress.finish("error", f"Произошла ошибка при создании JSON и директорий: {e}")
+    finally:
+        book.progress = None
+
+# Окно хода экспорта: события забираются из очереди ProgressReporter в потоке Tk
+def open_progress_window(progress):
+    window = tk.Toplevel(root)
+    window.title("Создание каталога и JSON")
+    window.protocol("WM_DELETE_WINDOW", progress.cancel)
+
+    stage_label = ttk.Label(window, text="Подготовка...")
+    stage_label.pack(padx=10, pady=5)
+    progress_bar = ttk.Progressbar(window, length=400, mode="determinate")
+    progress_bar.pack(padx=10, pady=5)
+    details_label = ttk.Label(window, text="")
+    details_label.pack(padx=10, pady=5)
+    cancel_button = ttk.Button(window, text="Отмена", command=progress.cancel)
+    cancel_button.pack(pady=10)
+
+    def poll():
+        global export_progress
+
+        for event in progress.drain():
+            if event['event'] in ("done", "cancelled", "error"):
+                export_progress = None
+                window.destroy()
+                if event['event'] == "done":
+                    messagebox.showinfo("Успех", event['message'])
+                elif event['event'] == "cancelled":
+                    messagebox.showinfo("Отменено", event['message'])
+                else:
+                    messagebox.showerror("Ошибка", event['message'])
+                return
+
+            progress_bar['maximum'] = max(event['total'], 1)
+            progress_bar['value'] = event['done']
+            stage_label.config(text=event['stage'])
+            details_label.config(text=format_progress(event))
+        window.after(100, poll)
+
+    poll()
 
 
 
@@ -145,12 +225,15 @@ def add_back_to_toc_button():
 def on_back_to_toc_select(event):
     selected_item = tree.selection()[0]
     if selected_item == "toc_button":
+        if loader is not None:
+            loader.cancel()
         text_display.delete(1.0, tk.END)
         display_structure(hierarchy)
 
 
 
-def save_terminal_logs(logs):
+# Журнал текущего сеанса и метрики этапов по открытым книгам (текущая - последней)
+def save_terminal_logs():
     current_dir = os.path.dirname(os.path.abspath(__file__))
 
     log_dir = os.path.join(current_dir, '..', 'logs')
@@ -161,26 +244,15 @@ def save_terminal_logs(logs):
     log_file_name = os.path.join(log_dir, f'main_logs_{timestamp}.log')
 
     with open(log_file_name, 'w', encoding='utf-8') as log_file:
-        log_file.write(logs)
-
-def run_main_script():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-
-    main_script = os.path.join(current_dir, 'tkinter_interface.py')
-
-    result = subprocess.run(
-        ["python", main_script],
-        capture_output=True,
-        text=True
-    )
-    return result.stdout, result.stderr
-
-def open_log_terminal():
-    stdout, stderr = run_main_script()
+        log_file.write(log_handler.getvalue())
 
-    logs = f"Вывод скрипта main.py:\n{stdout}\nОшибки скрипта main.py:\n{stderr}\n"
+    metrics = PipelineMetrics()
+    metrics.books = list(session_metrics.books)
+    if decomposer is not None:
+        metrics.add_book(decomposer.metrics)
+    metrics.save(os.path.join(log_dir, f'main_metrics_{timestamp}.json'))
 
-    save_terminal_logs(logs)
+    messagebox.showinfo("Логи сохранены", f"Логи и метрики сохранены в {os.path.abspath(log_dir)}")
 
 def run_gui():
     global text_display, root, tree, output_label, log_display
@@ -188,6 +260,10 @@ def run_gui():
     root = tk.Tk()
     root.title("Книжный Парсер")
 
+    logger = get_logger()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(log_handler)
+
     open_button = ttk.Button(root, text="Открыть PDF", command=open_pdf)
     open_button.pack(pady=10)
     
@@ -212,6 +288,7 @@ def run_gui():
     tree = ttk.Treeview(tree_frame)
     tree.pack(fill=tk.BOTH, expand=True)
     tree.bind("<<TreeviewSelect>>", on_tree_select)
+    tree.bind("<<TreeviewOpen>>", on_tree_open)
 
     content_frame = ttk.Frame(root)
     content_frame.pack(side=tk.RIGHT, padx=10, pady=10)
@@ -222,9 +299,10 @@ def run_gui():
     text_display = tk.Text(content_frame, wrap="word", width=80, height=20)
     text_display.pack(fill=tk.BOTH, expand=True)
     
-    open_log_button = ttk.Button(root, text="Сохранить логи", command=open_log_terminal)
+    open_log_button = ttk.Button(root, text="Сохранить логи", command=save_terminal_logs)
     open_log_button.pack(pady=10)
 
+    poll_section_text()
     root.mainloop()
 
 if __name__ == "__main__":
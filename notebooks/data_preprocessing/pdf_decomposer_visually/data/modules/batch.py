@@ -0,0 +1,208 @@
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .decomposer import BookDecomposer
+from .instrumentation import BookMetrics, MemoryLogHandler, PipelineMetrics, capture_logs
+from .inverted_index import book_index_fresh, build_book_index
+from .manifest import BuildManifest
+from .progress import ExportCancelled, ProgressReporter
+
+
+# Поиск всех книг вида <base_dir>/<бассейн>/Книга N/*.pdf
+def discover_books(base_dir):
+    books = []
+    for basin in sorted(os.listdir(base_dir)):
+        basin_dir = os.path.join(base_dir, basin)
+        if not os.path.isdir(basin_dir):
+            continue
+        for book in sorted(os.listdir(basin_dir)):
+            book_dir = os.path.join(basin_dir, book)
+            if not os.path.isdir(book_dir):
+                continue
+            for file_name in sorted(os.listdir(book_dir)):
+                if file_name.lower().endswith(".pdf"):
+                    books.append({
+                        "basin": basin,
+                        "book": book,
+                        "name": os.path.splitext(file_name)[0].strip(),
+                        "pdf_path": os.path.join(book_dir, file_name)
+                    })
+    return books
+
+
+def book_json_path(json_dir, book):
+    return os.path.join(json_dir, book['basin'], "Исходные", f"{book['name']}.json")
+
+
+def book_output_dir(output_dir, book):
+    return os.path.join(output_dir, book['basin'], book['name'])
+
+
+# Обработка одной книги в рабочем процессе. Исключения не выходят наружу:
+# ошибка одной книги записывается в результат и не останавливает остальные.
+# Журнал книги и метрики по этапам возвращаются в результате (log, metrics).
+# page_workers > 1 - текст страниц книги извлекается в своём пуле процессов
+# (разовая пересборка одной книги; в пакете книги и так идут параллельно).
+# inverted_index=True - рядом с JSON книги строится её полнотекстовый индекс (<книга>.index),
+# batch.py --inverted-index потом только сливает индексы книг.
+def process_book(book, json_dir, output_dir=None, manifest_entry=None, leaf_only=False, jsonl=False, layout=False,
+                 streaming=False, page_workers=None, inverted_index=False):
+    result = {
+        "basin": book['basin'],
+        "book": book['book'],
+        "pdf_path": book['pdf_path'],
+        "json_path": book_json_path(json_dir, book)
+    }
+    started = time.perf_counter()
+    log = MemoryLogHandler()
+    metrics = BookMetrics(book['pdf_path'], basin=book['basin'], book=book['book'])
+
+    try:
+        os.makedirs(os.path.dirname(result['json_path']), exist_ok=True)
+        sections_dir = book_output_dir(output_dir, book) if output_dir else None
+
+        # В рабочем процессе манифест содержит только запись этой книги,
+        # обновлённая запись возвращается в основной процесс
+        manifest = None
+        if manifest_entry is not None:
+            books = {os.path.normpath(book['pdf_path']): manifest_entry} if manifest_entry else {}
+            manifest = BuildManifest(books=books)
+
+        with capture_logs(log, propagate=False), BookDecomposer(book['pdf_path'], workers=page_workers, metrics=metrics) as decomposer:
+            hierarchy = decomposer.run(
+                sections_dir, result['json_path'],
+                manifest=manifest, leaf_only=leaf_only,
+                jsonl_path=os.path.splitext(result['json_path'])[0] + ".jsonl" if jsonl else None,
+                layout=layout, streaming=streaming,
+                basin=book['basin'], file=f"{book['name']}.json"
+            )
+            result['pages'] = decomposer.page_count
+
+        # Индекс строится заново вместе с JSON; у неизменённой книги - только если его нет или он старше JSON
+        if inverted_index and (not decomposer.skipped or not book_index_fresh(result['json_path'])):
+            with metrics.stage("inverted_index"):
+                result['index_path'] = build_book_index(
+                    result['json_path'], basin=book['basin'], file=f"{book['name']}.json"
+                )
+
+        result['status'] = "ok"
+        if manifest is not None:
+            result['manifest_entry'] = manifest.entry(book['pdf_path'])
+        if decomposer.skipped:
+            result['skipped'] = True
+        elif not hierarchy:
+            result['warning'] = "оглавление не найдено или не содержит 'ВВЕДЕНИЕ'"
+        else:
+            result['sections'] = len(hierarchy)
+    except Exception as e:
+        result['status'] = "error"
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+
+    result['seconds'] = time.perf_counter() - started
+    result['log'] = log.getvalue()
+    result['metrics'] = metrics.as_dict()
+    return result
+
+
+def _failed(book, json_dir, error):
+    return {
+        "basin": book['basin'],
+        "book": book['book'],
+        "pdf_path": book['pdf_path'],
+        "json_path": book_json_path(json_dir, book),
+        "status": "error",
+        "error": f"{type(error).__name__}: {error}",
+        "seconds": 0.0
+    }
+
+
+def _print_result(result, done, total, eta=None):
+    line = f"[{done}/{total}] {result['basin']} / {result['book']}: "
+    if result.get('skipped'):
+        line += "без изменений, пропущена"
+    elif result['status'] == "ok":
+        line += f"{result['seconds']:.1f} с"
+        if result.get('warning'):
+            line += f" (предупреждение: {result['warning']})"
+    else:
+        line += f"ОШИБКА {result['error']}"
+    if eta is not None:
+        line += f", осталось ~{eta:.0f} с"
+    print(line)
+
+
+# Пакетная декомпозиция всего корпуса в пуле процессов.
+# Манифест (если указан) читается и сохраняется только основным процессом.
+# progress (ProgressReporter) получает событие на каждую книгу; его cancel()
+# отменяет ещё не начатые книги (ExportCancelled).
+def run_batch(base_dir, json_dir, output_dir=None, workers=None, manifest_path=None, leaf_only=False, jsonl=False,
+              layout=False, streaming=False, progress=None, page_workers=None, inverted_index=False):
+    books = discover_books(base_dir)
+    # Крупные книги запускаются первыми, чтобы в конце не ждать одну длинную задачу
+    books.sort(key=lambda book: os.path.getsize(book['pdf_path']), reverse=True)
+    manifest = BuildManifest(manifest_path) if manifest_path else None
+    results = []
+    progress = progress if progress is not None else ProgressReporter()
+    progress.start(len(books), "Книги")
+
+    def manifest_entry(book):
+        if manifest is None:
+            return None
+        return manifest.entry(book['pdf_path']) or {}
+
+    def collect(result):
+        entry = result.pop('manifest_entry', None)
+        if manifest is not None and entry is not None:
+            manifest.books[os.path.normpath(result['pdf_path'])] = entry
+        results.append(result)
+        progress.advance(pages=result.get('pages', 0), message=result['pdf_path'])
+        _print_result(result, len(results), len(books), progress.eta())
+        progress.check()
+
+    try:
+        if workers == 1:
+            for book in books:
+                collect(process_book(book, json_dir, output_dir, manifest_entry(book), leaf_only, jsonl, layout,
+                                     streaming, page_workers, inverted_index))
+            return results
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(process_book, book, json_dir, output_dir, manifest_entry(book), leaf_only, jsonl, layout,
+                            streaming, page_workers, inverted_index): book
+                for book in books
+            }
+            try:
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # Падение самого рабочего процесса (например, из-за памяти)
+                        result = _failed(futures[future], json_dir, e)
+                    collect(result)
+            except ExportCancelled:
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        if manifest is not None:
+            manifest.save()
+
+    return results
+
+
+def batch_metrics(results):
+    metrics = PipelineMetrics()
+    for result in results:
+        if result.get('metrics'):
+            metrics.add_book(result['metrics'])
+    return metrics
+
+
+def save_batch_report(results, report_path):
+    with open(report_path, 'w', encoding='utf-8') as report_file:
+        json.dump(results, report_file, ensure_ascii=False, indent=4)
@@ -0,0 +1,118 @@
+from bisect import bisect_right
+
+
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_OVERLAP = 100
+
+
+# Токенизация пачки текстов быстрым токенизатором (transformers, use_fast=True):
+# для каждого текста - ID токенов и смещения токенов в исходной строке
+def tokenize_texts(tokenizer, texts, batch_size=64):
+    for start in range(0, len(texts), batch_size):
+        encoded = tokenizer(
+            texts[start:start + batch_size],
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False
+        )
+        yield from zip(encoded['input_ids'], encoded['offset_mapping'])
+
+
+# Окна [start, end) по токенам с перекрытием; последнее окно заканчивается на конце текста
+def token_windows(num_tokens, max_tokens=DEFAULT_MAX_TOKENS, overlap=DEFAULT_OVERLAP):
+    if overlap >= max_tokens:
+        raise ValueError("Перекрытие должно быть меньше длины фрагмента")
+    windows = []
+    start = 0
+    while True:
+        end = min(start + max_tokens, num_tokens)
+        windows.append((start, end))
+        if end >= num_tokens:
+            return windows
+        start += max_tokens - overlap
+
+
+# Длина окна фрагмента для модели SentenceTransformer: max_seq_length без специальных
+# токенов, которые encode_token_ids добавит к фрагменту. Больший max_tokens уменьшается до неё.
+def model_max_tokens(model, max_tokens=None):
+    limit = model.max_seq_length - model.tokenizer.num_special_tokens_to_add(pair=False)
+    return limit if max_tokens is None else min(max_tokens, limit)
+
+
+# Фрагменты текста по уже посчитанным токенам: текст фрагмента - точный срез
+# исходной строки по смещениям, без повторного декодирования токенов
+def chunk_tokens(text, input_ids, offsets, max_tokens=DEFAULT_MAX_TOKENS, overlap=DEFAULT_OVERLAP):
+    if len(input_ids) <= max_tokens:
+        return [{"text": text, "token_ids": list(input_ids), "char_start": 0, "char_end": len(text)}]
+
+    chunks = []
+    for start, end in token_windows(len(input_ids), max_tokens, overlap):
+        char_start = offsets[start][0]
+        char_end = offsets[end - 1][1]
+        chunks.append({
+            "text": text[char_start:char_end],
+            "token_ids": list(input_ids[start:end]),
+            "char_start": char_start,
+            "char_end": char_end
+        })
+    return chunks
+
+
+# Начала страниц в тексте раздела, если точные смещения неизвестны:
+# считаем, что страницы раздела имеют одинаковую длину
+def estimate_page_offsets(text, start_page, end_page):
+    pages = max(end_page - start_page + 1, 1)
+    return [len(text) * page // pages for page in range(pages)]
+
+
+def page_at(page_offsets, start_page, char_offset):
+    return start_page + max(bisect_right(page_offsets, char_offset) - 1, 0)
+
+
+def _chunk_metadata(section, chunk, index, total, page_offsets):
+    metadata = {
+        key: value for key, value in section.items()
+        if key not in ('text', 'subsections', 'page_offsets')
+    }
+    start_page = section.get('start_page', 0)
+    metadata.update({
+        "chunk_index": index,
+        "total_chunks": total,
+        "char_start": chunk['char_start'],
+        "char_end": chunk['char_end'],
+        "token_count": len(chunk['token_ids']),
+        "chunk_start_page": page_at(page_offsets, start_page, chunk['char_start']),
+        "chunk_end_page": page_at(page_offsets, start_page, max(chunk['char_end'] - 1, chunk['char_start']))
+    })
+    return metadata
+
+
+# Разбиение конечных разделов на фрагменты по max_tokens токенов с перекрытием.
+# Каждый раздел токенизируется один раз; на выходе документы в формате all_documents.json
+# ({"metadata", "page_content"}) и ID токенов фрагмента для encode_token_ids.
+# Точные страницы фрагмента считаются по section['page_offsets'] (их пишет декомпозиция),
+# иначе оцениваются по длине текста.
+def chunk_sections(sections, tokenizer, max_tokens=DEFAULT_MAX_TOKENS, overlap=DEFAULT_OVERLAP, batch_size=64):
+    batch = []
+    for section in sections:
+        batch.append(section)
+        if len(batch) >= batch_size:
+            yield from _chunk_batch(batch, tokenizer, max_tokens, overlap)
+            batch = []
+    if batch:
+        yield from _chunk_batch(batch, tokenizer, max_tokens, overlap)
+
+
+def _chunk_batch(sections, tokenizer, max_tokens, overlap):
+    texts = [section.get('text', "") for section in sections]
+    for section, text, (input_ids, offsets) in zip(sections, texts, tokenize_texts(tokenizer, texts, len(texts))):
+        page_offsets = section.get('page_offsets') or estimate_page_offsets(
+            text, section.get('start_page', 0), section.get('end_page', 0)
+        )
+        chunks = chunk_tokens(text, input_ids, offsets, max_tokens, overlap)
+        for index, chunk in enumerate(chunks, start=1):
+            yield {
+                "metadata": _chunk_metadata(section, chunk, index, len(chunks), page_offsets),
+                "page_content": chunk['text'],
+                "token_ids": chunk['token_ids']
+            }
@@ -0,0 +1,231 @@
+import json
+import os
+
+import numpy as np
+
+from .json_stream import iter_json_array
+
+
+# 2: книги - пары (бассейн, файл), смещения страниц и разметка разделов
+STORE_VERSION = 2
+
+# Типизированные колонки метаданных: имя -> dtype
+COLUMNS = {
+    "level": np.int8,
+    "start_page": np.int32,
+    "end_page": np.int32,
+    "parent": np.int32,
+    "leaf": np.bool_,
+    "basin": np.int16,
+    "file": np.int16
+}
+
+# Строковые колонки: байты UTF-8 одним блоком + смещения.
+# layout - разметка раздела (режим layout декомпозера) в JSON, пустая строка - нет разметки
+BLOBS = ("text", "title", "layout")
+
+# Колонки переменной длины: значения всех разделов подряд + смещения
+RAGGED = {
+    "page_offsets": np.int64
+}
+
+
+# JSON книг декомпозиции: <json_dir>/<бассейн>/Исходные/*.json
+def iter_corpus_json(json_dir, subdir="Исходные"):
+    for basin in sorted(os.listdir(json_dir)):
+        books_dir = os.path.join(json_dir, basin, subdir)
+        if not os.path.isdir(books_dir):
+            continue
+        for file_name in sorted(os.listdir(books_dir)):
+            if file_name.endswith(".json"):
+                yield basin, file_name, os.path.join(books_dir, file_name)
+
+
+class _BlobWriter:
+    def __init__(self, path):
+        self.blob = open(path, 'wb')
+        self.offsets = [0]
+
+    def append(self, value):
+        data = value.encode('utf-8')
+        self.blob.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self, offsets_path):
+        self.blob.close()
+        np.save(offsets_path, np.asarray(self.offsets, dtype=np.int64))
+
+
+class _RaggedWriter:
+    def __init__(self):
+        self.values = []
+        self.offsets = [0]
+
+    def append(self, values):
+        self.values.extend(values)
+        self.offsets.append(len(self.values))
+
+    def save(self, values_path, offsets_path, dtype):
+        np.save(values_path, np.asarray(self.values, dtype=dtype))
+        np.save(offsets_path, np.asarray(self.offsets, dtype=np.int64))
+
+
+# Сборка хранилища из JSON книг. Книги читаются потоково, текст сразу уходит на диск,
+# в памяти копятся только небольшие колонки метаданных.
+# Книга - пара (бассейн, файл): имена файлов в разных бассейнах повторяются.
+def build_corpus_store(books, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    blobs = {name: _BlobWriter(os.path.join(output_dir, f"{name}.bin")) for name in BLOBS}
+    ragged = {name: _RaggedWriter() for name in RAGGED}
+    columns = {name: [] for name in COLUMNS}
+    basins = []
+    book_keys = []
+
+    for basin, file_name, json_path in books:
+        if basin not in basins:
+            basins.append(basin)
+        book_keys.append([basin, file_name])
+        basin_code = basins.index(basin)
+        file_code = len(book_keys) - 1
+
+        for top_section in iter_json_array(json_path):
+            stack = [(top_section, -1)]
+            while stack:
+                section, parent = stack.pop()
+                row = len(columns['level'])
+                subsections = section.get('subsections', [])
+
+                blobs['text'].append(section.get('text', ""))
+                blobs['title'].append(section.get('title', ""))
+                layout = section.get('layout')
+                blobs['layout'].append(json.dumps(layout, ensure_ascii=False) if layout is not None else "")
+                ragged['page_offsets'].append(section.get('page_offsets', []))
+                columns['level'].append(section.get('level', 0))
+                columns['start_page'].append(section.get('start_page', 0))
+                columns['end_page'].append(section.get('end_page', 0))
+                columns['parent'].append(parent)
+                columns['leaf'].append(not subsections)
+                columns['basin'].append(basin_code)
+                columns['file'].append(file_code)
+
+                stack.extend((subsection, row) for subsection in reversed(subsections))
+
+    for name, writer in blobs.items():
+        writer.close(os.path.join(output_dir, f"{name}_offsets.npy"))
+    for name, writer in ragged.items():
+        writer.save(os.path.join(output_dir, f"{name}.npy"), os.path.join(output_dir, f"{name}_index.npy"), RAGGED[name])
+    for name, dtype in COLUMNS.items():
+        np.save(os.path.join(output_dir, f"{name}.npy"), np.asarray(columns[name], dtype=dtype))
+
+    meta = {
+        "version": STORE_VERSION,
+        "count": len(columns['level']),
+        "basins": basins,
+        "books": book_keys
+    }
+    with open(os.path.join(output_dir, "meta.json"), 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file, ensure_ascii=False, indent=4)
+    return meta
+
+
+def convert_json_dir(json_dir, output_dir):
+    return build_corpus_store(iter_corpus_json(json_dir), output_dir)
+
+
+# Хранилище корпуса: колонки и тексты отображаются в память (mmap),
+# открытие не читает и не декодирует тексты
+class CorpusStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as meta_file:
+            self.meta = json.load(meta_file)
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError(f"Неподдерживаемая версия хранилища: {self.meta.get('version')}")
+
+        self.basins = self.meta['basins']
+        self.books = [tuple(book) for book in self.meta['books']]
+        self.files = [file_name for _, file_name in self.books]
+        self.columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in COLUMNS
+        }
+        self._ragged = {
+            name: (
+                np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r'),
+                np.load(os.path.join(path, f"{name}_index.npy"), mmap_mode='r')
+            )
+            for name in RAGGED
+        }
+        self._blobs = {}
+        self._offsets = {}
+        for name in BLOBS:
+            self._offsets[name] = np.load(os.path.join(path, f"{name}_offsets.npy"), mmap_mode='r')
+            blob_path = os.path.join(path, f"{name}.bin")
+            # np.memmap не умеет отображать пустой файл
+            if os.path.getsize(blob_path):
+                self._blobs[name] = np.memmap(blob_path, dtype=np.uint8, mode='r')
+            else:
+                self._blobs[name] = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return self.meta['count']
+
+    # Байты строки без копирования (срез отображённого файла)
+    def raw(self, name, row):
+        offsets = self._offsets[name]
+        return memoryview(self._blobs[name][offsets[row]:offsets[row + 1]])
+
+    def text(self, row):
+        return bytes(self.raw('text', row)).decode('utf-8')
+
+    def title(self, row):
+        return bytes(self.raw('title', row)).decode('utf-8')
+
+    # Начала страниц раздела в его тексте (как section['page_offsets'] в JSON)
+    def page_offsets(self, row):
+        values, index = self._ragged['page_offsets']
+        return values[index[row]:index[row + 1]]
+
+    def layout(self, row):
+        data = bytes(self.raw('layout', row))
+        return json.loads(data) if data else None
+
+    # Длины текстов в байтах UTF-8, без чтения самих текстов
+    def text_sizes(self):
+        return np.diff(self._offsets['text'])
+
+    # Запись раздела; page_offsets и layout - только если они были в JSON
+    def record(self, row):
+        record = {
+            "title": self.title(row),
+            "level": int(self.columns['level'][row]),
+            "start_page": int(self.columns['start_page'][row]),
+            "end_page": int(self.columns['end_page'][row]),
+            "text": self.text(row),
+            "basin": self.basins[self.columns['basin'][row]],
+            "file": self.files[self.columns['file'][row]]
+        }
+        page_offsets = self.page_offsets(row)
+        if len(page_offsets):
+            record['page_offsets'] = page_offsets.tolist()
+        layout = self.layout(row)
+        if layout is not None:
+            record['layout'] = layout
+        return record
+
+    # Номера строк по фильтру метаданных; book - пара (бассейн, файл)
+    def select(self, basin=None, book=None, leaves_only=False):
+        mask = np.ones(len(self), dtype=bool)
+        if basin is not None:
+            mask &= self.columns['basin'] == self.basins.index(basin)
+        if book is not None:
+            mask &= self.columns['file'] == self.books.index(tuple(book))
+        if leaves_only:
+            mask &= self.columns['leaf']
+        return np.flatnonzero(mask)
+
+    def iter_records(self, rows=None):
+        if rows is None:
+            rows = range(len(self))
+        for row in rows:
+            yield self.record(int(row))
@@ -0,0 +1,338 @@
+import datetime
+import json
+import os
+
+import numpy as np
+
+from .instrumentation import get_logger
+
+logger = get_logger("dashboard_aggregates")
+
+
+DASHBOARD_VERSION = 2
+SCROLL_BATCH = 1024
+# Столбцы статистики длин текста в группе
+LENGTH_STATS = ("count", "mean", "median", "p90", "max")
+
+
+# Постраничный обход коллекции Qdrant: пачки точек по batch_size,
+# следующая страница запрашивается по next_page_offset
+def iter_points(client, collection_name, batch_size=SCROLL_BATCH, with_vectors=True, scroll_filter=None):
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=with_vectors
+        )
+        if points:
+            yield points
+        if offset is None:
+            return
+
+
+def _content_length(payload):
+    content = payload.get('content')
+    if content:
+        return len(content)
+    # Точки без текста в payload (include_content=False): длина по смещениям фрагмента
+    return max(int(payload.get('char_end') or 0) - int(payload.get('char_start') or 0), 0)
+
+
+# Один проход по коллекции: метаданные и векторы всех точек.
+# encode(texts) - если задан, точки без вектора векторизуются пачками
+# (по пачке scroll) и дозагружаются в коллекцию.
+def collect_points(client, collection_name, encode=None, batch_size=SCROLL_BATCH):
+    from .qdrant_upload import upsert_with_retry
+
+    rows = {"ids": [], "basin": [], "file": [], "level": [], "start_page": [], "end_page": [], "content_length": []}
+    vectors = []
+    missing = 0
+    for points in iter_points(client, collection_name, batch_size):
+        absent = [point for point in points if point.vector is None and point.payload.get('content')]
+        if absent and encode is not None:
+            from qdrant_client.models import PointStruct
+
+            encoded = np.asarray(encode([point.payload['content'] for point in absent]), dtype=np.float32)
+            upsert_with_retry(client, collection_name, [
+                PointStruct(id=point.id, vector=vector.tolist(), payload=point.payload)
+                for point, vector in zip(absent, encoded)
+            ])
+            for point, vector in zip(absent, encoded):
+                point.vector = vector
+
+        for point in points:
+            if point.vector is None:
+                missing += 1
+                continue
+            payload = point.payload or {}
+            rows['ids'].append(str(point.id))
+            rows['basin'].append(str(payload.get('basin', "")))
+            rows['file'].append(str(payload.get('file', "")))
+            rows['level'].append(int(payload.get('level') or 0))
+            rows['start_page'].append(int(payload.get('start_page') or 0))
+            rows['end_page'].append(int(payload.get('end_page') or 0))
+            rows['content_length'].append(_content_length(payload))
+            vectors.append(np.asarray(point.vector, dtype=np.float32))
+
+    if missing:
+        logger.warning("Точек без вектора пропущено: %s", missing)
+    vectors = np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+    return rows, vectors
+
+
+# Главные компоненты через собственные векторы ковариационной матрицы D x D:
+# она копится по пачкам строк, поэтому временная память не зависит от числа точек.
+# Знак каждой компоненты фиксируется, чтобы картинка не отражалась между пересборками.
+def pca_projection(vectors, components=2, batch_size=8192):
+    count, dim = vectors.shape
+    mean = vectors.mean(axis=0, dtype=np.float64)
+    covariance = np.zeros((dim, dim), dtype=np.float64)
+    for start in range(0, count, batch_size):
+        centered = vectors[start:start + batch_size] - mean
+        covariance += centered.T @ centered
+    covariance /= max(count - 1, 1)
+
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1][:components]
+    axes = eigenvectors[:, order].T
+    signs = np.sign(axes[np.arange(len(order)), np.abs(axes).argmax(axis=1)])
+    axes *= signs[:, None]
+
+    projection = np.empty((count, len(order)), dtype=np.float32)
+    for start in range(0, count, batch_size):
+        projection[start:start + batch_size] = (vectors[start:start + batch_size] - mean) @ axes.T
+    total = eigenvalues.sum()
+    ratio = eigenvalues[order] / total if total > 0 else np.zeros(len(order))
+    return projection, {"mean": mean.astype(np.float32), "components": axes.astype(np.float32), "explained_variance_ratio": ratio}
+
+
+def _codes(values):
+    labels, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return labels, codes.astype(np.int32)
+
+
+def length_stats(lengths, codes, groups):
+    stats = np.zeros((groups, len(LENGTH_STATS)), dtype=np.float64)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(groups + 1))
+    for group in range(groups):
+        values = lengths[order[bounds[group]:bounds[group + 1]]]
+        if len(values):
+            stats[group] = (len(values), values.mean(), np.median(values), np.percentile(values, 90), values.max())
+    return stats
+
+
+# Книги: имя файла повторяется в разных бассейнах ("Книга_1.json"), поэтому
+# книга - пара (бассейн, файл). Возвращает имена файлов книг, бассейн каждой книги
+# (код в basins) и код книги каждой точки.
+def _book_codes(basin_codes, files):
+    pairs = sorted(set(zip(basin_codes.tolist(), files)))
+    codes = {pair: code for code, pair in enumerate(pairs)}
+    book_codes = np.fromiter((codes[pair] for pair in zip(basin_codes.tolist(), files)), dtype=np.int32, count=len(files))
+    book_files = np.asarray([file_name for _, file_name in pairs], dtype=str)
+    book_basins = np.asarray([basin_code for basin_code, _ in pairs], dtype=np.int32)
+    return book_files, book_basins, book_codes
+
+
+# Таблица дашборда: столбцы точек (бассейн, книга и уровень - коды в списки меток),
+# двумерная проекция векторов и готовые агрегаты по бассейнам, книгам и уровням
+def build_aggregates(rows, vectors):
+    basins, basin_codes = _codes(rows['basin'])
+    files, file_basin, file_codes = _book_codes(basin_codes, [str(file_name) for file_name in rows['file']])
+    levels, level_codes = np.unique(np.asarray(rows['level'], dtype=np.int32), return_inverse=True)
+    lengths = np.asarray(rows['content_length'], dtype=np.int32)
+
+    data = {
+        "ids": np.asarray(rows['ids'], dtype=str),
+        "basin_codes": basin_codes,
+        "file_codes": file_codes,
+        "level_codes": level_codes.astype(np.int32),
+        "start_page": np.asarray(rows['start_page'], dtype=np.int32),
+        "end_page": np.asarray(rows['end_page'], dtype=np.int32),
+        "content_length": lengths,
+        "basins": basins,
+        "files": files,
+        "file_basin": file_basin,
+        "levels": levels.astype(np.int32)
+    }
+
+    for name, codes, labels in (("basin", basin_codes, basins), ("file", file_codes, files), ("level", level_codes, levels)):
+        data[f"counts_{name}"] = np.bincount(codes, minlength=len(labels)).astype(np.int64)
+        data[f"length_stats_{name}"] = length_stats(lengths, codes, len(labels))
+
+    if len(vectors):
+        projection, pca = pca_projection(vectors)
+        data['projection'] = projection
+        data.update({f"pca_{key}": value for key, value in pca.items()})
+    else:
+        data['projection'] = np.empty((0, 2), dtype=np.float32)
+    return data
+
+
+def save_dashboard(path, data, **meta):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    meta = dict(meta, version=DASHBOARD_VERSION, points=len(data['ids']),
+                created=datetime.datetime.now().isoformat(timespec='seconds'))
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(tmp_path, meta=np.asarray(json.dumps(meta, ensure_ascii=False)), **data)
+    os.replace(tmp_path, path)
+
+
+# Офлайн-агрегация коллекции в компактный файл для дашборда (.npz)
+def build_dashboard_file(client, collection_name, path, encode=None, batch_size=SCROLL_BATCH):
+    rows, vectors = collect_points(client, collection_name, encode=encode, batch_size=batch_size)
+    data = build_aggregates(rows, vectors)
+    save_dashboard(path, data, collection=collection_name, dim=int(vectors.shape[1]) if len(vectors) else 0)
+    logger.info("Агрегаты дашборда: %s точек, файл %s (%s байт)", len(rows['ids']), path, os.path.getsize(path))
+    return data
+
+
+# Данные дашборда из файла build_dashboard_file. Фильтры - списки меток бассейнов,
+# значений уровня и книг; книга - пара (бассейн, файл), её номер - индекс в books.
+# Без фильтров используются готовые агрегаты.
+class DashboardData:
+    def __init__(self, data, meta):
+        self.data = data
+        self.meta = meta
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as archive:
+            data = {name: archive[name] for name in archive.files if name != 'meta'}
+            meta = json.loads(str(archive['meta']))
+        if meta.get('version') != DASHBOARD_VERSION:
+            raise ValueError(f"Неподдерживаемая версия файла дашборда: {meta.get('version')}")
+        return cls(data, meta)
+
+    def __len__(self):
+        return len(self.data['ids'])
+
+    @property
+    def basins(self):
+        return self.data['basins'].tolist()
+
+    # Книги: [(бассейн, файл), ...] в порядке кодов книг
+    @property
+    def books(self):
+        basins = self.basins
+        return [(basins[basin], file_name)
+                for basin, file_name in zip(self.data['file_basin'].tolist(), self.data['files'].tolist())]
+
+    def book_labels(self):
+        return np.asarray([f"{basin} / {file_name}" for basin, file_name in self.books], dtype=str)
+
+    def labels(self, by):
+        return self.book_labels() if by == "file" else self.data[f"{by}s"]
+
+    @property
+    def levels(self):
+        return self.data['levels'].tolist()
+
+    def _select(self, column, labels, selected):
+        codes = np.flatnonzero(np.isin(labels, selected))
+        return np.isin(self.data[f"{column}_codes"], codes)
+
+    # Коды книг по парам (бассейн, файл); неизвестные пары пропускаются
+    def book_codes(self, books):
+        codes = {book: code for code, book in enumerate(self.books)}
+        return [codes[tuple(book)] for book in books if tuple(book) in codes]
+
+    # Маска точек по фильтрам; books - пары (бассейн, файл); None - фильтров нет
+    def mask(self, basins=None, levels=None, books=None):
+        mask = None
+        selections = [
+            self._select(column, self.data[f"{column}s"], selected)
+            for column, selected in (("basin", basins), ("level", levels)) if selected
+        ]
+        if books:
+            selections.append(np.isin(self.data['file_codes'], self.book_codes(books)))
+        for selection in selections:
+            mask = selection if mask is None else mask & selection
+        return mask
+
+    # Число точек по бассейнам, книгам (file, метки "бассейн / файл") или уровням: (метки, числа)
+    def counts(self, by="basin", mask=None):
+        labels = self.labels(by)
+        if mask is None:
+            return labels, self.data[f"counts_{by}"]
+        return labels, np.bincount(self.data[f"{by}_codes"][mask], minlength=len(labels))
+
+    def length_stats(self, by="basin", mask=None):
+        labels = self.labels(by)
+        if mask is None:
+            return labels, self.data[f"length_stats_{by}"]
+        return labels, length_stats(self.data['content_length'][mask], self.data[f"{by}_codes"][mask], len(labels))
+
+    def column(self, name, mask=None):
+        values = self.data[name]
+        return values if mask is None else values[mask]
+
+    def page_counts(self, mask=None):
+        return self.column('end_page', mask) - self.column('start_page', mask) + 1
+
+    # Гистограмма: (левые границы корзин, числа)
+    def histogram(self, values, bins=30):
+        counts, edges = np.histogram(values, bins=bins)
+        return edges[:-1], counts
+
+    # Проекция для точечного графика: x, y, метки бассейнов и ID точек.
+    # max_points ограничивает число точек равномерным прореживанием.
+    def projection(self, mask=None, max_points=None):
+        indices = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        if max_points and len(indices) > max_points:
+            indices = indices[np.linspace(0, len(indices) - 1, max_points).astype(np.int64)]
+        points = self.data['projection'][indices]
+        return points[:, 0], points[:, 1], self.data['basins'][self.data['basin_codes'][indices]], self.data['ids'][indices]
+
+
+def _filter(basins=None, levels=None, books=None):
+    from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue
+
+    conditions = [
+        FieldCondition(key=key, match=MatchAny(any=list(values)))
+        for key, values in (("basin", basins), ("level", levels))
+        if values
+    ]
+    # Книга - пара (бассейн, файл): точка подходит, если совпадает одна из пар
+    if books:
+        conditions.append(Filter(should=[
+            Filter(must=[
+                FieldCondition(key="basin", match=MatchValue(value=basin)),
+                FieldCondition(key="file", match=MatchValue(value=file_name))
+            ])
+            for basin, file_name in books
+        ]))
+    return Filter(must=conditions) if conditions else None
+
+
+# Страница точек для детального просмотра - запрос к Qdrant с фильтром на стороне сервера,
+# без векторов. books - пары (бассейн, файл). Возвращает (строки, offset следующей страницы или None).
+def fetch_page(client, collection_name, basins=None, levels=None, books=None, limit=20, offset=None, text_chars=500):
+    points, next_offset = client.scroll(
+        collection_name=collection_name,
+        scroll_filter=_filter(basins, levels, books),
+        limit=limit,
+        offset=offset,
+        with_payload=True,
+        with_vectors=False
+    )
+    rows = []
+    for point in points:
+        payload = point.payload or {}
+        rows.append({
+            "id": str(point.id),
+            "basin": payload.get('basin'),
+            "file": payload.get('file'),
+            "level": payload.get('level'),
+            "title": payload.get('title'),
+            "start_page": payload.get('start_page'),
+            "end_page": payload.get('end_page'),
+            "content": (payload.get('content') or "")[:text_chars]
+        })
+    return rows, next_offset
@@ -0,0 +1,231 @@
+import os
+from contextlib import nullcontext
+
+import fitz
+
+from .instrumentation import BookMetrics
+from .text_by_toc import extract_toc_from_pdf
+from .json_stream import save_leaves_to_jsonl
+from .manifest import file_hash
+from .page_cache import get_page_cache
+from .page_layout import section_layout
+from .parallel_extract import extract_pages_parallel
+from .section_tree import SectionTree
+from .streaming import stream_book
+from .pdf_to_folders import (
+    create_directory_structure,
+    save_hierarchy_to_json
+)
+
+
+# Декомпозиция одной книги: документ открывается один раз, оглавление,
+# иерархия, тексты разделов, PDF разделов и JSON строятся от одного объекта.
+# workers > 1 - текст страниц извлекается параллельно в пуле процессов.
+# progress (ProgressReporter) получает ход извлечения текста, экспорта PDF и записи JSON.
+# metrics (BookMetrics) копит время, страницы и записанные байты по этапам.
+# lock - если документ читают и другие потоки (навигатор GUI): берётся на каждую
+# страницу при извлечении текста и на каждый раздел при экспорте.
+class BookDecomposer:
+    def __init__(self, pdf_path, workers=None, progress=None, metrics=None, lock=None):
+        self.pdf_path = pdf_path
+        self.workers = workers
+        self.progress = progress
+        self.metrics = metrics if metrics is not None else BookMetrics(pdf_path)
+        self.lock = lock if lock is not None else nullcontext()
+        self.doc = fitz.open(pdf_path)
+        self.toc = None
+        self.tree = None
+        self.hierarchy = None
+        self.page_cache = get_page_cache(self.doc)
+        self.skipped = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.doc is not None:
+            self.doc.close()
+            self.doc = None
+
+    @property
+    def page_count(self):
+        return self.doc.page_count
+
+    def build_hierarchy(self):
+        with self.metrics.stage("toc_read"):
+            self.toc = extract_toc_from_pdf(self.pdf_path, doc=self.doc)
+        # Иерархия и исправление end_page - один проход SectionTree
+        with self.metrics.stage("hierarchy_build"):
+            self.tree = SectionTree.from_toc(self.toc, self.doc.page_count)
+            self.hierarchy = self.tree.to_hierarchy()
+        return self.hierarchy
+
+    # Один проход по страницам: текст (или разметка при layout=True)
+    # каждой нужной страницы извлекается один раз
+    def read_pages(self, layout=False):
+        if self.hierarchy is None:
+            self.build_hierarchy()
+
+        needed = set()
+        for section in iter_leaf_sections(self.hierarchy):
+            needed.update(range(section['start_page'] - 1, section['end_page']))
+
+        if self.progress is not None:
+            self.progress.start(len(needed), "Извлечение текста")
+
+        with self.metrics.stage("text_extraction"):
+            self._read_pages(needed, layout)
+        self.metrics.add("text_extraction", pages=len(needed))
+        return self.page_cache
+
+    def _read_pages(self, needed, layout):
+        if not layout and self.workers and self.workers > 1:
+            texts = extract_pages_parallel(self.pdf_path, needed, self.workers)
+            with self.lock:
+                for page_num in sorted(texts):
+                    self.page_cache.put_text(page_num, texts[page_num])
+            if self.progress is not None:
+                self.progress.advance(done=len(texts), pages=len(texts))
+                self.progress.check()
+            return
+
+        for page_num in sorted(needed):
+            with self.lock:
+                if layout:
+                    self.page_cache.get_layout(page_num)
+                else:
+                    self.page_cache.get_text(page_num)
+            if self.progress is not None:
+                self.progress.advance(pages=1)
+                self.progress.check()
+
+    def text_for_pages(self, start_page, end_page):
+        with self.lock:
+            return self.page_cache.text_for_pages(start_page, end_page)
+
+    # Рядом с текстом раздела сохраняются точные начала его страниц в тексте (page_offsets) -
+    # по ним фрагменты и полнотекстовый индекс ссылаются на страницы.
+    # С layout=True сохраняется и разметка: блоки, таблицы построчно и число изображений по страницам
+    def attach_texts(self, layout=False):
+        self.read_pages(layout)
+        for section in iter_leaf_sections(self.hierarchy):
+            section['text'] = self.text_for_pages(section['start_page'], section['end_page'])
+            section['page_offsets'] = self.page_offsets(section['start_page'], section['end_page'])
+            if layout:
+                with self.lock:
+                    pages = self.page_cache.layout_for_pages(section['start_page'], section['end_page'])
+                section['layout'] = section_layout(pages)
+        return self.hierarchy
+
+    def leaf_texts(self):
+        self.read_pages()
+        return [
+            {
+                "title": section['title'],
+                "start_page": section['start_page'],
+                "end_page": section['end_page'],
+                "text": self.text_for_pages(section['start_page'], section['end_page']),
+                "page_offsets": self.page_offsets(section['start_page'], section['end_page'])
+            }
+            for section in iter_leaf_sections(self.hierarchy)
+        ]
+
+    def page_offsets(self, start_page, end_page):
+        with self.lock:
+            return self.page_cache.page_offsets(start_page, end_page)
+
+    def export_sections(self, base_path, manifest=None, leaf_only=False):
+        if self.hierarchy is None:
+            self.build_hierarchy()
+        if self.progress is not None:
+            self.progress.start(count_sections(self.hierarchy), "Экспорт PDF")
+        with self.metrics.stage("pdf_export"):
+            pages, bytes_written = create_directory_structure(
+                self.hierarchy, base_path, self.pdf_path,
+                doc=self.doc, manifest=manifest, leaf_only=leaf_only, progress=self.progress, lock=self.lock
+            )
+        self.metrics.add("pdf_export", pages=pages, bytes_written=bytes_written)
+
+    def save_json(self, output_path, manifest=None):
+        if self.progress is not None:
+            self.progress.start(1, "Сохранение JSON")
+        with self.metrics.stage("json_write"):
+            save_hierarchy_to_json(
+                self.hierarchy, output_path,
+                manifest=manifest, pdf_path=self.pdf_path, progress=self.progress
+            )
+        self.metrics.add("json_write", bytes_written=os.path.getsize(output_path))
+
+    def save_jsonl(self, output_path, **metadata):
+        return save_leaves_to_jsonl(self.hierarchy, output_path, **metadata)
+
+    def run_streaming(self, base_path=None, json_path=None, manifest=None, leaf_only=False, jsonl_path=None, **metadata):
+        if self.tree is None:
+            self.build_hierarchy()
+        stream_book(
+            self.doc, self.pdf_path, self.tree, json_path=json_path, base_path=base_path, jsonl_path=jsonl_path,
+            leaf_only=leaf_only, manifest=manifest, progress=self.progress, metrics=self.metrics, **metadata
+        )
+
+    # Полный цикл: иерархия -> тексты -> PDF разделов -> JSON (и JSON Lines).
+    # С манифестом неизменённая книга пропускается целиком (возвращается None),
+    # а у изменённой пересоздаются только изменившиеся разделы.
+    # streaming=True - потоковый режим для очень больших книг (см. streaming.stream_book):
+    # тексты разделов не копятся в памяти, и возвращаемая иерархия их не содержит.
+    def run(self, base_path=None, json_path=None, manifest=None, leaf_only=False, jsonl_path=None, layout=False,
+            streaming=False, **metadata):
+        if streaming and layout:
+            raise ValueError("Разметка страниц (layout) не поддерживается в потоковом режиме")
+        if manifest is not None:
+            targets = [base_path, json_path, "leaf_only" if leaf_only else None, jsonl_path]
+            if layout:
+                targets.append("layout")
+            content_hash = file_hash(self.pdf_path)
+            if manifest.book_unchanged(self.pdf_path, content_hash, targets):
+                self.skipped = True
+                return None
+            manifest.start_book(self.pdf_path, content_hash, targets)
+
+        self.build_hierarchy()
+        # Отпечаток оглавления нужен до экспорта: по нему проверяются индексы разделов
+        if manifest is not None:
+            manifest.set_toc(self.pdf_path, self.toc, self.doc.page_count)
+        if streaming:
+            self.run_streaming(base_path, json_path, manifest=manifest, leaf_only=leaf_only, jsonl_path=jsonl_path, **metadata)
+        else:
+            self.attach_texts(layout)
+            if base_path is not None:
+                self.export_sections(base_path, manifest=manifest, leaf_only=leaf_only)
+            if json_path is not None:
+                self.save_json(json_path, manifest=manifest)
+            if jsonl_path is not None:
+                self.save_jsonl(jsonl_path, **metadata)
+        if jsonl_path is not None and manifest is not None:
+            manifest.record_output(self.pdf_path, jsonl_path, None)
+
+        if manifest is not None:
+            manifest.finish_book(self.pdf_path)
+        return self.hierarchy
+
+
+def count_sections(hierarchy):
+    count = 0
+    stack = list(hierarchy)
+    while stack:
+        section = stack.pop()
+        count += 1
+        stack.extend(section['subsections'])
+    return count
+
+
+def iter_leaf_sections(hierarchy):
+    stack = list(reversed(hierarchy))
+    while stack:
+        section = stack.pop()
+        if section['subsections']:
+            stack.extend(reversed(section['subsections']))
+        else:
+            yield section
@@ -0,0 +1,445 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from .corpus_store import iter_corpus_json
+from .instrumentation import get_logger
+from .inverted_index import russian_stop_words
+from .json_stream import iter_leaf_sections_from_file
+
+logger = get_logger("eda_stats")
+
+
+# 2: число таблиц и изображений из сохранённой разметки (batch.py --layout)
+EDA_CACHE_VERSION = 2
+
+# Слова из трёх и более букв, без цифр - как preprocess_text в eda.ipynb
+EDA_TOKEN_RE = re.compile(r"[^\W\d_]{3,}")
+
+# Столбцы разделов: имя -> dtype
+SECTION_COLUMNS = {
+    "level": np.int8,
+    "start_page": np.int32,
+    "end_page": np.int32,
+    "words": np.int64,
+    "chars": np.int64,
+    "tokens": np.int64,
+    "tables": np.int32,
+    "images": np.int32
+}
+
+# Столбцы книг: страницы, таблицы и изображения по различным страницам разделов
+# (соседние разделы делят граничную страницу; титул и оглавление вне разделов
+# не учитываются) и наличие разметки в JSON
+BOOK_COLUMNS = {
+    "pages": np.int32,
+    "tables": np.int32,
+    "images": np.int32,
+    "layout": np.bool_
+}
+
+# Уровни группировки статистики
+GROUPS = ("basin", "file", "section")
+
+
+# Частоты слов текста. Регистр и ё приводятся один раз для всего текста,
+# стоп-слова отсеиваются по множеству и только среди различных слов.
+def term_counts(text, stop_words):
+    counts = Counter(EDA_TOKEN_RE.findall(text.lower().replace("ё", "е")))
+    for word in stop_words.intersection(counts):
+        del counts[word]
+    return counts
+
+
+# Словарь корпуса: номер слова не меняется между запусками, новые слова
+# дописываются в конец, поэтому матрицы неизменённых книг остаются верными
+class Vocabulary:
+    def __init__(self, terms=()):
+        self.terms = list(terms)
+        self.ids = {term: index for index, term in enumerate(self.terms)}
+
+    def __len__(self):
+        return len(self.terms)
+
+    def add(self, term):
+        index = self.ids.get(term)
+        if index is None:
+            index = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return index
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as vocabulary_file:
+            json.dump(self.terms, vocabulary_file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as vocabulary_file:
+            return cls(json.load(vocabulary_file))
+
+
+# Разреженная матрица "документ - слово" в формате CSR: слова строки i -
+# indices[indptr[i]:indptr[i + 1]], их значения - data в тех же позициях
+class TermMatrix:
+    def __init__(self, indptr, indices, data, n_terms):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data)
+        self.n_terms = n_terms
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @classmethod
+    def concatenate(cls, matrices, n_terms):
+        if not matrices:
+            return cls(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64), n_terms)
+        indptr = [np.zeros(1, dtype=np.int64)]
+        offset = 0
+        for matrix in matrices:
+            indptr.append(matrix.indptr[1:] + offset)
+            offset += matrix.indptr[-1]
+        return cls(np.concatenate(indptr), np.concatenate([matrix.indices for matrix in matrices]),
+                   np.concatenate([matrix.data for matrix in matrices]), n_terms)
+
+    # Номер строки для каждого ненулевого элемента
+    def row_ids(self):
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+
+    def row(self, index):
+        start, end = self.indptr[index], self.indptr[index + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def row_sums(self):
+        return np.bincount(self.row_ids(), weights=self.data, minlength=len(self))
+
+    # Суммы по словам; rows - маска строк
+    def column_sums(self, rows=None):
+        if rows is None:
+            return np.bincount(self.indices, weights=self.data, minlength=self.n_terms)
+        selected = np.asarray(rows, dtype=bool)[self.row_ids()]
+        return np.bincount(self.indices[selected], weights=self.data[selected], minlength=self.n_terms)
+
+    # Число строк, в которых встречается слово
+    def document_frequency(self):
+        return np.bincount(self.indices, minlength=self.n_terms)
+
+    # Сложение строк по группам: codes - номер группы каждой строки.
+    # Ключ (группа, слово) сортируется, одинаковые ключи суммируются.
+    def group_sum(self, codes, groups):
+        width = max(self.n_terms, 1)
+        keys = np.asarray(codes, dtype=np.int64)[self.row_ids()] * width + self.indices
+        keys, inverse = np.unique(keys, return_inverse=True)
+        data = np.bincount(inverse, weights=self.data, minlength=len(keys)).astype(self.data.dtype)
+        indptr = np.searchsorted(keys // width, np.arange(groups + 1))
+        return TermMatrix(indptr, keys % width, data, self.n_terms)
+
+    # TF-IDF как у TfidfVectorizer (smooth_idf, l2-нормировка строк): idf = ln((1 + n) / (1 + df)) + 1
+    def tfidf(self):
+        idf = np.log((1 + len(self)) / (1 + self.document_frequency())) + 1
+        weights = self.data * idf[self.indices]
+        norms = np.sqrt(np.bincount(self.row_ids(), weights=weights ** 2, minlength=len(self)))
+        norms[norms == 0] = 1
+        return TermMatrix(self.indptr, self.indices, weights / np.repeat(norms, np.diff(self.indptr)), self.n_terms)
+
+    # k слов строки с наибольшими значениями: (номера слов, значения)
+    def top(self, index, k=20):
+        indices, data = self.row(index)
+        return _top(indices, data, k)
+
+
+def _top(indices, data, k):
+    if len(data) > k:
+        part = np.argpartition(data, -k)[-k:]
+        indices, data = indices[part], data[part]
+    order = np.lexsort((indices, -data))
+    return indices[order], data[order]
+
+
+# Статистика одной книги: столбцы конечных разделов и их строки в матрице.
+# Таблицы и изображения берутся из разметки, сохранённой декомпозером (layout=True),
+# PDF повторно не открывается
+def analyze_book(json_path, vocabulary, stop_words):
+    columns = {name: [] for name in SECTION_COLUMNS}
+    covered = set()
+    pages = {}
+    has_layout = False
+    titles = []
+    indptr = [0]
+    indices = []
+    data = []
+    for section in iter_leaf_sections_from_file(json_path):
+        text = section.get('text', "")
+        counts = term_counts(text, stop_words)
+        row = sorted((vocabulary.add(term), count) for term, count in counts.items())
+        indices.extend(term for term, _ in row)
+        data.extend(count for _, count in row)
+        indptr.append(len(indices))
+
+        titles.append(section.get('title', ""))
+        columns['level'].append(section.get('level', 0))
+        columns['start_page'].append(section.get('start_page', 0))
+        columns['end_page'].append(section.get('end_page', 0))
+        columns['words'].append(len(text.split()))
+        columns['chars'].append(len(text))
+        columns['tokens'].append(sum(counts.values()))
+        covered.update(range(section.get('start_page', 0), section.get('end_page', 0) + 1))
+
+        layout = section.get('layout')
+        columns['tables'].append(layout['table_count'] if layout else 0)
+        columns['images'].append(layout['image_count'] if layout else 0)
+        if layout:
+            has_layout = True
+            for page in layout['pages']:
+                pages[page['page']] = (len(page['tables']), page['image_count'])
+
+    book = {name: np.asarray(values, dtype=SECTION_COLUMNS[name]) for name, values in columns.items()}
+    book['book_pages'] = np.asarray(len(covered), dtype=BOOK_COLUMNS['pages'])
+    book['book_tables'] = np.asarray(sum(tables for tables, _ in pages.values()), dtype=BOOK_COLUMNS['tables'])
+    book['book_images'] = np.asarray(sum(images for _, images in pages.values()), dtype=BOOK_COLUMNS['images'])
+    book['book_layout'] = np.asarray(has_layout, dtype=BOOK_COLUMNS['layout'])
+    book['titles'] = np.asarray(titles, dtype=str)
+    book['indptr'] = np.asarray(indptr, dtype=np.int64)
+    book['indices'] = np.asarray(indices, dtype=np.int32)
+    book['data'] = np.asarray(data, dtype=np.int64)
+    return book
+
+
+def _analyzer_key(stop_words):
+    words = "\n".join(sorted(stop_words))
+    return hashlib.sha1(f"{EDA_TOKEN_RE.pattern}\n{words}".encode('utf-8')).hexdigest()
+
+
+def _book_cache_name(json_path):
+    return hashlib.sha1(os.path.abspath(json_path).encode('utf-8')).hexdigest()[:16] + ".npz"
+
+
+def _load_cache_index(cache_dir, analyzer):
+    index_path = os.path.join(cache_dir, "index.json")
+    vocabulary_path = os.path.join(cache_dir, "vocabulary.json")
+    if not os.path.exists(index_path) or not os.path.exists(vocabulary_path):
+        return None, Vocabulary()
+    with open(index_path, 'r', encoding='utf-8') as index_file:
+        index = json.load(index_file)
+    if index.get('version') != EDA_CACHE_VERSION or index.get('analyzer') != analyzer:
+        return None, Vocabulary()
+    return index, Vocabulary.load(vocabulary_path)
+
+
+def _load_book(path):
+    with np.load(path, allow_pickle=False) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def _save_book(path, book):
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **book)
+    os.replace(tmp_path, path)
+
+
+# Статистика корпуса по JSON декомпозиции (<json_dir>/<бассейн>/Исходные/*.json),
+# без повторного извлечения текста из PDF.
+# cache_dir - кэш словаря и матриц книг: книги, у которых размер и время изменения JSON
+# не поменялись, берутся из кэша, остальные анализируются заново.
+def load_corpus_stats(json_dir, cache_dir=None, stop_words=None):
+    stop_words = russian_stop_words() if stop_words is None else frozenset(stop_words)
+    analyzer = _analyzer_key(stop_words)
+    index, vocabulary = _load_cache_index(cache_dir, analyzer) if cache_dir else (None, Vocabulary())
+    previous = index['books'] if index else {}
+
+    books = []
+    entries = {}
+    changed = {}
+    for basin, file_name, json_path in iter_corpus_json(json_dir):
+        stat = os.stat(json_path)
+        entry = previous.get(json_path)
+        book = None
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            try:
+                book = _load_book(os.path.join(cache_dir, "books", entry['cache']))
+            except (OSError, ValueError) as e:
+                logger.warning("Кэш книги %s не прочитан: %s", json_path, e)
+        if book is None:
+            try:
+                book = analyze_book(json_path, vocabulary, stop_words)
+            except Exception as e:
+                logger.error("Не удалось прочитать %s: %s", json_path, e)
+                continue
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "cache": _book_cache_name(json_path)}
+            changed[json_path] = book
+        entries[json_path] = dict(entry, basin=basin, file=file_name)
+        books.append((basin, file_name, book))
+    logger.info("Статистика EDA: книг %s, проанализировано заново %s, словарь %s слов",
+                len(books), len(changed), len(vocabulary))
+
+    # Порядок записи: словарь, матрицы книг, индекс. Прерванная запись только
+    # заставит проанализировать книги заново, номера слов при этом не изменятся.
+    if cache_dir and (changed or entries.keys() != previous.keys()):
+        os.makedirs(os.path.join(cache_dir, "books"), exist_ok=True)
+        if changed:
+            vocabulary.save(os.path.join(cache_dir, "vocabulary.json"))
+        for json_path, book in changed.items():
+            _save_book(os.path.join(cache_dir, "books", entries[json_path]['cache']), book)
+        tmp_path = os.path.join(cache_dir, "index.json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as index_file:
+            json.dump({"version": EDA_CACHE_VERSION, "analyzer": analyzer, "books": entries}, index_file,
+                      ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(cache_dir, "index.json"))
+
+    return CorpusStats.from_books(books, vocabulary)
+
+
+# Статистика корпуса для EDA. Строки - конечные разделы, группировка by:
+#   "basin" - бассейны, "file" - книги, "section" - разделы.
+# Матрица частот слов разреженная; суммы по группам и TF-IDF считаются
+# операциями numpy над её массивами.
+class CorpusStats:
+    def __init__(self, columns, titles, basins, files, file_basin, vocabulary, matrix, book_columns=None):
+        self.columns = columns
+        self.book_columns = book_columns if book_columns is not None else {
+            name: np.zeros(len(files), dtype=dtype) for name, dtype in BOOK_COLUMNS.items()
+        }
+        self.titles = titles
+        self.basins = basins
+        self.files = files
+        self.file_basin = file_basin
+        # Книга - пара (бассейн, файл): одинаковые имена файлов встречаются в разных бассейнах
+        self.books = [(basins[code], file_name) for code, file_name in zip(file_basin, files)]
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+        self._grouped = {}
+
+    @classmethod
+    def from_books(cls, books, vocabulary):
+        basins = sorted({basin for basin, _, _ in books})
+        files = [file_name for _, file_name, _ in books]
+        columns = {name: [] for name in list(SECTION_COLUMNS) + ["basin_codes", "file_codes"]}
+        for file_code, (basin, _, book) in enumerate(books):
+            rows = len(book['indptr']) - 1
+            for name in SECTION_COLUMNS:
+                columns[name].append(book[name])
+            columns['basin_codes'].append(np.full(rows, basins.index(basin), dtype=np.int32))
+            columns['file_codes'].append(np.full(rows, file_code, dtype=np.int32))
+        columns = {
+            name: np.concatenate(values) if values else np.zeros(0, dtype=SECTION_COLUMNS.get(name, np.int32))
+            for name, values in columns.items()
+        }
+        titles = np.concatenate([book['titles'] for _, _, book in books]) if books else np.zeros(0, dtype=str)
+        matrix = TermMatrix.concatenate([
+            TermMatrix(book['indptr'], book['indices'], book['data'], len(vocabulary)) for _, _, book in books
+        ], len(vocabulary))
+        file_basin = np.asarray([basins.index(basin) for basin, _, _ in books], dtype=np.int32)
+        book_columns = {
+            name: np.asarray([book[f"book_{name}"] for _, _, book in books], dtype=dtype)
+            for name, dtype in BOOK_COLUMNS.items()
+        }
+        return cls(columns, titles, basins, files, file_basin, vocabulary, matrix, book_columns)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def labels(self, by):
+        if by == "basin":
+            return list(self.basins)
+        if by == "file":
+            return [f"{basin} / {file_name}" for basin, file_name in self.books]
+        if by == "section":
+            return self.titles.tolist()
+        raise ValueError(f"Неизвестная группировка: {by}, допустимы {GROUPS}")
+
+    def codes(self, by):
+        if by == "section":
+            return np.arange(len(self), dtype=np.int32)
+        if by not in GROUPS:
+            raise ValueError(f"Неизвестная группировка: {by}, допустимы {GROUPS}")
+        return self.columns[f"{by}_codes"]
+
+    # Маска разделов по бассейну и книге - паре (бассейн, файл); None - без фильтра
+    def mask(self, basin=None, book=None):
+        mask = np.ones(len(self), dtype=bool)
+        if basin is not None:
+            mask &= self.columns['basin_codes'] == self.basins.index(basin)
+        if book is not None:
+            mask &= self.columns['file_codes'] == self.books.index(tuple(book))
+        return mask
+
+    # Частоты слов по группам (строка - группа); результат запоминается
+    def term_matrix(self, by="file"):
+        if by == "section":
+            return self.matrix
+        if by not in self._grouped:
+            self._grouped[by] = self.matrix.group_sum(self.codes(by), len(self.labels(by)))
+        return self._grouped[by]
+
+    # Сводная таблица по группам: столбцы -> массивы (для pandas.DataFrame)
+    def summary(self, by="file"):
+        labels = self.labels(by)
+        codes = self.codes(by)
+        table = {by: labels}
+        if by == "file":
+            table = {"book": labels, "basin": [basin for basin, _ in self.books], "file": list(self.files)}
+        if by == "section":
+            table['basin'] = [self.basins[code] for code in self.columns['basin_codes']]
+            table['file'] = [self.files[code] for code in self.columns['file_codes']]
+            for name in ("level", "start_page", "end_page"):
+                table[name] = self.columns[name]
+        table['sections'] = np.bincount(codes, minlength=len(labels))
+        for name in ("words", "chars", "tokens"):
+            table[name] = np.bincount(codes, weights=self.columns[name], minlength=len(labels)).astype(np.int64)
+        table['unique_terms'] = np.diff(self.term_matrix(by).indptr)
+        # Структура из сохранённой разметки; без неё (JSON собраны без --layout) - нули
+        if by == "section":
+            table['tables'] = self.columns['tables']
+            table['images'] = self.columns['images']
+        else:
+            for name in ("pages", "tables", "images"):
+                values = self.book_columns[name]
+                if by == "basin":
+                    values = np.bincount(self.file_basin, weights=values, minlength=len(labels)).astype(np.int64)
+                table[name] = values
+        return table
+
+    # Все ли книги (или книги бассейна) декомпозированы с разметкой страниц
+    def has_layout(self, basin=None):
+        layout = self.book_columns['layout']
+        if basin is not None:
+            layout = layout[self.file_basin == self.basins.index(basin)]
+        return bool(layout.all())
+
+    # TF-IDF групп: документом считается группа (книга, бассейн или раздел)
+    def tfidf(self, by="file"):
+        return self.term_matrix(by).tfidf()
+
+    # Главные слова каждой группы: [(метка, [(слово, значение), ...]), ...] в порядке labels(by) -
+    # списком, так как названия разделов повторяются. weighting - "count" (частота) или "tfidf"
+    def top_terms(self, by="file", k=20, weighting="count"):
+        matrix = self.tfidf(by) if weighting == "tfidf" else self.term_matrix(by)
+        terms = self.vocabulary.terms
+        top = []
+        for index, label in enumerate(self.labels(by)):
+            indices, values = matrix.top(index, k)
+            top.append((label, [(terms[term], value.item()) for term, value in zip(indices, values)]))
+        return top
+
+    # Частоты слов корпуса или его части (для WordCloud.generate_from_frequencies);
+    # limit - только самые частые слова
+    def word_frequencies(self, basin=None, book=None, limit=None):
+        rows = None if basin is None and book is None else self.mask(basin, book)
+        sums = self.matrix.column_sums(rows)
+        indices = np.flatnonzero(sums)
+        if limit:
+            indices, _ = _top(indices, sums[indices], limit)
+        terms = self.vocabulary.terms
+        return {terms[index]: int(sums[index]) for index in indices}
+
+    # Слова с наибольшей суммой TF-IDF по группам - график "Топ-20 ключевых слов" из eda.ipynb
+    def top_tfidf_terms(self, by="file", k=20):
+        sums = self.tfidf(by).column_sums()
+        indices, values = _top(np.arange(len(sums)), sums, k)
+        return [(self.vocabulary.terms[index], value.item()) for index, value in zip(indices, values)]
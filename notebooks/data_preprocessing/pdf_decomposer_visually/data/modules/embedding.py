@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+# Пространство имён для детерминированных ID точек Qdrant
+POINT_NAMESPACE = uuid.UUID("6f1c2f4e-7d1b-4c1e-9a5e-2b9f0c6a8d31")
+
+
+# Документ - dict из all_documents.json ({"metadata", "page_content"})
+# или объект langchain Document с теми же полями
+def document_text(document):
+    if isinstance(document, dict):
+        return document.get('page_content', "")
+    return document.page_content
+
+
+def document_metadata(document):
+    if isinstance(document, dict):
+        return document.get('metadata', {})
+    return document.metadata
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# ID точки зависит только от содержимого фрагмента и его места в корпусе,
+# поэтому повторная загрузка перезаписывает точки, а не дублирует их
+def point_id(text, metadata=None):
+    metadata = metadata or {}
+    key = "|".join([
+        str(metadata.get('basin', "")),
+        str(metadata.get('file', "")),
+        str(metadata.get('title', "")),
+        str(metadata.get('chunk_index', "")),
+        text_hash(text)
+    ])
+    return str(uuid.uuid5(POINT_NAMESPACE, key))
+
+
+# Батчи из документов близкой длины: меньше паддинга внутри батча
+def length_sorted_batches(texts, batch_size):
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+# Контрольная точка векторизации: готовые батчи лежат в batch_NNNNNN.npy,
+# state.json хранит их номера и подпись задания
+class EmbeddingCheckpoint:
+    def __init__(self, directory, signature):
+        self.directory = directory
+        self.signature = signature
+        self.done = set()
+        os.makedirs(directory, exist_ok=True)
+
+        state = self._read_state()
+        if state is not None and state.get('signature') == signature:
+            self.done = {
+                batch for batch in state.get('done', [])
+                if os.path.exists(self.batch_path(batch))
+            }
+
+    def _state_path(self):
+        return os.path.join(self.directory, "state.json")
+
+    def _read_state(self):
+        if not os.path.exists(self._state_path()):
+            return None
+        with open(self._state_path(), 'r', encoding='utf-8') as state_file:
+            return json.load(state_file)
+
+    def batch_path(self, batch):
+        return os.path.join(self.directory, f"batch_{batch:06d}.npy")
+
+    def save_batch(self, batch, vectors):
+        # Сначала файл батча, затем состояние: прерывание между ними только повторит батч
+        tmp_path = self.batch_path(batch) + ".tmp.npy"
+        np.save(tmp_path, vectors)
+        os.replace(tmp_path, self.batch_path(batch))
+        self.done.add(batch)
+
+        tmp_state = self._state_path() + ".tmp"
+        with open(tmp_state, 'w', encoding='utf-8') as state_file:
+            json.dump({"signature": self.signature, "done": sorted(self.done)}, state_file)
+        os.replace(tmp_state, self._state_path())
+
+    def load_batch(self, batch):
+        return np.load(self.batch_path(batch))
+
+
+# Модель в подписи задания: явное model_name или путь, из которого загружен
+# токенизатор SentenceTransformer, плюс размерность векторов
+def model_signature(model, model_name=None):
+    if not model_name:
+        model_name = getattr(getattr(model, 'tokenizer', None), 'name_or_path', None)
+    if not model_name:
+        raise ValueError("Не удалось определить модель для контрольной точки: укажите model_name")
+    get_dimension = getattr(model, 'get_sentence_embedding_dimension', None)
+    dimension = get_dimension() if get_dimension is not None else None
+    return f"{model_name}|{dimension}"
+
+
+def _job_signature(model_name, ids, batch_size):
+    digest = hashlib.sha256()
+    digest.update(f"{model_name}|{batch_size}".encode('utf-8'))
+    for document_id in ids:
+        digest.update(document_id.encode('ascii'))
+    return digest.hexdigest()
+
+
+# ID токенов, сохранённые chunk_sections в документе или в его метаданных
+# (так они переживают Document и all_documents.json); None, если документ не токенизирован
+def document_token_ids(document):
+    if isinstance(document, dict):
+        token_ids = document.get('token_ids')
+    else:
+        token_ids = getattr(document, 'token_ids', None)
+    if token_ids is None:
+        token_ids = document_metadata(document).get('token_ids')
+    return token_ids
+
+
+# Векторизация уже токенизированных текстов моделью SentenceTransformer
+# без повторной токенизации: специальные токены и паддинг добавляются здесь
+def encode_token_ids(model, token_ids, batch_size=32):
+    import torch
+
+    tokenizer = model.tokenizer
+    vectors = [None] * len(token_ids)
+    with torch.no_grad():
+        for rows in length_sorted_batches(token_ids, batch_size):
+            inputs = [tokenizer.build_inputs_with_special_tokens(list(token_ids[row])) for row in rows]
+            length = max(len(ids) for ids in inputs)
+            input_ids = torch.full((len(rows), length), tokenizer.pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(rows), length), dtype=torch.long)
+            for position, ids in enumerate(inputs):
+                input_ids[position, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+                attention_mask[position, :len(ids)] = 1
+
+            features = {
+                "input_ids": input_ids.to(model.device),
+                "attention_mask": attention_mask.to(model.device)
+            }
+            embeddings = model(features)["sentence_embedding"].float().cpu().numpy()
+            for row, vector in zip(rows, embeddings):
+                vectors[row] = vector
+    return np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+
+# Векторизация документов батчами, отсортированными по длине.
+# Документы из chunk_sections (с token_ids) передаются модели без повторной токенизации.
+# С checkpoint_dir прерванный запуск продолжается с первого незавершённого батча.
+# С cache (EmbeddingCache) уже векторизованные тексты берутся из кэша.
+# Возвращает ID точек и матрицу векторов в исходном порядке документов.
+def embed_documents(documents, model, batch_size=32, checkpoint_dir=None, model_name=None, progress=None, cache=None):
+    documents = list(documents)
+    texts = [document_text(document) for document in documents]
+    ids = [point_id(text, document_metadata(document)) for text, document in zip(texts, documents)]
+
+    token_ids = [document_token_ids(document) for document in documents]
+    if any(document_ids is None for document_ids in token_ids):
+        token_ids = None
+    batches = length_sorted_batches(token_ids if token_ids is not None else texts, batch_size)
+
+    if cache is not None:
+        model_name = model_name or cache.model_name
+
+    checkpoint = None
+    if checkpoint_dir is not None:
+        signature = _job_signature(model_signature(model, model_name), ids, batch_size)
+        checkpoint = EmbeddingCheckpoint(checkpoint_dir, signature)
+
+    def encode_rows(rows):
+        batch_texts = [texts[row] for row in rows]
+        if token_ids is None:
+            def encode_fn(batch):
+                return model.encode(batch, batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False)
+        else:
+            ids_by_text = {texts[row]: token_ids[row] for row in rows}
+
+            def encode_fn(batch):
+                return encode_token_ids(model, [ids_by_text[text] for text in batch], batch_size=len(batch))
+
+        if cache is not None:
+            vectors = cache.encode(batch_texts, encode_fn)
+            cache.flush()
+            return vectors
+        return np.asarray(encode_fn(batch_texts), dtype=np.float32)
+
+    embeddings = None
+    for batch, rows in enumerate(batches):
+        if checkpoint is not None and batch in checkpoint.done:
+            vectors = checkpoint.load_batch(batch)
+        else:
+            vectors = encode_rows(rows)
+            if checkpoint is not None:
+                checkpoint.save_batch(batch, vectors)
+
+        if embeddings is None:
+            embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        embeddings[rows] = vectors
+
+        if progress is not None:
+            progress(batch + 1, len(batches))
+
+    if embeddings is None:
+        embeddings = np.empty((0, 0), dtype=np.float32)
+    return ids, embeddings
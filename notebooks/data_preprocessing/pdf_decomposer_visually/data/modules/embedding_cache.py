@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+
+DEFAULT_CAPACITY = 200_000
+KEY_SIZE = 16
+
+
+# Нормализация перед хэшированием: различия в пробелах и переносах строк
+# не должны приводить к повторной векторизации
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).digest()[:KEY_SIZE]
+
+
+def _model_dir_name(model_name):
+    return re.sub(r'[^\w.-]+', '__', model_name)
+
+
+# Дисковый кэш векторов одной модели: <path>/<модель>/
+#   vectors.npy - матрица capacity x dim (float32 или float16), отображается в память
+#   keys.npy    - хэш нормализованного текста для каждой строки матрицы
+#   ticks.npy   - время последнего обращения (0 - строка свободна), для вытеснения LRU
+# Запись идёт прямо в отображённые файлы, отдельного сохранения не требуется.
+# Параметры encode, меняющие результат (например, normalize_embeddings),
+# должны отражаться в model_name.
+class EmbeddingCache:
+    def __init__(self, path, model_name, capacity=DEFAULT_CAPACITY, dtype="float32"):
+        self.path = os.path.join(path, _model_dir_name(model_name))
+        self.model_name = model_name
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.vectors = None
+        self.keys = None
+        self.ticks = None
+        self.index = {}
+        self.tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if os.path.exists(self._file("meta.json")):
+            self._open()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        with open(self._file("meta.json"), 'r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        if meta['model'] != self.model_name:
+            raise ValueError(f"Кэш {self.path} создан для модели {meta['model']}")
+
+        self.capacity = meta['capacity']
+        self.dtype = np.dtype(meta['dtype'])
+        self.vectors = np.load(self._file("vectors.npy"), mmap_mode='r+')
+        self.keys = np.load(self._file("keys.npy"), mmap_mode='r+')
+        self.ticks = np.load(self._file("ticks.npy"), mmap_mode='r+')
+
+        used = np.flatnonzero(self.ticks)
+        self.index = {self.keys[slot].tobytes(): int(slot) for slot in used}
+        self.tick = int(self.ticks.max()) if len(used) else 0
+
+    # Файлы создаются при первой записи, когда известна размерность векторов
+    def _create(self, dim):
+        os.makedirs(self.path, exist_ok=True)
+        open_memmap = np.lib.format.open_memmap
+        self.vectors = open_memmap(self._file("vectors.npy"), mode='w+', dtype=self.dtype, shape=(self.capacity, dim))
+        self.keys = open_memmap(self._file("keys.npy"), mode='w+', dtype=np.uint8, shape=(self.capacity, KEY_SIZE))
+        self.ticks = open_memmap(self._file("ticks.npy"), mode='w+', dtype=np.int64, shape=(self.capacity,))
+
+        meta = {
+            "model": self.model_name,
+            "dim": dim,
+            "dtype": self.dtype.name,
+            "capacity": self.capacity
+        }
+        with open(self._file("meta.json"), 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file, ensure_ascii=False, indent=4)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, text):
+        return text_key(text) in self.index
+
+    def _touch(self, slots):
+        self.tick += 1
+        self.ticks[slots] = self.tick
+
+    # Свободные строки; при нехватке вытесняются давно не использованные
+    def _free_slots(self, count):
+        free = np.flatnonzero(self.ticks == 0)[:count]
+        need = count - len(free)
+        if need > 0:
+            used = np.flatnonzero(self.ticks)
+            victims = used[np.argpartition(self.ticks[used], need - 1)[:need]]
+            for slot in victims:
+                del self.index[self.keys[slot].tobytes()]
+            self.ticks[victims] = 0
+            self.evictions += need
+            free = np.concatenate([free, victims])
+        return free
+
+    def _store(self, keys, vectors):
+        if self.vectors is None:
+            self._create(vectors.shape[1])
+        if vectors.shape[1] != self.vectors.shape[1]:
+            raise ValueError(f"Размерность {vectors.shape[1]} не совпадает с кэшем ({self.vectors.shape[1]})")
+
+        # Повторы внутри пачки сохраняются один раз; больше capacity не поместится
+        entries = dict(zip(keys, vectors))
+        if len(entries) > self.capacity:
+            entries = dict(list(entries.items())[-self.capacity:])
+
+        existing = [self.index[key] for key in entries if key in self.index]
+        if existing:
+            self._touch(existing)
+        fresh = [key for key in entries if key not in self.index]
+        for key, slot in zip(fresh, self._free_slots(len(fresh))):
+            self.index[key] = int(slot)
+
+        # Строка становится видимой (ticks != 0) только после записи вектора и ключа
+        slots = np.array([self.index[key] for key in entries], dtype=np.int64)
+        self.vectors[slots] = np.stack(list(entries.values())).astype(self.dtype)
+        self.keys[slots] = np.frombuffer(b"".join(entries), dtype=np.uint8).reshape(-1, KEY_SIZE)
+        self._touch(slots)
+
+    def get(self, text):
+        slot = self.index.get(text_key(text))
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch([slot])
+        return np.asarray(self.vectors[slot], dtype=np.float32)
+
+    def put_many(self, texts, vectors):
+        self._store([text_key(text) for text in texts], np.asarray(vectors))
+
+    # Векторы для списка текстов: найденные берутся из кэша,
+    # остальные одной пачкой передаются в encode_fn и сохраняются
+    def encode(self, texts, encode_fn):
+        keys = [text_key(text) for text in texts]
+        slots = [self.index.get(key) for key in keys]
+        hit_rows = [row for row, slot in enumerate(slots) if slot is not None]
+        missing = [row for row, slot in enumerate(slots) if slot is None]
+        self.hits += len(hit_rows)
+        self.misses += len(missing)
+
+        # Найденные векторы копируются до записи новых, которая может их вытеснить
+        hit_vectors = None
+        if hit_rows:
+            hit_slots = [slots[row] for row in hit_rows]
+            hit_vectors = np.asarray(self.vectors[hit_slots], dtype=np.float32)
+            self._touch(hit_slots)
+
+        # Одинаковые после нормализации тексты векторизуются один раз
+        new_vectors = None
+        if missing:
+            unique = {}
+            for row in missing:
+                unique.setdefault(keys[row], row)
+            encoded = np.asarray(encode_fn([texts[row] for row in unique.values()]), dtype=np.float32)
+            self._store(list(unique), encoded)
+            positions = {key: position for position, key in enumerate(unique)}
+            new_vectors = encoded[[positions[keys[row]] for row in missing]]
+
+        dim = hit_vectors.shape[1] if hit_vectors is not None else (new_vectors.shape[1] if new_vectors is not None else 0)
+        result = np.empty((len(texts), dim), dtype=np.float32)
+        if hit_vectors is not None:
+            result[hit_rows] = hit_vectors
+        if new_vectors is not None:
+            result[missing] = new_vectors
+        return result
+
+    def flush(self):
+        for array in (self.vectors, self.keys, self.ticks):
+            if array is not None:
+                array.flush()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.index),
+            "capacity": self.capacity,
+            "evictions": self.evictions
+        }
+
+
+# Обёртка модели SentenceTransformer с чтением через кэш.
+# encode принимает строку или список строк, как у модели;
+# остальные атрибуты (to, get_sentence_embedding_dimension, ...) берутся у модели.
+class CachedEncoder:
+    def __init__(self, model, cache):
+        self.model = model
+        self.cache = cache
+
+    def encode(self, sentences, **kwargs):
+        kwargs.pop('convert_to_numpy', None)
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = self.cache.encode(
+            texts,
+            lambda batch: self.model.encode(batch, convert_to_numpy=True, **kwargs)
+        )
+        self.cache.flush()
+        return vectors[0] if single else vectors
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
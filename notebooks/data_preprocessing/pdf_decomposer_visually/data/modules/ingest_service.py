@@ -0,0 +1,364 @@
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .batch import discover_books, process_book
+from .chunking import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP, chunk_sections
+from .embedding import embed_documents
+from .instrumentation import get_logger
+from .json_stream import iter_leaf_sections_from_file
+from .manifest import BuildManifest
+
+logger = get_logger("ingest")
+
+
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_POLL_INTERVAL = 30.0
+# Файл, изменённый меньше SETTLE_SECONDS назад, считается ещё копируемым
+SETTLE_SECONDS = 10.0
+# Задержки этапа считаются по последним LATENCY_WINDOW задачам
+LATENCY_WINDOW = 100
+
+
+# Снимок каталога книг: путь PDF -> (книга, (размер, время изменения))
+def scan_books(base_dir):
+    snapshot = {}
+    for book in discover_books(base_dir):
+        try:
+            stat = os.stat(book['pdf_path'])
+        except OSError:
+            continue
+        snapshot[book['pdf_path']] = (book, (stat.st_size, stat.st_mtime_ns))
+    return snapshot
+
+
+def _latency(values):
+    if not values:
+        return {"mean": None, "p95": None, "last": None}
+    ordered = sorted(values)
+    return {
+        "mean": statistics.fmean(values),
+        "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+        "last": values[-1]
+    }
+
+
+# Этап конвейера: своя ограниченная очередь и concurrency обработчиков.
+# function(job) - обычная функция, выполняется в пуле потоков и возвращает задачу
+# для следующего этапа или None, если дальше её передавать не нужно.
+# Пропущенные книги (без изменений) считаются в skipped и не входят в задержки.
+class Stage:
+    def __init__(self, name, function, concurrency=1, queue_size=DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.function = function
+        self.concurrency = concurrency
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.busy = 0
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.waits = deque(maxlen=LATENCY_WINDOW)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self):
+        return {
+            "stage": self.name,
+            "queue": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "busy": self.busy,
+            "concurrency": self.concurrency,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "wait_seconds": _latency(self.waits),
+            "latency_seconds": _latency(self.latencies)
+        }
+
+
+# Этап разбиения конечных разделов книги на фрагменты (chunk_sections)
+def chunk_stage(tokenizer, max_tokens=DEFAULT_MAX_TOKENS, overlap=DEFAULT_OVERLAP, queue_size=DEFAULT_QUEUE_SIZE):
+    def chunk(job):
+        book = job['book']
+        sections = [
+            {
+                "basin": book['basin'],
+                "file": f"{book['name']}.json",
+                "title": section['title'],
+                "level": section['level'],
+                "start_page": section['start_page'],
+                "end_page": section['end_page'],
+                "text": section.get('text', ""),
+                "page_offsets": section.get('page_offsets')
+            }
+            for section in iter_leaf_sections_from_file(job['json_path'])
+        ]
+        job['documents'] = [
+            {"metadata": chunk['metadata'], "page_content": chunk['page_content'], "token_ids": chunk['token_ids']}
+            for chunk in chunk_sections(sections, tokenizer, max_tokens, overlap)
+        ]
+        return job
+
+    return Stage("chunking", chunk, queue_size=queue_size)
+
+
+# Этап векторизации фрагментов (embed_documents); модель одна, поэтому один обработчик
+def embed_stage(model, batch_size=32, cache=None, model_name=None, queue_size=DEFAULT_QUEUE_SIZE):
+    def embed(job):
+        job['ids'], job['vectors'] = embed_documents(
+            job['documents'], model, batch_size=batch_size, cache=cache, model_name=model_name
+        )
+        return job
+
+    return Stage("embedding", embed, queue_size=queue_size)
+
+
+# Этап загрузки в Qdrant: точки прошлой версии книги удаляются, затем
+# загружаются новые (upload_documents). Коллекция должна уже существовать.
+def upload_stage(client, collection_name, include_content=True, queue_size=DEFAULT_QUEUE_SIZE, **options):
+    from .qdrant_upload import upload_documents
+
+    def upload(job):
+        from qdrant_client.models import FieldCondition, Filter, FilterSelector, MatchValue
+
+        book = job['book']
+        client.delete(
+            collection_name=collection_name,
+            points_selector=FilterSelector(filter=Filter(must=[
+                FieldCondition(key="basin", match=MatchValue(value=book['basin'])),
+                FieldCondition(key="file", match=MatchValue(value=f"{book['name']}.json"))
+            ])),
+            wait=True
+        )
+        job['upload'] = upload_documents(
+            client, collection_name, job['documents'], job['ids'], job['vectors'],
+            include_content=include_content, **options
+        )
+        return job
+
+    return Stage("upload", upload, queue_size=queue_size)
+
+
+# Служба непрерывного пополнения корпуса. Каталог base_dir периодически
+# сканируется; новые и изменённые PDF ставятся в очередь декомпозиции, которая
+# идёт в пуле из workers процессов (process_book, с манифестом неизменённые книги
+# не декомпозируются заново). Готовая книга передаётся дальше по этапам stages
+# (chunk_stage -> embed_stage -> upload_stage). В записи книги в манифесте поле "ingested" -
+# имена этапов, которые книга прошла до конца; оно ставится только после успеха последнего
+# этапа. Книга без него (ошибка этапа, перезапуск службы, книга собрана batch.py с тем же
+# манифестом) проходит этапы снова, даже если её декомпозиция не изменилась.
+# У каждого этапа ограниченная очередь:
+# если следующий этап не успевает, предыдущий ждёт, а сканер перестаёт ставить книги.
+# stats() - глубина очередей и задержки по этапам; они же пишутся в журнал
+# каждые report_interval секунд и, если задан stats_path, в JSON-файл.
+class IngestService:
+    def __init__(self, base_dir, json_dir, output_dir=None, manifest_path=None, workers=2, stages=(),
+                 queue_size=DEFAULT_QUEUE_SIZE, poll_interval=DEFAULT_POLL_INTERVAL, settle_seconds=SETTLE_SECONDS,
+                 leaf_only=False, jsonl=False, streaming=False, report_interval=60.0, stats_path=None):
+        self.base_dir = base_dir
+        self.json_dir = json_dir
+        self.output_dir = output_dir
+        self.manifest = BuildManifest(manifest_path) if manifest_path else None
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.options = {"leaf_only": leaf_only, "jsonl": jsonl, "streaming": streaming}
+        self.report_interval = report_interval
+        self.stats_path = stats_path
+        self.stages = [Stage("decomposition", None, concurrency=workers, queue_size=queue_size)] + list(stages)
+        self.stage_names = [stage.name for stage in self.stages]
+        self.seen = {}
+        self.in_flight = set()
+        self.completed = 0
+        self.skipped = 0
+        self.end_to_end = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        self._stop = None
+        self._process_pool = None
+        self._thread_pool = None
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    def stats(self):
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "in_flight": len(self.in_flight),
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "end_to_end_seconds": _latency(self.end_to_end),
+            "stages": [stage.snapshot() for stage in self.stages]
+        }
+
+    def report(self):
+        stats = self.stats()
+        parts = []
+        for stage in stats['stages']:
+            latency = stage['latency_seconds']['mean']
+            parts.append(
+                f"{stage['stage']}: очередь {stage['queue']}/{stage['queue_size']}, "
+                f"в работе {stage['busy']}, готово {stage['processed']}, без изменений {stage['skipped']}, "
+                f"ошибок {stage['failed']}"
+                + (f", {latency:.1f} с" if latency is not None else "")
+            )
+        logger.info("В обработке книг: %s, завершено: %s, без изменений: %s; %s",
+                    stats['in_flight'], stats['completed'], stats['skipped'], "; ".join(parts))
+        if self.stats_path:
+            tmp_path = self.stats_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as stats_file:
+                json.dump(stats, stats_file, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.stats_path)
+
+    # Основной цикл. once=True - обработать то, что есть в каталоге, и завершиться;
+    # иначе служба работает до stop(). В обоих случаях уже поставленные книги
+    # проходят все этапы до конца.
+    async def run(self, once=False):
+        self._stop = asyncio.Event()
+        self.started = time.time()
+        thread_count = sum(stage.concurrency for stage in self.stages[1:]) + 1
+        with ProcessPoolExecutor(max_workers=self.workers) as process_pool, \
+                ThreadPoolExecutor(max_workers=thread_count) as thread_pool:
+            self._process_pool = process_pool
+            self._thread_pool = thread_pool
+            tasks = [
+                asyncio.create_task(self._worker(position))
+                for position, stage in enumerate(self.stages)
+                for _ in range(stage.concurrency)
+            ]
+            reporter = asyncio.create_task(self._reporter())
+            try:
+                await self._watch(once)
+                # Очереди дожидаются по порядку: задача попадает в очередь следующего
+                # этапа раньше, чем снимается с предыдущего
+                for stage in self.stages:
+                    await stage.queue.join()
+            finally:
+                for task in tasks + [reporter]:
+                    task.cancel()
+                await asyncio.gather(*tasks, reporter, return_exceptions=True)
+                if self.manifest is not None:
+                    self.manifest.save()
+                self.report()
+        return self.stats()
+
+    async def _watch(self, once):
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            snapshot = await loop.run_in_executor(self._thread_pool, scan_books, self.base_dir)
+            now = time.time()
+            for pdf_path, (book, signature) in snapshot.items():
+                if self._stop.is_set():
+                    break
+                if pdf_path in self.in_flight or self.seen.get(pdf_path) == signature:
+                    continue
+                if not once and now - signature[1] / 1e9 < self.settle_seconds:
+                    continue
+                self.seen[pdf_path] = signature
+                self.in_flight.add(pdf_path)
+                logger.info("В очередь: %s", pdf_path)
+                # При заполненной очереди сканер ждёт здесь
+                await self.stages[0].queue.put({"book": book, "queued_at": time.perf_counter()})
+            if once:
+                return
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self, position):
+        stage = self.stages[position]
+        next_stage = self.stages[position + 1] if position + 1 < len(self.stages) else None
+        while True:
+            job = await stage.queue.get()
+            stage.waits.append(time.perf_counter() - job.pop('enqueued_at', job['queued_at']))
+            stage.busy += 1
+            started = time.perf_counter()
+            try:
+                if position == 0:
+                    output = await self._decompose(job)
+                else:
+                    output = await asyncio.get_running_loop().run_in_executor(self._thread_pool, stage.function, job)
+            except Exception as e:
+                logger.error("Этап %s, %s: %s", stage.name, job['book']['pdf_path'], e)
+                stage.failed += 1
+                self._finish(job, ok=False)
+                output = None
+            else:
+                if job.get('skipped'):
+                    stage.skipped += 1
+                else:
+                    stage.processed += 1
+                if output is None or next_stage is None:
+                    self._finish(job)
+            finally:
+                stage.busy -= 1
+                if not job.get('skipped'):
+                    stage.latencies.append(time.perf_counter() - started)
+
+            try:
+                if output is not None and next_stage is not None:
+                    output['enqueued_at'] = time.perf_counter()
+                    # При заполненной очереди следующего этапа обработчик ждёт здесь
+                    await next_stage.queue.put(output)
+            finally:
+                stage.queue.task_done()
+
+    async def _decompose(self, job):
+        book = job['book']
+        entry = None
+        if self.manifest is not None:
+            entry = self.manifest.entry(book['pdf_path']) or {}
+        result = await asyncio.get_running_loop().run_in_executor(
+            self._process_pool, process_book, book, self.json_dir,
+            self.output_dir, entry,
+            self.options['leaf_only'], self.options['jsonl'], False, self.options['streaming']
+        )
+
+        manifest_entry = result.pop('manifest_entry', None)
+        if self.manifest is not None and manifest_entry is not None:
+            self.manifest.books[os.path.normpath(book['pdf_path'])] = manifest_entry
+            self.manifest.save()
+
+        if result['status'] != "ok":
+            raise RuntimeError(result['error'])
+        if result.get('skipped'):
+            if self._ingested(book['pdf_path']):
+                logger.info("Без изменений: %s", book['pdf_path'])
+                job['skipped'] = True
+                return None
+            logger.info("Декомпозиция без изменений, этапы не пройдены: %s", book['pdf_path'])
+        if result.get('warning'):
+            logger.warning("%s: %s", book['pdf_path'], result['warning'])
+        logger.info("Декомпозиция: %s, %.1f с", book['pdf_path'], result['seconds'])
+        job['json_path'] = result['json_path']
+        job['result'] = result
+        return job
+
+    def _ingested(self, pdf_path):
+        entry = self.manifest.entry(pdf_path) if self.manifest is not None else None
+        return entry is not None and entry.get('ingested') == self.stage_names
+
+    # Книга с ошибкой снова попадёт в очередь, когда её файл изменится или служба
+    # перезапустится: отметка о прохождении этапов ставится только здесь.
+    # Пропущенная книга уже отмечена и не входит ни в завершённые, ни в задержки
+    def _finish(self, job, ok=True):
+        pdf_path = job['book']['pdf_path']
+        self.in_flight.discard(pdf_path)
+        if job.get('skipped'):
+            self.skipped += 1
+        elif ok:
+            self.completed += 1
+            self.end_to_end.append(time.perf_counter() - job['queued_at'])
+            entry = self.manifest.entry(pdf_path) if self.manifest is not None else None
+            if entry is not None and entry.get('ingested') != self.stage_names:
+                entry['ingested'] = self.stage_names
+                self.manifest.save()
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.report()
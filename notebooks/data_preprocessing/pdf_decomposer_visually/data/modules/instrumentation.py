@@ -0,0 +1,146 @@
+import contextlib
+import cProfile
+import csv
+import io
+import json
+import logging
+import os
+import time
+
+
+# Общий логгер декомпозиции; модули пишут в дочерние логгеры (pdf_decomposer.<модуль>)
+LOGGER_NAME = "pdf_decomposer"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Этапы BookDecomposer: toc_read, hierarchy_build (вместе с исправлением end_page),
+# text_extraction, pdf_export, json_write; batch.process_book добавляет inverted_index
+CSV_FIELDS = ("pdf_path", "basin", "book", "stage", "calls", "seconds", "pages", "bytes_written")
+
+
+def get_logger(name=None):
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+# Обработчик, копящий записи журнала в памяти (для GUI и рабочих процессов пакета)
+class MemoryLogHandler(logging.Handler):
+    def __init__(self, level=logging.INFO):
+        super().__init__(level)
+        self.buffer = io.StringIO()
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def emit(self, record):
+        self.buffer.write(self.format(record) + "\n")
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+
+# Временное подключение обработчика к логгеру декомпозиции.
+# С propagate=False записи уходят только в handler, а не в консоль
+@contextlib.contextmanager
+def capture_logs(handler, level=logging.INFO, propagate=True):
+    logger = get_logger()
+    previous = logger.level, logger.propagate
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = propagate
+    try:
+        yield handler
+    finally:
+        logger.removeHandler(handler)
+        logger.level, logger.propagate = previous
+
+
+# Метрики одной книги: время, страницы и записанные байты по этапам
+class BookMetrics:
+    def __init__(self, pdf_path, **labels):
+        self.pdf_path = pdf_path
+        self.labels = labels
+        self.stages = {}
+
+    def _record(self, name):
+        if name not in self.stages:
+            self.stages[name] = {"calls": 0, "seconds": 0.0, "pages": 0, "bytes_written": 0}
+        return self.stages[name]
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        record = self._record(name)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['calls'] += 1
+            record['seconds'] += time.perf_counter() - started
+
+    def add(self, name, pages=0, bytes_written=0):
+        record = self._record(name)
+        record['pages'] += pages
+        record['bytes_written'] += bytes_written
+
+    def total_seconds(self):
+        return sum(record['seconds'] for record in self.stages.values())
+
+    def as_dict(self):
+        return {
+            "pdf_path": self.pdf_path,
+            **self.labels,
+            "seconds": self.total_seconds(),
+            "stages": self.stages
+        }
+
+
+# Метрики набора книг с выгрузкой в JSON или CSV (по расширению файла)
+class PipelineMetrics:
+    def __init__(self):
+        self.books = []
+
+    def add_book(self, book_metrics):
+        if isinstance(book_metrics, BookMetrics):
+            book_metrics = book_metrics.as_dict()
+        self.books.append(book_metrics)
+
+    def stage_totals(self):
+        totals = {}
+        for book in self.books:
+            for name, record in book['stages'].items():
+                total = totals.setdefault(name, {"calls": 0, "seconds": 0.0, "pages": 0, "bytes_written": 0})
+                for key in total:
+                    total[key] += record[key]
+        return totals
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.endswith(".csv"):
+            with open(path, 'w', encoding='utf-8', newline="") as csv_file:
+                writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDS)
+                writer.writeheader()
+                for book in self.books:
+                    for name, record in book['stages'].items():
+                        writer.writerow({
+                            "pdf_path": book['pdf_path'],
+                            "basin": book.get('basin', ""),
+                            "book": book.get('book', ""),
+                            "stage": name,
+                            **record
+                        })
+        else:
+            with open(path, 'w', encoding='utf-8') as json_file:
+                json.dump({"books": self.books, "totals": self.stage_totals()}, json_file, ensure_ascii=False, indent=4)
+
+
+# Необязательный профиль cProfile всего блока; без пути ничего не делает
+@contextlib.contextmanager
+def profiled(output_path=None):
+    if output_path is None:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
@@ -0,0 +1,408 @@
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from .chunking import estimate_page_offsets
+from .corpus_store import iter_corpus_json
+from .json_stream import iter_leaf_sections_from_file
+
+
+INDEX_VERSION = 1
+
+# Параметры BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Числа вида 5.63 и 12,5 - один токен (запятая приводится к точке), слова - без цифр
+TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)*|[^\W\d_]{2,}")
+
+# Ссылки "Таблица 5.63", "рис. 3" дополнительно индексируются как один токен "таблица:5.63"
+REFERENCE_WORDS = {
+    "таблица": "таблица", "табл": "таблица",
+    "рисунок": "рисунок", "рис": "рисунок",
+    "приложение": "приложение", "прил": "приложение"
+}
+
+# Запасной список, если пакет stop_words (он используется в EDA) не установлен
+FALLBACK_STOP_WORDS = (
+    "и", "в", "во", "не", "что", "он", "на", "я", "с", "со", "как", "а", "то", "все", "она", "так",
+    "его", "но", "да", "ты", "к", "у", "же", "вы", "за", "бы", "по", "только", "ее", "её", "мне", "было",
+    "вот", "от", "меня", "еще", "ещё", "нет", "о", "из", "ему", "теперь", "когда", "даже", "ну", "ли",
+    "если", "уже", "или", "ни", "быть", "был", "него", "до", "вас", "нибудь", "опять", "уж", "вам",
+    "ведь", "там", "потом", "себя", "ничего", "ей", "может", "они", "тут", "где", "есть", "надо", "ней",
+    "для", "мы", "тебя", "их", "чем", "была", "сам", "чтоб", "без", "будто", "чего", "раз", "тоже",
+    "себе", "под", "будет", "ж", "тогда", "кто", "этот", "того", "потому", "этого", "какой", "совсем",
+    "ним", "здесь", "этом", "один", "почти", "мой", "тем", "чтобы", "нее", "неё", "были", "куда",
+    "зачем", "всех", "никогда", "можно", "при", "наконец", "два", "об", "другой", "хоть", "после",
+    "над", "больше", "тот", "через", "эти", "нас", "про", "всего", "них", "какая", "много", "разве",
+    "три", "эту", "моя", "впрочем", "хорошо", "свою", "этой", "перед", "иногда", "лучше", "чуть",
+    "том", "нельзя", "такой", "им", "более", "всегда", "конечно", "всю", "между", "это", "также",
+    "так", "которые", "который", "которая", "которых", "является", "являются"
+)
+
+_stop_words = None
+
+
+# Стоп-слова загружаются при первом обращении
+def russian_stop_words():
+    global _stop_words
+    if _stop_words is None:
+        try:
+            from stop_words import get_stop_words
+            words = get_stop_words("russian")
+        except ImportError:
+            words = FALLBACK_STOP_WORDS
+        _stop_words = frozenset(normalize_token(word) for word in words)
+    return _stop_words
+
+
+# Нормализация токена: нижний регистр и ё -> е. Токены TOKEN_RE совпадают с тем,
+# что остаётся от preprocess_page_content (look_at_json.ipynb) после перевода в нижний
+# регистр и разбиения по пробелам и пунктуации, но без копии текста.
+def normalize_token(token):
+    return token.lower().replace("ё", "е").replace(",", ".")
+
+
+def analyze(text, stop_words=None):
+    stop_words = russian_stop_words() if stop_words is None else stop_words
+    tokens = []
+    reference = None
+    for match in TOKEN_RE.finditer(text):
+        token = normalize_token(match.group())
+        if token[0].isdigit():
+            if reference is not None:
+                tokens.append(f"{reference}:{token}")
+            tokens.append(token)
+            reference = None
+            continue
+        reference = REFERENCE_WORDS.get(token)
+        if token not in stop_words:
+            tokens.append(token)
+    return tokens
+
+
+# Сборка индекса. Постинги накапливаются по термам в массивах array('i'):
+# (номер раздела, страница, число вхождений на странице).
+class InvertedIndexBuilder:
+    def __init__(self, stop_words=None):
+        self.stop_words = russian_stop_words() if stop_words is None else frozenset(stop_words)
+        self.postings = {}
+        self.docs = []
+        self.lengths = array('i')
+
+    # Конечный раздел: страницы берутся из section['page_offsets'] (их пишет декомпозиция),
+    # иначе оцениваются равномерно, как в chunk_sections
+    def add_section(self, section, **metadata):
+        doc = len(self.docs)
+        text = section.get('text', "")
+        start_page = section.get('start_page', 0)
+        page_offsets = section.get('page_offsets') or estimate_page_offsets(
+            text, start_page, section.get('end_page', start_page)
+        )
+
+        length = 0
+        bounds = list(page_offsets[1:]) + [len(text)]
+        for page_index, (start, end) in enumerate(zip(page_offsets, bounds)):
+            counts = Counter(analyze(text[start:end], self.stop_words))
+            length += sum(counts.values())
+            for term, count in counts.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array('i'), array('i'), array('i'))
+                posting[0].append(doc)
+                posting[1].append(start_page + page_index)
+                posting[2].append(count)
+
+        self.docs.append({
+            **metadata,
+            "title": section.get('title', ""),
+            "start_page": start_page,
+            "end_page": section.get('end_page', start_page)
+        })
+        self.lengths.append(length)
+        return doc
+
+    def add_book(self, json_path, **metadata):
+        for section in iter_leaf_sections_from_file(json_path):
+            self.add_section(section, **metadata)
+
+    # Постинги всех термов подряд в общих массивах, границы терма - offsets
+    def build(self):
+        terms = sorted(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for index, term in enumerate(terms):
+            offsets[index + 1] = offsets[index] + len(self.postings[term][0])
+
+        docs = np.empty(offsets[-1], dtype=np.int32)
+        pages = np.empty(offsets[-1], dtype=np.int32)
+        counts = np.empty(offsets[-1], dtype=np.uint16)
+        for index, term in enumerate(terms):
+            start, end = offsets[index], offsets[index + 1]
+            term_docs, term_pages, term_counts = self.postings[term]
+            docs[start:end] = np.frombuffer(term_docs, dtype=np.int32)
+            pages[start:end] = np.frombuffer(term_pages, dtype=np.int32)
+            counts[start:end] = np.minimum(np.frombuffer(term_counts, dtype=np.int32), np.iinfo(np.uint16).max)
+
+        return InvertedIndex(
+            terms, offsets, docs, pages, counts,
+            np.frombuffer(self.lengths, dtype=np.int32).copy(), self.docs, self.stop_words
+        )
+
+
+# Индекс одной книги лежит рядом с её JSON: <книга>.index/
+def book_index_path(json_path):
+    return os.path.splitext(json_path)[0] + ".index"
+
+
+# Индекс книги строится при декомпозиции (batch.process_book), сразу после записи её JSON
+def build_book_index(json_path, stop_words=None, **metadata):
+    builder = InvertedIndexBuilder(stop_words)
+    builder.add_book(json_path, **metadata)
+    index_path = book_index_path(json_path)
+    builder.build().save(index_path)
+    return index_path
+
+
+# Слияние индексов (например, индексов книг) в один: разделы нумеруются подряд,
+# постинги каждого терма остаются упорядоченными по разделу
+def merge_indexes(indexes, stop_words=None):
+    stop_words = russian_stop_words() if stop_words is None else frozenset(stop_words)
+    if any(frozenset(index.stop_words) != stop_words for index in indexes):
+        raise ValueError("Индексы построены с разными стоп-словами")
+    terms = sorted(set().union(*(index.terms for index in indexes)))
+    term_ids = {term: number for number, term in enumerate(terms)}
+
+    posting_terms, docs, pages, counts, lengths, metadata = [], [], [], [], [], []
+    for index in indexes:
+        local_ids = np.fromiter((term_ids[term] for term in index.terms), dtype=np.int64, count=len(index.terms))
+        posting_terms.append(np.repeat(local_ids, np.diff(index.offsets)))
+        docs.append(np.asarray(index.docs) + len(metadata))
+        pages.append(np.asarray(index.pages))
+        counts.append(np.asarray(index.counts))
+        lengths.append(np.asarray(index.lengths))
+        metadata.extend(index.metadata)
+
+    if not indexes:
+        return InvertedIndexBuilder(stop_words).build()
+    # Устойчивая сортировка по терму сохраняет порядок индексов, а в них - порядок разделов
+    order = np.argsort(np.concatenate(posting_terms), kind='stable')
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(np.concatenate(posting_terms), minlength=len(terms)))
+    return InvertedIndex(
+        terms, offsets,
+        np.concatenate(docs).astype(np.int32)[order], np.concatenate(pages)[order], np.concatenate(counts)[order],
+        np.concatenate(lengths).astype(np.int32), metadata, stop_words
+    )
+
+
+def book_index_fresh(json_path):
+    index_file = os.path.join(book_index_path(json_path), "index.json")
+    return os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(json_path)
+
+
+# Индекс по JSON книг декомпозиции (<json_dir>/<бассейн>/Исходные/*.json);
+# метаданные разделов - basin и file, как у документов векторизации.
+# Индексы книг, построенные при декомпозиции и не старше JSON, сливаются без разбора текста
+def build_index_from_json_dir(json_dir, stop_words=None):
+    stop_words = russian_stop_words() if stop_words is None else frozenset(stop_words)
+    indexes = []
+    for basin, file_name, json_path in iter_corpus_json(json_dir):
+        book_index = None
+        if book_index_fresh(json_path):
+            try:
+                book_index = InvertedIndex.load(book_index_path(json_path))
+            except (OSError, ValueError):
+                book_index = None
+        if book_index is None or book_index.stop_words != stop_words:
+            builder = InvertedIndexBuilder(stop_words)
+            builder.add_book(json_path, basin=basin, file=file_name)
+            book_index = builder.build()
+        indexes.append(book_index)
+    return merge_indexes(indexes, stop_words)
+
+
+# Термы точного поиска: составные токены ссылок ("таблица:5.63") заменяют слово и номер,
+# из которых они составлены
+def _lookup_terms(tokens):
+    references = [token for token in tokens if ":" in token]
+    parts = {part for reference in references for part in reference.split(":")}
+    return references + [token for token in tokens if ":" not in token and token not in parts]
+
+
+# Полнотекстовый индекс конечных разделов: BM25 и точный поиск терма
+# со ссылками на раздел и страницы, без модели эмбеддингов
+class InvertedIndex:
+    def __init__(self, terms, offsets, docs, pages, counts, lengths, metadata, stop_words):
+        self.terms = terms
+        self.term_ids = {term: index for index, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.pages = pages
+        self.counts = counts
+        self.lengths = lengths
+        self.metadata = metadata
+        self.stop_words = frozenset(stop_words)
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        # Постинги терма упорядочены по разделу: число разделов с термом -
+        # число смен номера раздела внутри его постингов
+        new_doc = np.ones(len(docs), dtype=np.int32)
+        new_doc[1:] = docs[1:] != docs[:-1]
+        new_doc[offsets[:-1]] = 1
+        self.doc_freq = np.add.reduceat(new_doc, offsets[:-1]) if terms else np.zeros(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def _postings(self, term):
+        index = self.term_ids.get(term)
+        if index is None:
+            return None
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return index, self.docs[start:end], self.pages[start:end], self.counts[start:end]
+
+    def _allowed(self, basin=None, file=None):
+        if basin is None and file is None:
+            return None
+        basins = [basin] if isinstance(basin, str) else basin
+        files = [file] if isinstance(file, str) else file
+        return np.array([
+            (basins is None or item.get('basin') in basins) and (files is None or item.get('file') in files)
+            for item in self.metadata
+        ], dtype=bool)
+
+    def _result(self, doc, score, pages):
+        return {"doc": int(doc), "score": float(score), **self.metadata[doc], "pages": sorted(pages)}
+
+    # Точный поиск: разделы, где встречается терм, и страницы вхождений.
+    # Для ссылки вида "Таблица 5.63" ищется составной токен "таблица:5.63".
+    # В термах из нескольких слов ("Цимлянское водохранилище") все слова должны быть
+    # в одном разделе на одной странице или на соседних (фраза может перейти на следующую);
+    # pages - страницы таких вхождений, score - число вхождений слов на них
+    def lookup(self, term, basin=None, file=None):
+        terms = _lookup_terms(analyze(term, self.stop_words))
+        if not terms:
+            return []
+        allowed = self._allowed(basin, file)
+        term_hits = []
+        for token in terms:
+            postings = self._postings(token)
+            if postings is None:
+                return []
+            _, docs, pages, counts = postings
+            hits = {}
+            for doc, page, count in zip(docs.tolist(), pages.tolist(), counts.tolist()):
+                if allowed is not None and not allowed[doc]:
+                    continue
+                hits.setdefault(doc, {})[page] = count
+            term_hits.append(hits)
+
+        results = []
+        for doc in sorted(set.intersection(*(set(hits) for hits in term_hits))):
+            doc_hits = [hits[doc] for hits in term_hits]
+            matched = set()
+            # Окно из двух соседних страниц: каждое слово должно встретиться в нём
+            for first in sorted({page - shift for hits in doc_hits for page in hits for shift in (0, 1)}):
+                window = (first, first + 1)
+                if all(any(page in hits for page in window) for hits in doc_hits):
+                    matched.update(page for hits in doc_hits for page in window if page in hits)
+            if matched:
+                score = sum(hits.get(page, 0) for hits in doc_hits for page in matched)
+                results.append(self._result(doc, score, matched))
+        return results
+
+    # Разделы со ссылкой на таблицу (рисунок, приложение) с данным номером, например "5.63"
+    def lookup_reference(self, number, kind="таблица", basin=None, file=None):
+        return self.lookup(f"{kind} {number}", basin=basin, file=file)
+
+    def _hit_pages(self, terms, candidates):
+        hit_pages = {doc: set() for doc in candidates.tolist()}
+        for term in terms:
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            _, docs, pages, _ = postings
+            selected = np.isin(docs, candidates)
+            for doc, page in zip(docs[selected].tolist(), pages[selected].tolist()):
+                hit_pages[doc].add(page)
+        return hit_pages
+
+    # BM25 по конечным разделам; pages - страницы раздела, где встретились термы запроса
+    def search(self, query, k=10, basin=None, file=None):
+        scores = np.zeros(len(self), dtype=np.float32)
+        count = len(self)
+        query_terms = Counter(analyze(query, self.stop_words))
+        for term, query_count in query_terms.items():
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            index, docs, _, counts = postings
+            # Постинги терма упорядочены по разделу: частоты страниц суммируются по разделам
+            unique_docs, starts = np.unique(docs, return_index=True)
+            frequencies = np.add.reduceat(counts.astype(np.float32), starts)
+            frequency = self.doc_freq[index]
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[unique_docs] / max(self.avg_length, 1.0))
+            scores[unique_docs] += query_count * idf * frequencies * (BM25_K1 + 1) / (frequencies + norm)
+
+        allowed = self._allowed(basin, file)
+        if allowed is not None:
+            scores[~allowed] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        hit_pages = self._hit_pages(query_terms, candidates)
+        return [self._result(doc, scores[doc], hit_pages[doc]) for doc in candidates.tolist()]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ("offsets", "docs", "pages", "counts", "lengths"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "index.json"), 'w', encoding='utf-8') as index_file:
+            json.dump({
+                "version": INDEX_VERSION,
+                "terms": self.terms,
+                "metadata": self.metadata,
+                "stop_words": sorted(self.stop_words)
+            }, index_file, ensure_ascii=False)
+
+    # Массивы постингов отображаются в память
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "index.json"), 'r', encoding='utf-8') as index_file:
+            data = json.load(index_file)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Неподдерживаемая версия индекса: {data.get('version')}")
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in ("offsets", "docs", "pages", "counts", "lengths")
+        }
+        return cls(
+            data['terms'], arrays['offsets'], arrays['docs'], arrays['pages'], arrays['counts'],
+            arrays['lengths'], data['metadata'], data['stop_words']
+        )
+
+
+# Reciprocal Rank Fusion списков результатов (например, BM25 и VectorIndex.query):
+# key(item) сопоставляет элементы разных списков, по умолчанию (basin, file, title)
+def reciprocal_rank_fusion(rankings, k=60, key=None):
+    key = key or _section_key
+    scores = {}
+    items = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            item_key = key(item)
+            scores[item_key] = scores.get(item_key, 0.0) + 1.0 / (k + rank + 1)
+            items.setdefault(item_key, item)
+    order = sorted(scores, key=scores.get, reverse=True)
+    return [(items[item_key], scores[item_key]) for item_key in order]
+
+
+def _section_key(item):
+    payload = item.get('payload', item)
+    return payload.get('basin'), payload.get('file'), payload.get('title')
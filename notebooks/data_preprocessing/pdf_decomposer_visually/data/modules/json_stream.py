@@ -0,0 +1,216 @@
+import json
+
+
+JSON_INDENT = "    "
+
+
+# Обёртка файла, считающая хэш всего записанного текста
+class HashingWriter:
+    def __init__(self, json_file, digest):
+        self.json_file = json_file
+        self.digest = digest
+
+    def write(self, data):
+        self.digest.update(data.encode('utf-8'))
+        return self.json_file.write(data)
+
+
+# Потоковая запись иерархии: результат совпадает с json.dump(..., indent=4),
+# но в памяти одновременно находится только один раздел верхнего уровня
+def write_hierarchy_json(sections, json_file):
+    first = True
+    for section in sections:
+        data = json.dumps(section, ensure_ascii=False, indent=4)
+        json_file.write("[\n" if first else ",\n")
+        json_file.write("\n".join(JSON_INDENT + line for line in data.split("\n")))
+        first = False
+    json_file.write("[]" if first else "\n]")
+
+
+# Запись иерархии по событиям обхода в глубину (begin_section/end_section) без
+# построения дерева в памяти. Результат побайтно совпадает с json.dump(hierarchy,
+# ensure_ascii=False, indent=4) для разделов с ключами level, title, start_page,
+# end_page, subsections и необязательными ключами после subsections (text, page_offsets).
+class HierarchyJsonWriter:
+    def __init__(self, json_file):
+        self.json_file = json_file
+        # Для каждого открытого массива: (глубина, число записанных элементов)
+        self._arrays = [[0, 0]]
+        self._has_subsections = []
+        self.json_file.write("[")
+
+    def _indent(self, depth):
+        return "\n" + JSON_INDENT * depth
+
+    def begin_section(self, section, has_subsections):
+        array = self._arrays[-1]
+        depth = array[0] + 1
+        self.json_file.write("," if array[1] else "")
+        self.json_file.write(self._indent(depth) + "{")
+        array[1] += 1
+        for key in ("level", "title", "start_page", "end_page"):
+            self.json_file.write(self._indent(depth + 1) + f'"{key}": ' + json.dumps(section[key], ensure_ascii=False) + ",")
+        self.json_file.write(self._indent(depth + 1) + '"subsections": ')
+        self._has_subsections.append(has_subsections)
+        if has_subsections:
+            self.json_file.write("[")
+            self._arrays.append([depth + 1, 0])
+        else:
+            self.json_file.write("[]")
+
+    # extra - ключи после subsections, например {"text": ..., "page_offsets": ...} конечного раздела
+    def end_section(self, extra=None):
+        if self._has_subsections.pop():
+            array_depth, _ = self._arrays.pop()
+            self.json_file.write(self._indent(array_depth) + "]")
+        depth = self._arrays[-1][0] + 1
+        for key, value in (extra or {}).items():
+            # Списки (page_offsets) - с отступами, как у json.dump(indent=4) на этой глубине
+            data = json.dumps(value, ensure_ascii=False, indent=4).replace("\n", self._indent(depth + 1))
+            self.json_file.write("," + self._indent(depth + 1) + f'"{key}": ' + data)
+        self.json_file.write(self._indent(depth) + "}")
+
+    def close(self):
+        self.json_file.write(self._indent(0) + "]" if self._arrays[0][1] else "]")
+
+
+# JSON Lines: одна строка на конечный раздел с путём заголовков до него
+def leaf_record(section, parents, **metadata):
+    record = {
+        "title": section['title'],
+        "level": section['level'],
+        "parent_title": parents[-1] if parents else "",
+        "path": parents,
+        "start_page": section['start_page'],
+        "end_page": section['end_page'],
+        "text": section.get('text', "")
+    }
+    if 'page_offsets' in section:
+        record['page_offsets'] = section['page_offsets']
+    if 'layout' in section:
+        record['layout'] = section['layout']
+    record.update(metadata)
+    return record
+
+
+def write_leaves_jsonl(hierarchy, json_file, **metadata):
+    stack = [(section, []) for section in reversed(hierarchy)]
+    count = 0
+    while stack:
+        section, parents = stack.pop()
+        if section['subsections']:
+            path = parents + [section['title']]
+            stack.extend((subsection, path) for subsection in reversed(section['subsections']))
+            continue
+
+        json_file.write(json.dumps(leaf_record(section, parents, **metadata), ensure_ascii=False))
+        json_file.write("\n")
+        count += 1
+    return count
+
+
+def save_leaves_to_jsonl(hierarchy, output_path, **metadata):
+    with open(output_path, 'w', encoding='utf-8') as json_file:
+        return write_leaves_jsonl(hierarchy, json_file, **metadata)
+
+
+def _skip_whitespace(buffer, pos):
+    while pos < len(buffer) and buffer[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+# Ленивое чтение элементов JSON-массива верхнего уровня без загрузки всего файла
+def iter_json_array(path, chunk_size=1 << 16):
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as source:
+        buffer = ""
+        pos = 0
+        eof = False
+        state = "start"
+
+        def refill(size):
+            nonlocal buffer, pos, eof
+            chunk = source.read(size)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            eof = not chunk
+
+        while True:
+            pos = _skip_whitespace(buffer, pos)
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError(f"Неожиданный конец JSON-массива: {path}")
+                refill(chunk_size)
+                continue
+
+            char = buffer[pos]
+            if state == "start":
+                if char != "[":
+                    raise ValueError(f"Ожидался JSON-массив: {path}")
+                pos += 1
+                state = "first"
+            elif state == "separator":
+                if char == "]":
+                    return
+                if char != ",":
+                    raise ValueError(f"Ожидалась ',' в JSON-массиве: {path}")
+                pos += 1
+                state = "value"
+            else:
+                if state == "first" and char == "]":
+                    return
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    # Элемент не поместился в буфер: читаем не меньше уже накопленного,
+                    # чтобы разбор большого раздела оставался линейным
+                    refill(max(chunk_size, len(buffer) - pos))
+                    continue
+                if end == len(buffer) and not eof:
+                    # Число на границе буфера могло быть прочитано не полностью
+                    refill(chunk_size)
+                    continue
+                pos = end
+                state = "separator"
+                yield value
+
+
+def iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as source:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _iter_records(path):
+    if path.endswith(".jsonl"):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+# Разделы верхнего уровня из JSON книги (или записи из JSON Lines)
+def iter_sections(path):
+    return _iter_records(path)
+
+
+# Конечные разделы книги; для JSON Lines записи уже являются конечными разделами
+def iter_leaf_sections_from_file(path):
+    for record in _iter_records(path):
+        if 'subsections' not in record:
+            yield record
+            continue
+        stack = [record]
+        while stack:
+            section = stack.pop()
+            if section['subsections']:
+                stack.extend(reversed(section['subsections']))
+            else:
+                yield section
+
+
+# Документы из all_documents*.json ({"metadata": ..., "page_content": ...})
+def iter_documents(path):
+    return _iter_records(path)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+
+
+# 2: JSON конечных разделов содержит page_offsets; книги, собранные
+# прежней версией, пересобираются
+MANIFEST_VERSION = 2
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Отпечаток оглавления вместе с числом страниц: от них зависит дерево разделов
+# (конец последнего раздела - последняя страница книги)
+def toc_fingerprint(toc, page_count=None):
+    data = json.dumps({"toc": [list(entry) for entry in toc], "page_count": page_count}, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+# Хэш потока содержимого страницы; считается один раз на документ
+def page_digest(doc, page_num):
+    digests = getattr(doc, '_page_digests', None)
+    if digests is None:
+        digests = {}
+        doc._page_digests = digests
+    if page_num not in digests:
+        contents = doc.load_page(page_num).read_contents()
+        digests[page_num] = hashlib.sha256(contents).hexdigest()
+    return digests[page_num]
+
+
+# Отпечаток раздела: заголовок, диапазон страниц и содержимое этих страниц
+def section_fingerprint(doc, section):
+    digest = hashlib.sha256()
+    digest.update(f"{section['title']}|{section['start_page']}|{section['end_page']}".encode('utf-8'))
+    for page_num in range(section['start_page'] - 1, section['end_page']):
+        if 0 <= page_num < doc.page_count:
+            digest.update(page_digest(doc, page_num).encode('ascii'))
+    return digest.hexdigest()
+
+
+def _key(pdf_path):
+    return os.path.normpath(pdf_path)
+
+
+# Манифест сборки: для каждого исходного PDF хранит хэш содержимого,
+# отпечаток оглавления и созданные файлы с их отпечатками.
+# Повторный запуск пропускает неизменённые книги и неизменённые разделы;
+# выводы, зависящие только от оглавления (индексы диапазонов страниц),
+# пересоздаются только при смене его отпечатка.
+class BuildManifest:
+    def __init__(self, path=None, books=None):
+        self.path = path
+        self.books = books if books is not None else {}
+        self._previous = {}
+
+        if books is None and path is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as manifest_file:
+                data = json.load(manifest_file)
+            if data.get('version') == MANIFEST_VERSION:
+                self.books = data['books']
+
+    def save(self, path=None):
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump({"version": MANIFEST_VERSION, "books": self.books}, manifest_file, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, path)
+
+    def entry(self, pdf_path):
+        return self.books.get(_key(pdf_path))
+
+    # Книга не изменилась, выводы те же и все созданные файлы на месте
+    def book_unchanged(self, pdf_path, content_hash, targets):
+        entry = self.entry(pdf_path)
+        if entry is None or entry.get('content_hash') != content_hash:
+            return False
+        if entry.get('targets') != [os.path.normpath(target) if target else None for target in targets]:
+            return False
+        return all(os.path.exists(output) for output in entry.get('outputs', {}))
+
+    def start_book(self, pdf_path, content_hash, targets):
+        key = _key(pdf_path)
+        previous = self.books.get(key, {})
+        self._previous[key] = previous.get('outputs', {})
+        self.books[key] = {
+            "content_hash": content_hash,
+            "toc_fingerprint": previous.get('toc_fingerprint'),
+            "targets": [os.path.normpath(target) if target else None for target in targets],
+            "outputs": {}
+        }
+
+    def set_toc(self, pdf_path, toc, page_count=None):
+        self.books[_key(pdf_path)]['toc_fingerprint'] = toc_fingerprint(toc, page_count)
+
+    def toc(self, pdf_path):
+        return self.books[_key(pdf_path)].get('toc_fingerprint')
+
+    def output_unchanged(self, pdf_path, output_path, fingerprint):
+        previous = self._previous.get(_key(pdf_path), {})
+        return previous.get(os.path.normpath(output_path)) == fingerprint and os.path.exists(output_path)
+
+    def record_output(self, pdf_path, output_path, fingerprint):
+        self.books[_key(pdf_path)]['outputs'][os.path.normpath(output_path)] = fingerprint
+
+    # Удаление файлов, созданных прошлой сборкой для разделов, которых больше нет
+    def finish_book(self, pdf_path):
+        key = _key(pdf_path)
+        previous = self._previous.pop(key, {})
+        current = self.books[key]['outputs']
+        removed = []
+        for output_path in previous:
+            if output_path not in current and os.path.exists(output_path):
+                os.remove(output_path)
+                removed.append(output_path)
+                # Каталог удалённого раздела убирается, если в нём больше ничего нет
+                try:
+                    os.rmdir(os.path.dirname(output_path))
+                except OSError:
+                    pass
+        return removed
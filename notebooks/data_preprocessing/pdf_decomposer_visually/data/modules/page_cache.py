@@ -0,0 +1,125 @@
+from collections import OrderedDict
+
+from .page_layout import extract_page_layout
+
+
+DEFAULT_CACHE_SIZE = 2048
+
+
+# LRU-кэш текста страниц одного документа.
+# Ключ - (номер страницы, флаги извлечения, режим), поэтому каждая страница
+# извлекается не более одного раза за сеанс, пока помещается в кэш.
+# Режим "text" хранит строку, режим "layout" - разбор страницы (extract_page_layout).
+class PageTextCache:
+    def __init__(self, doc, maxsize=DEFAULT_CACHE_SIZE):
+        self.doc = doc
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def _lookup(self, key):
+        value = self._pages.get(key)
+        if value is not None:
+            self._pages.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        self._pages[key] = value
+        if len(self._pages) > self.maxsize:
+            self._pages.popitem(last=False)
+
+    def get_text(self, page_num, flags=None):
+        if page_num < 0:
+            page_num += self.doc.page_count
+
+        text = self._lookup((page_num, flags, "text"))
+        if text is None:
+            # Текст уже разобранной страницы берётся из её разметки
+            layout = self._lookup((page_num, flags, "layout"))
+            if layout is not None:
+                text = layout['text']
+        if text is not None:
+            self.hits += 1
+            return text
+
+        self.misses += 1
+        page = self.doc.load_page(page_num)
+        if flags is None:
+            text = page.get_text()
+        else:
+            text = page.get_text("text", flags=flags)
+
+        self._store((page_num, flags, "text"), text)
+        return text
+
+    # Текст, извлечённый вне кэша (например, в пуле процессов)
+    def put_text(self, page_num, text, flags=None):
+        if page_num < 0:
+            page_num += self.doc.page_count
+        self._store((page_num, flags, "text"), text)
+
+    def get_layout(self, page_num, flags=None):
+        if page_num < 0:
+            page_num += self.doc.page_count
+        key = (page_num, flags, "layout")
+
+        layout = self._lookup(key)
+        if layout is not None:
+            self.hits += 1
+            return layout
+
+        self.misses += 1
+        layout = extract_page_layout(self.doc.load_page(page_num), flags)
+        self._store(key, layout)
+        return layout
+
+    def layout_for_pages(self, start_page, end_page, flags=None):
+        return [
+            self.get_layout(page_num, flags)
+            for page_num in range(start_page - 1, end_page)
+        ]
+
+    # Текст диапазона страниц в нумерации оглавления (с единицы, как в разделах)
+    def text_for_pages(self, start_page, end_page, flags=None):
+        return "".join(
+            self.get_text(page_num, flags)
+            for page_num in range(start_page - 1, end_page)
+        )
+
+    # Смещения начала каждой страницы в тексте text_for_pages(start_page, end_page)
+    def page_offsets(self, start_page, end_page, flags=None):
+        offsets = []
+        position = 0
+        for page_num in range(start_page - 1, end_page):
+            offsets.append(position)
+            position += len(self.get_text(page_num, flags))
+        return offsets
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._pages),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / requests if requests else 0.0
+        }
+
+    def clear(self):
+        self._pages.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Кэш живёт вместе с документом, поэтому все функции, получившие один и тот же doc,
+# пользуются одним кэшем
+def get_page_cache(doc, maxsize=DEFAULT_CACHE_SIZE):
+    cache = getattr(doc, '_page_text_cache', None)
+    if cache is None:
+        cache = PageTextCache(doc, maxsize)
+        doc._page_text_cache = cache
+    return cache
@@ -0,0 +1,59 @@
+import fitz
+
+
+def _inside(bbox, outer):
+    x = (bbox[0] + bbox[2]) / 2
+    y = (bbox[1] + bbox[3]) / 2
+    return outer[0] <= x <= outer[2] and outer[1] <= y <= outer[3]
+
+
+def _round_bbox(bbox):
+    return [round(value, 1) for value in bbox]
+
+
+# Разбор страницы за один проход PyMuPDF: текст, текстовые блоки,
+# таблицы построчно и число изображений. Заменяет отдельный проход pdfplumber
+# (extract_text + extract_tables + images) в EDA.
+def extract_page_layout(page, flags=None, detect_tables=True):
+    # Те же флаги, что у page.get_text(): текст совпадает с режимом "text"
+    text_page = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT if flags is None else flags)
+    text = page.get_text("text", textpage=text_page)
+
+    tables = []
+    if detect_tables:
+        for table in page.find_tables().tables:
+            tables.append({
+                "bbox": _round_bbox(table.bbox),
+                "rows": table.extract()
+            })
+
+    # Блоки внутри найденных таблиц не повторяются: их содержимое уже в rows
+    blocks = []
+    for x0, y0, x1, y1, block_text, _, block_type in page.get_text("blocks", textpage=text_page):
+        if block_type != 0:
+            continue
+        bbox = (x0, y0, x1, y1)
+        if any(_inside(bbox, table['bbox']) for table in tables):
+            continue
+        blocks.append({"bbox": _round_bbox(bbox), "text": block_text})
+
+    return {
+        "page": page.number + 1,
+        "text": text,
+        "blocks": blocks,
+        "tables": tables,
+        "image_count": len(page.get_images(full=True))
+    }
+
+
+# Сводка разметки раздела для хранения рядом с текстом раздела
+# (текст страниц не дублируется, он уже есть в section['text'])
+def section_layout(pages):
+    return {
+        "table_count": sum(len(page['tables']) for page in pages),
+        "image_count": sum(page['image_count'] for page in pages),
+        "pages": [
+            {key: value for key, value in page.items() if key != 'text'}
+            for page in pages
+        ]
+    }
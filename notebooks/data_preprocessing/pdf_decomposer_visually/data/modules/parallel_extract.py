@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+
+# Непрерывные диапазоны страниц для рабочих процессов. Частей больше, чем процессов,
+# чтобы страницы с тяжёлой разметкой не задерживали весь проход.
+def shard_pages(page_nums, workers, shards_per_worker=4):
+    page_nums = sorted(page_nums)
+    count = max(min(len(page_nums), workers * shards_per_worker), 1)
+    size, extra = divmod(len(page_nums), count)
+    shards = []
+    start = 0
+    for index in range(count):
+        end = start + size + (1 if index < extra else 0)
+        if end > start:
+            shards.append(page_nums[start:end])
+        start = end
+    return shards
+
+
+# Рабочий процесс открывает документ сам: объекты fitz не передаются между процессами
+def _extract_shard(pdf_path, page_nums, flags):
+    with fitz.open(pdf_path) as doc:
+        if flags is None:
+            return [(page_num, doc.load_page(page_num).get_text()) for page_num in page_nums]
+        return [(page_num, doc.load_page(page_num).get_text("text", flags=flags)) for page_num in page_nums]
+
+
+# Текст страниц (нумерация с нуля) в пуле процессов; результат не зависит
+# от числа процессов и совпадает с последовательным page.get_text().
+# Процессы запускаются через spawn, а не fork: пул создаётся и из рабочего потока GUI,
+# и дочерний процесс не должен унаследовать блокировки, захваченные другими потоками
+def extract_pages_parallel(pdf_path, page_nums, workers=None, flags=None):
+    workers = workers or os.cpu_count() or 1
+    shards = shard_pages(page_nums, workers)
+    if workers == 1 or len(shards) <= 1:
+        return dict(pair for shard in shards for pair in _extract_shard(pdf_path, shard, flags))
+
+    texts = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for pairs in pool.map(_extract_shard, [pdf_path] * len(shards), shards, [flags] * len(shards)):
+            texts.update(pairs)
+    return texts
@@ -1,18 +1,38 @@
 import os
 import re
+import json
+import hashlib
 import shutil
+from contextlib import nullcontext
+
 import fitz
 
+from .instrumentation import get_logger
+from .json_stream import HashingWriter, write_hierarchy_json
+from .manifest import section_fingerprint
+
+logger = get_logger("pdf_to_folders")
+
+PAGE_RANGE_INDEX = "index.json"
+
 def clean_title(title):
     clean_title = re.sub(r'[<>:"/\\|?*]', '', title)
     clean_title = re.sub(r'\s+', '_', clean_title).strip()
     clean_title = clean_title.rstrip('.')
     return clean_title[:50]
 
-def create_directory_structure(hierarchy, base_path, pdf_path):
-    
-    doc = fitz.open(pdf_path)
+# progress (ProgressReporter) получает по событию на раздел: скопированные страницы и записанные байты.
+# lock (если задан) берётся на время экспорта каждого раздела.
+# Возвращает итог по всему дереву: (страниц скопировано, байт записано)
+def create_directory_structure(hierarchy, base_path, pdf_path, doc=None, manifest=None, leaf_only=False, progress=None,
+                               lock=None):
+    # Документ открывается один раз на верхнем уровне и передаётся в рекурсию
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(pdf_path)
 
+    total_pages = 0
+    total_bytes = 0
     for section in hierarchy:
         clean_title_name = clean_title(section['title'])
         section_dir = os.path.join(base_path, clean_title_name)
@@ -21,47 +41,150 @@ def create_directory_structure(hierarchy, base_path, pdf_path):
             try:
                 os.makedirs(base_path, exist_ok=True)
             except Exception as e:
-                print(f"Не удалось создать базовую директорию: {base_path}. Ошибка: {e}")
+                logger.error("Не удалось создать базовую директорию: %s. Ошибка: %s", base_path, e)
                 continue
             
-        print(f"Создание директории: {section_dir}")
+        logger.info("Создание директории: %s", section_dir)
 
         try:
             os.makedirs(section_dir, exist_ok=True)
         except Exception as e:
-            print(f"Не удалось создать директорию: {section_dir}. Ошибка: {e}")
+            logger.error("Не удалось создать директорию: %s. Ошибка: %s", section_dir, e)
             continue
 
-        new_pdf_name = f"{clean_title_name}.pdf".strip()
-        new_pdf_path = os.path.join(section_dir, new_pdf_name)
-
         if not os.path.exists(section_dir):
-            print(f"Директория не существует: {section_dir}. Невозможно сохранить PDF.")
+            logger.error("Директория не существует: %s. Невозможно сохранить PDF.", section_dir)
             continue
 
+        with lock if lock is not None else nullcontext():
+            pages_copied, bytes_written = export_section(
+                doc, section, section_dir, pdf_path, manifest=manifest, leaf_only=leaf_only
+            )
+
+        total_pages += pages_copied
+        total_bytes += bytes_written
+        if progress is not None:
+            progress.advance(pages=pages_copied, bytes_written=bytes_written, message=section['title'])
+            try:
+                progress.check()
+            except Exception:
+                if own_doc:
+                    doc.close()
+                raise
+
+        if section.get('subsections'):
+            sub_pages, sub_bytes = create_directory_structure(
+                section['subsections'], section_dir, pdf_path,
+                doc=doc, manifest=manifest, leaf_only=leaf_only, progress=progress, lock=lock
+            )
+            total_pages += sub_pages
+            total_bytes += sub_bytes
+
+    if own_doc:
+        doc.close()
+    return total_pages, total_bytes
+
+# PDF одного раздела (или index.json родительского раздела в режиме leaf_only)
+# в уже созданном каталоге section_dir. Возвращает (страниц скопировано, байт записано).
+def export_section(doc, section, section_dir, pdf_path, manifest=None, leaf_only=False):
+    clean_title_name = clean_title(section['title'])
+    new_pdf_path = os.path.join(section_dir, f"{clean_title_name}.pdf".strip())
+
+    pages_copied = 0
+    bytes_written = 0
+
+    # В режиме leaf_only PDF сохраняются только для конечных разделов,
+    # для родительских пишется индекс диапазонов страниц
+    if leaf_only and section.get('subsections'):
+        # Индекс строится только по оглавлению: его отпечаток и есть отпечаток индекса,
+        # и при неизменном оглавлении файл не переписывается
+        index_path = os.path.join(section_dir, PAGE_RANGE_INDEX)
+        fingerprint = manifest.toc(pdf_path) if manifest is not None else None
+        if fingerprint is None or not manifest.output_unchanged(pdf_path, index_path, fingerprint):
+            write_page_range_index(section, section_dir)
+            bytes_written = os.path.getsize(index_path)
+        # Индекс - такой же вывод раздела, как PDF: при смене режима или
+        # исчезновении раздела finish_book его удалит
+        if manifest is not None:
+            manifest.record_output(pdf_path, index_path, fingerprint)
+    else:
         start_page = section['start_page'] - 1
         end_page = section['end_page'] - 1
 
-        if start_page <= end_page:
-            new_pdf_doc = fitz.open()
+        # Раздел не изменился с прошлой сборки - PDF не пересоздаётся
+        fingerprint = None
+        unchanged = False
+        if manifest is not None:
+            fingerprint = section_fingerprint(doc, section)
+            unchanged = manifest.output_unchanged(pdf_path, new_pdf_path, fingerprint)
 
-            for page_num in range(start_page, end_page + 1):
-                new_pdf_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+        if unchanged:
+            manifest.record_output(pdf_path, new_pdf_path, fingerprint)
+        elif start_page <= end_page:
+            # Один диапазон вместо постраничной вставки: общие шрифты и изображения
+            # переносятся в файл раздела один раз
+            new_pdf_doc = fitz.open()
+            new_pdf_doc.insert_pdf(doc, from_page=start_page, to_page=end_page)
 
             if new_pdf_doc.page_count > 0:
                 try:
-                    new_pdf_doc.save(new_pdf_path)
-                    print(f"Сохранен PDF: {new_pdf_path}")
+                    new_pdf_doc.save(new_pdf_path, garbage=3, deflate=True)
+                    pages_copied = new_pdf_doc.page_count
+                    bytes_written = os.path.getsize(new_pdf_path)
+                    if manifest is not None:
+                        manifest.record_output(pdf_path, new_pdf_path, fingerprint)
+                    logger.info("Сохранен PDF: %s", new_pdf_path)
                 except Exception as e:
-                    print(f"Не удалось сохранить PDF: {new_pdf_path}. Ошибка: {e}")
+                    logger.error("Не удалось сохранить PDF: %s. Ошибка: %s", new_pdf_path, e)
             else:
-                print(f"Пропущен раздел '{clean_title_name}': нет страниц для сохранения.")
+                logger.warning("Пропущен раздел '%s': нет страниц для сохранения.", clean_title_name)
 
             new_pdf_doc.close()
         else:
-            print(f"Пропущен раздел '{clean_title_name}': недопустимый диапазон страниц ({start_page + 1} - {end_page + 1})")
+            logger.warning("Пропущен раздел '%s': недопустимый диапазон страниц (%s - %s)", clean_title_name, start_page + 1, end_page + 1)
+    return pages_copied, bytes_written
 
-        if section.get('subsections'):
-            create_directory_structure(section['subsections'], section_dir, pdf_path)
+def write_page_range_index(section, section_dir):
+    index = {
+        "title": section['title'],
+        "start_page": section['start_page'],
+        "end_page": section['end_page'],
+        "subsections": [
+            {
+                "title": subsection['title'],
+                "path": clean_title(subsection['title']),
+                "start_page": subsection['start_page'],
+                "end_page": subsection['end_page']
+            }
+            for subsection in section['subsections']
+        ]
+    }
+    index_path = os.path.join(section_dir, PAGE_RANGE_INDEX)
+    with open(index_path, 'w', encoding='utf-8') as index_file:
+        json.dump(index, index_file, ensure_ascii=False, indent=4)
+    return index_path
+
+def save_hierarchy_to_json(hierarchy, output_path, manifest=None, pdf_path=None, progress=None):
+    # Разделы пишутся по одному, весь JSON в памяти не собирается
+    if manifest is None:
+        with open(output_path, 'w', encoding='utf-8') as json_file:
+            write_hierarchy_json(hierarchy, json_file)
+        if progress is not None:
+            progress.advance(bytes_written=os.path.getsize(output_path))
+        return
+
+    # Хэш считается во время записи во временный файл;
+    # неизменённый JSON не перезаписывается
+    tmp_path = output_path + ".tmp"
+    digest = hashlib.sha256()
+    with open(tmp_path, 'w', encoding='utf-8') as json_file:
+        write_hierarchy_json(hierarchy, HashingWriter(json_file, digest))
 
-    doc.close()
\ No newline at end of file
+    fingerprint = digest.hexdigest()
+    if manifest.output_unchanged(pdf_path, output_path, fingerprint):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, output_path)
+    manifest.record_output(pdf_path, output_path, fingerprint)
+    if progress is not None:
+        progress.advance(bytes_written=os.path.getsize(output_path))
@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+# Ход длительной операции (экспорт книги, пакетная обработка).
+# Каждое изменение публикуется событием-словарём в очередь events:
+# интерфейс забирает их из своего потока, консоль печатает.
+# cancel() можно вызвать из любого потока; работа прерывается
+# на ближайшей проверке check() исключением ExportCancelled.
+class ProgressReporter:
+    def __init__(self, events=None):
+        self.events = events if events is not None else queue.Queue()
+        self._cancel = threading.Event()
+        self.total = 0
+        self.done = 0
+        self.pages = 0
+        self.bytes_written = 0
+        self.stage = ""
+        self.started = time.perf_counter()
+
+    # Новый этап: счётчики разделов и страниц сбрасываются, записанные байты копятся
+    def start(self, total, stage=""):
+        self.total = total
+        self.done = 0
+        self.pages = 0
+        self.stage = stage
+        self.started = time.perf_counter()
+        self._emit("start")
+
+    def set_stage(self, stage):
+        self.stage = stage
+        self._emit("stage")
+
+    def add_total(self, count):
+        self.total += count
+        self._emit("progress")
+
+    def advance(self, done=1, pages=0, bytes_written=0, message=None):
+        self.done += done
+        self.pages += pages
+        self.bytes_written += bytes_written
+        self._emit("progress", message)
+
+    def finish(self, status="done", message=None):
+        self._emit(status, message)
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise ExportCancelled("Операция отменена")
+
+    # Оставшееся время по средней скорости с начала операции
+    def eta(self):
+        if self.done <= 0 or self.total <= self.done:
+            return None
+        elapsed = time.perf_counter() - self.started
+        return elapsed / self.done * (self.total - self.done)
+
+    def snapshot(self):
+        return {
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "pages": self.pages,
+            "bytes_written": self.bytes_written,
+            "elapsed": time.perf_counter() - self.started,
+            "eta": self.eta()
+        }
+
+    def _emit(self, kind, message=None):
+        event = self.snapshot()
+        event['event'] = kind
+        event['message'] = message
+        self.events.put(event)
+
+    # Все накопившиеся события без ожидания
+    def drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+
+def format_bytes(size):
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def format_progress(event):
+    line = f"{event['stage']}: {event['done']}/{event['total']}"
+    if event['pages']:
+        line += f", страниц: {event['pages']}"
+    if event['bytes_written']:
+        line += f", записано: {format_bytes(event['bytes_written'])}"
+    if event['eta'] is not None:
+        line += f", осталось ~{event['eta']:.0f} с"
+    return line
@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .embedding import document_metadata, document_text
+from .instrumentation import get_logger
+
+logger = get_logger("qdrant_upload")
+
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_WORKERS = 4
+
+# Индексы полей payload, по которым фильтруют запросы к коллекции
+PAYLOAD_INDEXES = {
+    "basin": "keyword",
+    "file": "keyword",
+    "level": "integer"
+}
+
+
+# Payload точки: метаданные документа и, если нужно, его текст.
+# Без текста точки в несколько раз меньше; текст тогда берётся из JSON или хранилища корпуса.
+def point_payload(document, include_content=True):
+    payload = dict(document_metadata(document))
+    # ID токенов нужны только для векторизации
+    payload.pop('token_ids', None)
+    if include_content:
+        payload['content'] = document_text(document)
+    return payload
+
+
+# Коллекция создаётся, если её нет; индексы payload создаются заранее,
+# до загрузки точек, чтобы не перестраивать их по уже записанным данным
+def ensure_collection(client, collection_name, vector_size, distance="Cosine", payload_indexes=None):
+    from qdrant_client.models import VectorParams
+
+    payload_indexes = PAYLOAD_INDEXES if payload_indexes is None else payload_indexes
+    existing = {collection.name for collection in client.get_collections().collections}
+    created = collection_name not in existing
+    if created:
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=vector_size, distance=distance),
+        )
+        logger.info("Коллекция '%s' создана", collection_name)
+    for field_name, field_schema in payload_indexes.items():
+        client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=field_schema)
+    return created
+
+
+# Повтор загрузки пачки с экспоненциальной задержкой и случайным разбросом;
+# после retries неудачных попыток исключение передаётся вызывающему
+def upsert_with_retry(client, collection_name, points, retries=5, backoff=0.5, max_backoff=30.0):
+    attempt = 0
+    while True:
+        try:
+            client.upsert(collection_name=collection_name, points=points, wait=True)
+            return attempt
+        except Exception as e:
+            attempt += 1
+            if attempt > retries:
+                raise
+            delay = min(backoff * 2 ** (attempt - 1), max_backoff) * random.uniform(0.5, 1.0)
+            logger.warning("Ошибка загрузки пачки из %s точек (%s), повтор %s/%s через %.1f с",
+                           len(points), e, attempt, retries, delay)
+            time.sleep(delay)
+
+
+def _points(ids, vectors, payloads, start, end):
+    from qdrant_client.models import PointStruct
+
+    return [
+        PointStruct(id=ids[index], vector=_as_list(vectors[index]), payload=payloads[index])
+        for index in range(start, end)
+    ]
+
+
+def _as_list(vector):
+    return vector.tolist() if hasattr(vector, 'tolist') else list(vector)
+
+
+# Параллельная загрузка точек пачками по batch_size в workers потоках.
+# client - общий клиент (его пул соединений используют все потоки) либо функция без
+# аргументов, создающая клиента: тогда у каждого потока свой клиент.
+# В полёте не больше 2 * workers пачек, поэтому PointStruct для всего корпуса
+# одновременно в памяти не строятся. progress (ProgressReporter) получает событие
+# на каждую пачку, его cancel() останавливает отправку новых пачек.
+def upload_points(client, collection_name, ids, vectors, payloads, batch_size=DEFAULT_BATCH_SIZE,
+                  workers=DEFAULT_WORKERS, retries=5, backoff=0.5, progress=None):
+    if not (len(ids) == len(vectors) == len(payloads)):
+        raise ValueError("Число ID, векторов и payload не совпадает")
+
+    local = threading.local()
+
+    def get_client():
+        if not callable(client):
+            return client
+        if not hasattr(local, 'client'):
+            local.client = client()
+        return local.client
+
+    def send(start, end):
+        points = _points(ids, vectors, payloads, start, end)
+        return len(points), upsert_with_retry(get_client(), collection_name, points, retries, backoff)
+
+    batches = [(start, min(start + batch_size, len(ids))) for start in range(0, len(ids), batch_size)]
+    if progress is not None:
+        progress.start(len(batches), "Загрузка в Qdrant")
+
+    stats = {"points": 0, "batches": 0, "retries": 0}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        queued = iter(batches)
+        try:
+            while True:
+                for start, end in queued:
+                    pending.add(pool.submit(send, start, end))
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    points, retried = future.result()
+                    stats['points'] += points
+                    stats['batches'] += 1
+                    stats['retries'] += retried
+                    if progress is not None:
+                        progress.advance(message=f"{stats['points']} точек")
+                if progress is not None:
+                    progress.check()
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+    stats['seconds'] = time.perf_counter() - started
+    stats['points_per_second'] = stats['points'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def upload_documents(client, collection_name, documents, ids, vectors, include_content=True, **options):
+    payloads = [point_payload(document, include_content) for document in documents]
+    return upload_points(client, collection_name, ids, vectors, payloads, **options)
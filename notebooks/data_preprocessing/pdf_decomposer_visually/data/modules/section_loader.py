@@ -0,0 +1,85 @@
+import queue
+import threading
+
+
+# Сколько страниц соседнего раздела читать заранее
+PREFETCH_PAGES = 50
+
+
+# Фоновое извлечение текста разделов для навигатора.
+# Каждый новый запрос увеличивает generation; устаревший запрос прерывается
+# между страницами, а его результат не публикуется. Пока новых запросов нет,
+# рабочий поток заранее читает страницы соседних разделов в кэш страниц.
+# Все обращения к документу идут под lock: его же берёт код, работающий
+# с документом из других потоков (экспорт, закрытие).
+class SectionTextLoader:
+    def __init__(self, decomposer, lock=None):
+        self.decomposer = decomposer
+        self.lock = lock or threading.Lock()
+        self.generation = 0
+        self.results = queue.Queue()
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Запрос текста раздела; prefetch - диапазоны (start_page, end_page) соседних разделов
+    def request(self, key, start_page, end_page, prefetch=()):
+        self.generation += 1
+        self._requests.put((self.generation, key, start_page, end_page, list(prefetch)))
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def stop(self):
+        self.cancel()
+        self._requests.put(None)
+        self._thread.join()
+
+    # Готовые результаты (key, text) только для последнего запроса
+    def poll(self):
+        ready = []
+        while True:
+            try:
+                generation, key, text = self.results.get_nowait()
+            except queue.Empty:
+                return ready
+            if generation == self.generation:
+                ready.append((key, text))
+
+    def _read_pages(self, generation, start_page, end_page, idle_only=False):
+        pages = []
+        for page_num in range(start_page - 1, end_page):
+            if generation != self.generation or (idle_only and not self._requests.empty()):
+                return None
+            with self.lock:
+                if self.decomposer.doc is None:
+                    return None
+                pages.append(self.decomposer.page_cache.get_text(page_num))
+        return pages
+
+    def _run(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            generation, key, start_page, end_page, prefetch = item
+            if generation != self.generation:
+                continue
+
+            try:
+                pages = self._read_pages(generation, start_page, end_page)
+            except Exception as e:
+                self.results.put((generation, key, f"Не удалось извлечь текст: {e}"))
+                continue
+            if pages is None:
+                continue
+            self.results.put((generation, key, "".join(pages)))
+
+            for prefetch_start, prefetch_end in prefetch:
+                prefetch_end = min(prefetch_end, prefetch_start + PREFETCH_PAGES - 1)
+                try:
+                    if self._read_pages(generation, prefetch_start, prefetch_end, idle_only=True) is None:
+                        break
+                except Exception:
+                    break
@@ -0,0 +1,95 @@
+from array import array
+
+from .instrumentation import get_logger
+
+logger = get_logger("section_tree")
+
+
+# Дерево разделов в параллельных массивах в порядке оглавления:
+# levels, start_pages, end_pages, parents (-1 у разделов верхнего уровня) и titles.
+# Потомки раздела идут в массивах сразу за ним, поэтому у раздела i есть подразделы,
+# только если parents[i + 1] == i.
+class SectionTree:
+    __slots__ = ("levels", "titles", "start_pages", "end_pages", "parents")
+
+    def __init__(self):
+        self.levels = array('i')
+        self.titles = []
+        self.start_pages = array('i')
+        self.end_pages = array('i')
+        self.parents = array('i')
+
+    # Один проход по плоскому оглавлению [(level, title, page), ...] вместо
+    # sections_from_toc + build_hierarchy + update_all_end_pages. Раздел снимается
+    # со стека, когда просмотрены все его потомки: в этот момент его end_page
+    # (максимум по поддереву) окончателен, передаётся родителю и поднимается до start_page.
+    # Результат совпадает с прежней цепочкой функций, включая порядок:
+    # родитель получает максимум конечных страниц потомков до их корректировки.
+    @classmethod
+    def from_toc(cls, toc, page_count):
+        levels, titles, start_pages, parents = [], [], [], []
+        raw_ends = [page_count - 1] * len(toc)
+        for index in range(len(toc) - 1):
+            raw_ends[index] = toc[index + 1][2] - 1
+        end_pages = [0] * len(toc)
+        stack = []
+
+        def close(index):
+            parent = parents[index]
+            if parent >= 0 and raw_ends[index] > raw_ends[parent]:
+                raw_ends[parent] = raw_ends[index]
+            end_page = raw_ends[index]
+            if end_page < start_pages[index]:
+                logger.info("Корректировка end_page для %s с %s на %s", titles[index], end_page, start_pages[index])
+                end_page = start_pages[index]
+            end_pages[index] = end_page
+
+        for index, (level, title, start_page) in enumerate(toc):
+            while stack and levels[stack[-1]] >= level:
+                close(stack.pop())
+            levels.append(level)
+            titles.append(title)
+            start_pages.append(start_page)
+            parents.append(stack[-1] if stack else -1)
+            stack.append(index)
+
+        while stack:
+            close(stack.pop())
+
+        tree = cls()
+        tree.levels = array('i', levels)
+        tree.titles = titles
+        tree.start_pages = array('i', start_pages)
+        tree.end_pages = array('i', end_pages)
+        tree.parents = array('i', parents)
+        return tree
+
+    def __len__(self):
+        return len(self.titles)
+
+    def has_subsections(self, index):
+        return index + 1 < len(self.parents) and self.parents[index + 1] == index
+
+    def leaves(self):
+        return [index for index in range(len(self)) if not self.has_subsections(index)]
+
+    # Представление в прежнем формате: список словарей с вложенными subsections,
+    # как после build_hierarchy + update_all_end_pages
+    def to_hierarchy(self):
+        hierarchy = []
+        nodes = []
+        for level, title, start_page, end_page, parent in zip(
+                self.levels, self.titles, self.start_pages, self.end_pages, self.parents):
+            node = {
+                "level": level,
+                "title": title,
+                "start_page": start_page,
+                "end_page": end_page,
+                "subsections": []
+            }
+            if parent >= 0:
+                nodes[parent]['subsections'].append(node)
+            else:
+                hierarchy.append(node)
+            nodes.append(node)
+        return hierarchy
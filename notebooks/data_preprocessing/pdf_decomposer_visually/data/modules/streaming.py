@@ -0,0 +1,178 @@
+import contextlib
+import hashlib
+import json
+import os
+
+import fitz
+
+from .instrumentation import get_logger
+from .json_stream import HashingWriter, HierarchyJsonWriter, leaf_record
+from .pdf_to_folders import clean_title, export_section
+
+logger = get_logger("streaming")
+
+# Через сколько прочитанных страниц очищается хранилище объектов MuPDF (разобранные
+# страницы, шрифты, изображения). Очистка после каждого раздела заставляет заново
+# разбирать общие шрифты и на небольших книгах замедляет декомпозицию в 2-3 раза.
+SHRINK_EVERY_PAGES = 500
+
+
+# Обход дерева разделов (SectionTree) в глубину в порядке оглавления:
+# ("begin", номер) при входе в раздел и ("end", номер) после всех его потомков
+def walk_tree(tree):
+    stack = []
+    for index in range(len(tree)):
+        parent = tree.parents[index]
+        while stack and stack[-1] != parent:
+            yield "end", stack.pop()
+        yield "begin", index
+        stack.append(index)
+    while stack:
+        yield "end", stack.pop()
+
+
+def _section(tree, index):
+    return {
+        "level": tree.levels[index],
+        "title": tree.titles[index],
+        "start_page": tree.start_pages[index],
+        "end_page": tree.end_pages[index],
+        "subsections": []
+    }
+
+
+def _children(tree):
+    children = [[] for _ in range(len(tree))]
+    for index, parent in enumerate(tree.parents):
+        if parent >= 0:
+            children[parent].append(index)
+    return children
+
+
+# Страницы читаются по одной и сразу освобождаются; в памяти только текст раздела.
+# Возвращает текст и начала страниц в нём (как PageTextCache.page_offsets)
+def _pages_text(doc, start_page, end_page):
+    parts = []
+    offsets = []
+    position = 0
+    for page_num in range(start_page - 1, end_page):
+        offsets.append(position)
+        parts.append(doc.load_page(page_num).get_text())
+        position += len(parts[-1])
+    return "".join(parts), offsets
+
+
+@contextlib.contextmanager
+def _json_output(json_path, manifest, pdf_path):
+    if json_path is None:
+        yield None
+        return
+    if manifest is None:
+        with open(json_path, 'w', encoding='utf-8') as json_file:
+            yield json_file
+        return
+
+    # Как save_hierarchy_to_json: хэш считается при записи, неизменённый JSON не перезаписывается
+    tmp_path = json_path + ".tmp"
+    digest = hashlib.sha256()
+    with open(tmp_path, 'w', encoding='utf-8') as json_file:
+        yield HashingWriter(json_file, digest)
+    fingerprint = digest.hexdigest()
+    if manifest.output_unchanged(pdf_path, json_path, fingerprint):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, json_path)
+    manifest.record_output(pdf_path, json_path, fingerprint)
+
+
+# Потоковая декомпозиция: дерево разделов обходится генератором walk_tree, текст
+# и PDF каждого конечного раздела пишутся на диск сразу после извлечения, а хранилище
+# объектов MuPDF очищается каждые SHRINK_EVERY_PAGES страниц. Пиковая память определяется
+# самым большим разделом, а не размером книги. JSON совпадает с BookDecomposer.run
+# (без layout), каталоги и PDF - с create_directory_structure.
+def stream_book(doc, pdf_path, tree, json_path=None, base_path=None, jsonl_path=None, leaf_only=False,
+                manifest=None, progress=None, metrics=None, **metadata):
+    children = _children(tree) if leaf_only else None
+    section_dirs = {}
+    parents = []
+    pages_since_shrink = 0
+    if progress is not None:
+        progress.start(len(tree), "Потоковая декомпозиция")
+
+    with contextlib.ExitStack() as stack:
+        json_file = stack.enter_context(_json_output(json_path, manifest, pdf_path))
+        writer = HierarchyJsonWriter(json_file) if json_file is not None else None
+        jsonl_file = stack.enter_context(open(jsonl_path, 'w', encoding='utf-8')) if jsonl_path else None
+
+        for event, index in walk_tree(tree):
+            has_subsections = tree.has_subsections(index)
+            if event == "end":
+                parents.pop()
+                section_dirs.pop(index, None)
+                if has_subsections and writer is not None:
+                    writer.end_section()
+                continue
+
+            section = _section(tree, index)
+            if writer is not None:
+                writer.begin_section(section, has_subsections)
+
+            pages_copied = bytes_written = 0
+            if base_path is not None:
+                parent_dir = section_dirs.get(tree.parents[index], base_path)
+                section_dir = None
+                if parent_dir is not None:
+                    section_dir = os.path.join(parent_dir, clean_title(section['title']))
+                    try:
+                        os.makedirs(section_dir, exist_ok=True)
+                    except Exception as e:
+                        logger.error("Не удалось создать директорию: %s. Ошибка: %s", section_dir, e)
+                        section_dir = None
+                # Если каталог не создан, потомки раздела тоже пропускаются
+                section_dirs[index] = section_dir
+                if section_dir is not None:
+                    if leaf_only and has_subsections:
+                        section['subsections'] = [_section(tree, child) for child in children[index]]
+                    if metrics is not None:
+                        with metrics.stage("pdf_export"):
+                            pages_copied, bytes_written = export_section(
+                                doc, section, section_dir, pdf_path, manifest=manifest, leaf_only=leaf_only
+                            )
+                        metrics.add("pdf_export", pages=pages_copied, bytes_written=bytes_written)
+                    else:
+                        pages_copied, bytes_written = export_section(
+                            doc, section, section_dir, pdf_path, manifest=manifest, leaf_only=leaf_only
+                        )
+
+            if not has_subsections:
+                page_total = max(section['end_page'] - section['start_page'] + 1, 0)
+                if metrics is not None:
+                    with metrics.stage("text_extraction"):
+                        text, page_offsets = _pages_text(doc, section['start_page'], section['end_page'])
+                    metrics.add("text_extraction", pages=page_total)
+                else:
+                    text, page_offsets = _pages_text(doc, section['start_page'], section['end_page'])
+                if writer is not None:
+                    writer.end_section({"text": text, "page_offsets": page_offsets})
+                if jsonl_file is not None:
+                    section['text'] = text
+                    section['page_offsets'] = page_offsets
+                    jsonl_file.write(json.dumps(leaf_record(section, parents, **metadata), ensure_ascii=False))
+                    jsonl_file.write("\n")
+                del text, section
+
+                pages_since_shrink += page_total
+                if pages_since_shrink >= SHRINK_EVERY_PAGES:
+                    fitz.TOOLS.store_shrink(100)
+                    pages_since_shrink = 0
+
+            parents.append(tree.titles[index])
+            if progress is not None:
+                progress.advance(pages=pages_copied, bytes_written=bytes_written, message=tree.titles[index])
+                progress.check()
+
+        if writer is not None:
+            writer.close()
+
+    if json_path is not None and metrics is not None:
+        metrics.add("json_write", bytes_written=os.path.getsize(json_path))
@@ -1,7 +1,13 @@
 import fitz
 
-def extract_toc_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
+from .instrumentation import get_logger
+from .page_cache import get_page_cache
+
+logger = get_logger("text_by_toc")
+
+def extract_toc_from_pdf(pdf_path, doc=None):
+    if doc is None:
+        doc = fitz.open(pdf_path)
     toc = doc.get_toc()
 
     toc2 = []
@@ -16,10 +22,13 @@ def extract_toc_from_pdf(pdf_path):
     
     return toc2
 
-def split_pdf_by_toc(pdf_path):
-    doc = fitz.open(pdf_path)
-    toc = extract_toc_from_pdf(pdf_path)
-    
+def split_pdf_by_toc(pdf_path, doc=None):
+    if doc is None:
+        doc = fitz.open(pdf_path)
+    toc = extract_toc_from_pdf(pdf_path, doc=doc)
+    return sections_from_toc(toc, doc.page_count)
+
+def sections_from_toc(toc, page_count):
     sections = []
     
     for i in range(len(toc)):
@@ -28,7 +37,7 @@ def split_pdf_by_toc(pdf_path):
         if i + 1 < len(toc):
             end_page = toc[i + 1][2] - 1
         else:
-            end_page = doc.page_count - 1
+            end_page = page_count - 1
 
         sections.append({
             "level": level,
@@ -59,15 +68,21 @@ def build_hierarchy(sections):
         
     return hierarchy
 
-def update_end_pages(section):
-    if not section['subsections']:
-        return section['end_page']
-
-    max_end_page = section['end_page']
-    for subsection in section['subsections']:
-        max_end_page = max(max_end_page, update_end_pages(subsection))
+def _preorder(section):
+    order = []
+    stack = [section]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(reversed(node['subsections']))
+    return order
 
-    section['end_page'] = max_end_page
+# Без рекурсии: в обратном прямом порядке потомки обрабатываются раньше родителя
+def update_end_pages(section):
+    for node in reversed(_preorder(section)):
+        for subsection in node['subsections']:
+            if subsection['end_page'] > node['end_page']:
+                node['end_page'] = subsection['end_page']
     return section['end_page']
 
 def update_all_end_pages(hierarchy):
@@ -75,22 +90,24 @@ def update_all_end_pages(hierarchy):
         update_end_pages(section)
         check_and_fill_end_page(section)
 
-def extract_text_from_pages(doc, start_page, end_page):
-    text = ""
-    for page_num in range(start_page - 1, end_page):
-        page = doc.load_page(page_num)
-        text += page.get_text()
-    return text
+# mode="text" - строка текста страниц;
+# mode="layout" - {"text": ..., "pages": [...]} с блоками, таблицами и числом изображений каждой страницы
+def extract_text_from_pages(doc, start_page, end_page, flags=None, mode="text"):
+    cache = get_page_cache(doc)
+    if mode == "layout":
+        pages = cache.layout_for_pages(start_page, end_page, flags)
+        return {"text": "".join(page['text'] for page in pages), "pages": pages}
+    if mode != "text":
+        raise ValueError(f"Неизвестный режим извлечения: {mode}")
+    return cache.text_for_pages(start_page, end_page, flags)
 
 def check_and_fill_end_page(section):
-    print(f"Проверка раздела: {section['title']}, start_page: {section['start_page']}, end_page: {section['end_page']}")
-    
-    if section['end_page'] < section['start_page']:
-        print(f"Корректировка end_page для {section['title']} с {section['end_page']} на {section['start_page']}")
-        section['end_page'] = section['start_page'] 
+    for node in _preorder(section):
+        logger.debug("Проверка раздела: %s, start_page: %s, end_page: %s", node['title'], node['start_page'], node['end_page'])
 
-    for subsection in section.get('subsections', []):
-        check_and_fill_end_page(subsection)
+        if node['end_page'] < node['start_page']:
+            logger.info("Корректировка end_page для %s с %s на %s", node['title'], node['end_page'], node['start_page'])
+            node['end_page'] = node['start_page']
 
 
 def extract_text_from_leaf_sections(doc, section):
@@ -117,6 +134,14 @@ def extract_text_from_hierarchy(doc, hierarchy):
         texts.append(extract_text_from_leaf_sections(doc, section))
     return texts
 
+def attach_text_to_deepest_sections(section, doc):
+    if not section['subsections']:
+        text = extract_text_from_pages(doc, section['start_page'], section['end_page'])
+        section['text'] = text
+    else:
+        for subsection in section['subsections']:
+            attach_text_to_deepest_sections(subsection, doc)
+
 #pdf_path = r"C:\Users\user\Книга 1\Книга 1.pdf"
 #doc = fitz.open(pdf_path)
 
@@ -0,0 +1,248 @@
+import json
+import os
+import unicodedata
+from bisect import bisect_left
+
+import fitz
+
+from .batch import discover_books
+from .instrumentation import get_logger
+from .pdf_to_folders import clean_title
+from .section_tree import SectionTree
+from .text_by_toc import extract_toc_from_pdf
+
+logger = get_logger("toc_scan")
+
+
+TOC_INDEX_VERSION = 1
+DECOMPOSITION_PREFIX = "Декомпозиция_"
+
+
+# Оглавление и число страниц книги без извлечения текста: только get_toc()
+# и page_count. Разделы хранятся столбцами, как в SectionTree.
+def scan_book(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        toc = extract_toc_from_pdf(pdf_path, doc=doc)
+        page_count = doc.page_count
+    tree = SectionTree.from_toc(toc, page_count)
+    return {
+        "page_count": page_count,
+        "levels": list(tree.levels),
+        "titles": list(tree.titles),
+        "start_pages": list(tree.start_pages),
+        "end_pages": list(tree.end_pages),
+        "parents": list(tree.parents)
+    }
+
+
+def load_toc_index(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as index_file:
+        index = json.load(index_file)
+    return index if index.get('version') == TOC_INDEX_VERSION else None
+
+
+def save_toc_index(index, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as index_file:
+        json.dump(index, index_file, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+# Индекс оглавлений всего корпуса: {"version", "books": {pdf_path: запись}}.
+# Запись - книга (basin, book, name), размер и время изменения PDF и scan_book.
+# Книги, у которых размер и время изменения не поменялись, берутся из прошлого индекса.
+# Читаются только PDF в каталогах книг, вложенные каталоги (Декомпозиция_*) не обходятся;
+# служебные файлы macOS (._*) на сетевом диске пропускаются
+def scan_corpus(base_dir, index_path=None):
+    previous = load_toc_index(index_path) or {"books": {}}
+    books = {}
+    scanned = 0
+    for book in discover_books(base_dir):
+        pdf_path = book['pdf_path']
+        if os.path.basename(pdf_path).startswith("._"):
+            continue
+        stat = os.stat(pdf_path)
+        entry = previous['books'].get(pdf_path)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            try:
+                entry = dict(book, size=stat.st_size, mtime_ns=stat.st_mtime_ns, **scan_book(pdf_path))
+            except Exception as e:
+                logger.error("Не удалось прочитать оглавление %s: %s", pdf_path, e)
+                continue
+            scanned += 1
+        books[pdf_path] = entry
+    logger.info("Оглавления: книг %s, прочитано заново %s", len(books), scanned)
+
+    index = {"version": TOC_INDEX_VERSION, "books": books}
+    if index_path:
+        save_toc_index(index, index_path)
+    return index
+
+
+# Пути каталогов разделов книги относительно её каталога вывода, как их строит
+# create_directory_structure: у каждого раздела - цепочка clean_title предков
+def section_dirs(entry):
+    dirs = []
+    for index, title in enumerate(entry['titles']):
+        parent = entry['parents'][index]
+        name = clean_title(title)
+        dirs.append(os.path.join(dirs[parent], name) if parent >= 0 else name)
+    return dirs
+
+
+def normalize_title(title):
+    title = unicodedata.normalize("NFC", title).replace('_', ' ').lower()
+    return " ".join(title.split())
+
+
+def _trigrams(text):
+    return {text[position:position + 3] for position in range(len(text) - 2)}
+
+
+# Поиск разделов корпуса по названию без вложенных циклов по всем названиям:
+#   locate(name)  - точное совпадение с названием или с именем каталога (clean_title);
+#   prefix(text)  - названия, начинающиеся с text (бинарный поиск по отсортированным);
+#   find(text)    - названия, содержащие text (пересечение списков триграмм и проверка).
+# Сравнение без учёта регистра, '_' считается пробелом.
+# Каждое место раздела - basin, book, name, pdf_path, title, страницы и каталог раздела.
+class TitleIndex:
+    def __init__(self):
+        self.titles = []
+        self.normalized = []
+        self.locations = []
+        self.by_key = {}
+        self.sorted_keys = []
+        self.trigrams = {}
+
+    @classmethod
+    def from_toc_index(cls, toc_index):
+        title_index = cls()
+        positions = {}
+        for entry in toc_index['books'].values():
+            for index, directory in enumerate(section_dirs(entry)):
+                title = entry['titles'][index]
+                position = positions.get(title)
+                if position is None:
+                    position = positions[title] = len(title_index.titles)
+                    title_index.titles.append(title)
+                    title_index.normalized.append(normalize_title(title))
+                    title_index.locations.append([])
+                title_index.locations[position].append({
+                    "basin": entry['basin'],
+                    "book": entry['book'],
+                    "name": entry['name'],
+                    "pdf_path": entry['pdf_path'],
+                    "title": title,
+                    "level": entry['levels'][index],
+                    "start_page": entry['start_pages'][index],
+                    "end_page": entry['end_pages'][index],
+                    "section_dir": directory
+                })
+        title_index._build()
+        return title_index
+
+    def _build(self):
+        for position, (title, key) in enumerate(zip(self.titles, self.normalized)):
+            self.by_key.setdefault(key, []).append(position)
+            folder_key = normalize_title(clean_title(title))
+            if folder_key != key:
+                self.by_key.setdefault(folder_key, []).append(position)
+            for trigram in _trigrams(key):
+                self.trigrams.setdefault(trigram, []).append(position)
+        self.sorted_keys = sorted((key, position) for position, key in enumerate(self.normalized))
+
+    def __len__(self):
+        return len(self.titles)
+
+    # Бассейн сравнивается как название: "Бассейн Волга" == "Бассейн_Волга"
+    def _result(self, positions, basin=None):
+        if basin is not None:
+            basin = normalize_title(basin)
+        found = []
+        for position in positions:
+            locations = self.locations[position]
+            if basin is not None:
+                locations = [location for location in locations if normalize_title(location['basin']) == basin]
+            if locations:
+                found.append((self.titles[position], locations))
+        return found
+
+    # Совпадения с точностью до регистра идут первыми
+    def locate(self, name, basin=None):
+        positions = self.by_key.get(normalize_title(name), ())
+        exact = [position for position in positions if name in (self.titles[position], clean_title(self.titles[position]))]
+        return self._result(exact + [position for position in positions if position not in exact], basin)
+
+    def prefix(self, text, basin=None):
+        text = normalize_title(text)
+        positions = []
+        position = bisect_left(self.sorted_keys, (text, -1))
+        while position < len(self.sorted_keys) and self.sorted_keys[position][0].startswith(text):
+            positions.append(self.sorted_keys[position][1])
+            position += 1
+        return self._result(sorted(positions), basin)
+
+    def find(self, text, basin=None):
+        text = normalize_title(text)
+        if len(text) < 3:
+            positions = [position for position, key in enumerate(self.normalized) if text in key]
+            return self._result(positions, basin)
+
+        postings = sorted((self.trigrams.get(trigram, ()) for trigram in _trigrams(text)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        positions = [position for position in sorted(candidates) if text in self.normalized[position]]
+        return self._result(positions, basin)
+
+    # Полное название раздела по имени его каталога или обрезанному названию:
+    # точное совпадение, затем по началу, затем по вхождению (замена update_names из get_path.ipynb)
+    def resolve(self, name, basin=None):
+        for search in (self.locate, self.prefix, self.find):
+            found = search(name, basin)
+            if found:
+                return found[0][0]
+        return None
+
+
+# Структура каталогов декомпозиции в формате hierarchical_book_structure.json
+# (build_hierarchical_structure из get_path.ipynb): каталоги Декомпозиция_* раскрываются
+# в родителя, каталог с PDF того же имени заменяется этим PDF, узел из одного
+# одноимённого файла - самим файлом. Обход через os.scandir: тип элемента берётся
+# из записи каталога, без отдельного stat на каждый файл сетевого диска
+def directory_structure(root_path):
+    structure = {"name": os.path.basename(root_path), "children": []}
+    try:
+        with os.scandir(root_path) as entries:
+            items = sorted((entry.name, entry.is_dir()) for entry in entries)
+    except PermissionError:
+        return structure
+
+    pdf_files = {os.path.splitext(item)[0]: item for item, _ in items if item.endswith(".pdf")}
+    names = set()
+    for item, is_dir in items:
+        item_path = os.path.join(root_path, item)
+        if is_dir:
+            if item.startswith(DECOMPOSITION_PREFIX):
+                children = directory_structure(item_path)['children']
+            elif item in pdf_files:
+                children = [{"name": item, "path": os.path.join(root_path, pdf_files[item])}]
+            else:
+                sub_structure = directory_structure(item_path)
+                children = sub_structure['children']
+                if not (len(children) == 1 and children[0]['name'] == sub_structure['name']):
+                    children = [sub_structure]
+            structure['children'].extend(children)
+            names.update(child['name'] for child in children)
+        elif item.endswith(".pdf") and os.path.splitext(item)[0] not in names:
+            name = os.path.splitext(item)[0]
+            structure['children'].append({"name": name, "path": item_path})
+            names.add(name)
+    return structure
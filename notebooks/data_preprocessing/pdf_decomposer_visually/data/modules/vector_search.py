@@ -0,0 +1,116 @@
+import json
+import os
+
+import numpy as np
+
+
+# Поля метаданных, для которых маски фильтрации строятся заранее
+MASK_FIELDS = ("basin", "file")
+
+
+def normalize_rows(vectors):
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Нулевые векторы остаются нулевыми (сходство 0), без деления на ноль
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms)
+
+
+def _top_k(scores, k):
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(top, order, axis=-1)
+
+
+# Поиск ближайших векторов в памяти процесса.
+# Векторы хранятся нормированными в непрерывной матрице, поэтому косинусная близость
+# для всех документов - одно матричное умножение, а топ-k выбирается argpartition.
+# Подходит для оценки моделей и как локальная замена Qdrant.
+class VectorIndex:
+    def __init__(self, vectors, metadata=None, ids=None):
+        self.matrix = normalize_rows(vectors)
+        self.metadata = list(metadata) if metadata is not None else [{} for _ in range(len(self.matrix))]
+        self.ids = list(ids) if ids is not None else list(range(len(self.matrix)))
+        if not (len(self.metadata) == len(self.ids) == len(self.matrix)):
+            raise ValueError("Число векторов, метаданных и ID не совпадает")
+
+        self.masks = {}
+        for field in MASK_FIELDS:
+            values = [item.get(field) for item in self.metadata]
+            codes = {value: code for code, value in enumerate(dict.fromkeys(v for v in values if v is not None))}
+            column = np.array([codes.get(value, -1) for value in values], dtype=np.int32)
+            for value, code in codes.items():
+                self.masks[(field, value)] = column == code
+
+    def __len__(self):
+        return len(self.matrix)
+
+    # Документы в формате all_documents.json или langchain Document
+    @classmethod
+    def from_documents(cls, documents, vectors, ids=None):
+        metadata = []
+        for document in documents:
+            if isinstance(document, dict):
+                item = dict(document.get('metadata', {}))
+                item['content'] = document.get('page_content', "")
+            else:
+                item = dict(document.metadata)
+                item['content'] = document.page_content
+            metadata.append(item)
+        return cls(vectors, metadata, ids)
+
+    # Маска строк по значениям basin/file (значение или список значений)
+    def mask(self, basin=None, file=None):
+        result = None
+        for field, value in (("basin", basin), ("file", file)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else value
+            field_mask = np.zeros(len(self), dtype=bool)
+            for item in values:
+                if (field, item) in self.masks:
+                    field_mask |= self.masks[(field, item)]
+            result = field_mask if result is None else result & field_mask
+        return result
+
+    # Топ-k для пачки запросов: список списков (номер строки, сходство)
+    def search_batch(self, queries, k=5, basin=None, file=None, batch_size=256):
+        queries = normalize_rows(queries)
+        mask = self.mask(basin, file)
+        results = []
+        for start in range(0, len(queries), batch_size):
+            scores = queries[start:start + batch_size] @ self.matrix.T
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+            for row_scores, rows in zip(scores, _top_k(scores, k)):
+                results.append([
+                    (int(row), float(row_scores[row]))
+                    for row in rows if row_scores[row] != -np.inf
+                ])
+        return results
+
+    def search(self, query, k=5, basin=None, file=None):
+        return self.search_batch([query], k, basin, file)[0]
+
+    # Результаты в виде, похожем на ответ Qdrant: id, score, payload
+    def query(self, query, k=5, basin=None, file=None):
+        return [
+            {"id": self.ids[row], "score": score, "payload": self.metadata[row]}
+            for row, score in self.search(query, k, basin, file)
+        ]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "vectors.npy"), self.matrix)
+        with open(os.path.join(path, "points.json"), 'w', encoding='utf-8') as points_file:
+            json.dump({"ids": self.ids, "metadata": self.metadata}, points_file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        vectors = np.load(os.path.join(path, "vectors.npy"))
+        with open(os.path.join(path, "points.json"), 'r', encoding='utf-8') as points_file:
+            points = json.load(points_file)
+        return cls(vectors, points['metadata'], points['ids'])
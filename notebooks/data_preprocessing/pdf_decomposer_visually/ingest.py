@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+from data.modules.chunking import model_max_tokens
+from data.modules.ingest_service import (
+    DEFAULT_POLL_INTERVAL,
+    DEFAULT_QUEUE_SIZE,
+    SETTLE_SECONDS,
+    IngestService,
+    chunk_stage,
+    embed_stage,
+    upload_stage
+)
+from data.modules.instrumentation import LOG_FORMAT
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Служба пополнения корпуса СКИОВО: следит за каталогом книг "
+                                                 "и обрабатывает новые и изменённые PDF")
+    parser.add_argument("--base-dir", default="data/Base_Books", help="каталог с PDF: <бассейн>/Книга N/*.pdf")
+    parser.add_argument("--json-dir", default="data/JSON", help="куда писать <бассейн>/Исходные/<книга>.json")
+    parser.add_argument("--output-dir", default="outputs", help="каталог для PDF разделов")
+    parser.add_argument("--no-pdf", action="store_true", help="не сохранять PDF разделов, только JSON")
+    parser.add_argument("--leaf-only", action="store_true",
+                        help="PDF только для конечных разделов, для родительских - index.json с диапазонами страниц")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="дополнительно писать <книга>.jsonl: одна строка на конечный раздел")
+    parser.add_argument("--streaming", action="store_true", help="потоковая декомпозиция для очень больших книг")
+    parser.add_argument("--workers", type=int, default=2, help="число процессов декомпозиции")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="длина очереди каждого этапа")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL, help="период сканирования каталога, с")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="файл, изменённый меньше указанного числа секунд назад, ещё не берётся в обработку")
+    parser.add_argument("--once", action="store_true", help="обработать текущее содержимое каталога и завершиться")
+    parser.add_argument("--manifest", help="манифест для инкрементальной пересборки "
+                                           "(по умолчанию <json-dir>/build_manifest.json)")
+    parser.add_argument("--full", action="store_true", help="обрабатывать книги без манифеста")
+    parser.add_argument("--model", help="модель SentenceTransformer: после декомпозиции книги "
+                                        "её разделы разбиваются на фрагменты и векторизуются")
+    parser.add_argument("--max-tokens", type=int,
+                        help="длина фрагмента в токенах (по умолчанию и не более max_seq_length модели "
+                             "без специальных токенов)")
+    parser.add_argument("--overlap", type=int, default=100, help="перекрытие фрагментов в токенах")
+    parser.add_argument("--embedding-cache", help="каталог дискового кэша векторов")
+    parser.add_argument("--qdrant-url", help="загружать векторы в Qdrant по этому адресу (вместе с --model)")
+    parser.add_argument("--collection", default="documents_collection", help="коллекция Qdrant")
+    parser.add_argument("--no-content", action="store_true", help="не хранить текст фрагмента в payload Qdrant")
+    parser.add_argument("--report-interval", type=float, default=60.0, help="период записи статистики в журнал, с")
+    parser.add_argument("--stats", help="JSON-файл со статистикой очередей и задержек, обновляется вместе с журналом")
+    args = parser.parse_args()
+    if args.qdrant_url and not args.model:
+        parser.error("--qdrant-url требует --model")
+    return args
+
+
+def build_stages(args):
+    if not args.model:
+        return []
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(args.model)
+    cache = None
+    if args.embedding_cache:
+        from data.modules.embedding_cache import EmbeddingCache
+        cache = EmbeddingCache(args.embedding_cache, args.model)
+
+    stages = [
+        chunk_stage(model.tokenizer, model_max_tokens(model, args.max_tokens), args.overlap, queue_size=args.queue_size),
+        embed_stage(model, cache=cache, model_name=args.model, queue_size=args.queue_size)
+    ]
+    if args.qdrant_url:
+        from qdrant_client import QdrantClient
+        from data.modules.qdrant_upload import ensure_collection
+
+        client = QdrantClient(url=args.qdrant_url)
+        ensure_collection(client, args.collection, model.get_sentence_embedding_dimension())
+        stages.append(upload_stage(client, args.collection, include_content=not args.no_content,
+                                   queue_size=args.queue_size))
+    return stages
+
+
+async def serve(service, once):
+    loop = asyncio.get_running_loop()
+    # Ctrl+C или SIGTERM: новые книги больше не берутся, начатые доводятся до конца
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, service.stop)
+        except (NotImplementedError, RuntimeError):
+            pass
+    return await service.run(once=once)
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+    manifest_path = None
+    if not args.full:
+        manifest_path = args.manifest or os.path.join(args.json_dir, "build_manifest.json")
+
+    service = IngestService(
+        args.base_dir, args.json_dir, None if args.no_pdf else args.output_dir,
+        manifest_path=manifest_path, workers=args.workers, stages=build_stages(args),
+        queue_size=args.queue_size, poll_interval=args.interval, settle_seconds=args.settle,
+        leaf_only=args.leaf_only, jsonl=args.jsonl, streaming=args.streaming,
+        report_interval=args.report_interval, stats_path=args.stats
+    )
+    stats = asyncio.run(serve(service, args.once))
+    failed = sum(stage['failed'] for stage in stats['stages'])
+    print(f"Книг обработано: {stats['completed']}, без изменений: {stats['skipped']}, ошибок: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())